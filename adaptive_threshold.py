@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python adaptive_threshold.py replay <sensor_data.csv> [more.csv ...]
+        [--false-alarm-rate R] [--clear-rate R] [--half-life N] [--min-count N]
+        [--temperature-bucket C] [--fixed-threshold T] [--state FILE] [--trace FILE]
+    python adaptive_threshold.py info <state.npz>
+
+Online calibration of the anomaly threshold.
+
+The SVM decision scores shift with wind speed and temperature, so one fixed
+threshold either floods alerts or misses faults. AdaptiveThreshold keeps a
+constant-memory sketch of recent scores and flags a window when its score is
+below the false_alarm_rate quantile of those scores. With a rate of 0.01,
+about one normal window in a hundred would be flagged.
+
+QuantileSketch is a histogram on fixed bins. The bins are narrow near 0,
+where the SVM boundary is, and wider further out. Counts decay exponentially
+with a half-life of half_life observations, so the sketch follows the
+current conditions. An observation costs O(1); a quantile costs one cumulative
+sum over the bins.
+
+Scores can also be kept per temperature bucket, one sketch for every
+temperature_bucket degrees of the reading that closed the window. A bucket is
+used once it has seen min_count windows. Until then the shared sketch is used,
+and until that has min_count windows the fixed threshold from the command line
+applies.
+
+Hysteresis: an alarm starts below the false_alarm_rate quantile and only clears
+once a score is back above the higher clear_rate quantile, as it was when the
+alarm started or lower. Windows scored while an alarm is on are learned at
+ALARM_WEIGHT of a normal window's weight: a short fault barely moves the
+quantiles, while a shift that persists (new wind or temperature conditions)
+still pulls the threshold down, only more slowly.
+
+The state can be saved to a .npz file (main.py does so every save_interval
+windows and on exit) and loaded on the next start. replay runs recordings
+through the same SensorBuffer and detector as main.py, feeds the scores to a
+calibrator and compares its alarms with the fixed threshold.
+"""
+
+import argparse
+import os
+import sys
+import zipfile
+
+import numpy as np
+
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+STATE_PATH = 'data/threshold_state.npz'
+
+DEFAULT_FALSE_ALARM_RATE = 0.01
+DEFAULT_CLEAR_RATE = 0.05
+# About six hours of windows at one window per second
+DEFAULT_HALF_LIFE = 21600
+# Ten minutes of windows before a sketch is trusted
+DEFAULT_MIN_COUNT = 600
+DEFAULT_TEMPERATURE_BUCKET = 5.0
+DEFAULT_SAVE_INTERVAL = 600
+# Weight of a window scored during an alarm, relative to a normal window
+ALARM_WEIGHT = 0.1
+
+# Bin layout: N_BINS bins evenly spaced in asinh(score / BIN_SCALE) up to
+# +-BIN_LIMIT, about 0.002 wide near 0 and 3% of the score near 1
+N_BINS = 512
+BIN_SCALE = 0.05
+BIN_LIMIT = 50.0
+
+# Lazy decay: observations are added with a growing weight instead of
+# shrinking every count; counts are rescaled before the weight overflows
+_MAX_WEIGHT = 1e100
+
+
+def bin_edges(n_bins=N_BINS, scale=BIN_SCALE, limit=BIN_LIMIT):
+    span = np.arcsinh(limit / scale)
+    return scale * np.sinh(np.linspace(-span, span, n_bins + 1))
+
+
+_EDGES = bin_edges()
+
+
+class QuantileSketch:
+    """Exponentially decayed score histogram on fixed bins."""
+
+    def __init__(self, half_life=DEFAULT_HALF_LIFE):
+        self.half_life = half_life
+        self._decay = 0.5 ** (1.0 / half_life)
+        self.counts = np.zeros(N_BINS)
+        self._total = 0.0
+        self._weight = 1.0
+
+    @property
+    def count(self):
+        """Effective number of observations (decayed)."""
+        return self._total / self._weight
+
+    def add(self, score, weight=1.0):
+        """Add one observation; every observation ages the older ones equally."""
+        self._weight /= self._decay
+        if self._weight > _MAX_WEIGHT:
+            self.normalize()
+            self._weight /= self._decay
+        i = int(np.searchsorted(_EDGES, score, side='right')) - 1
+        i = min(max(i, 0), N_BINS - 1)
+        self.counts[i] += self._weight * weight
+        self._total += self._weight * weight
+
+    def quantile(self, q):
+        """Score below which a fraction q of the (decayed) observations fall."""
+        if self._total <= 0:
+            return None
+        cumulative = np.cumsum(self.counts)
+        target = q * cumulative[-1]
+        i = int(np.searchsorted(cumulative, target, side='left'))
+        i = min(i, N_BINS - 1)
+        below = cumulative[i - 1] if i else 0.0
+        # Linear within the bin
+        fraction = (target - below) / self.counts[i] if self.counts[i] > 0 else 0.0
+        return float(_EDGES[i] + fraction * (_EDGES[i + 1] - _EDGES[i]))
+
+    def normalize(self):
+        self.counts /= self._weight
+        self._total /= self._weight
+        self._weight = 1.0
+
+
+class AdaptiveThreshold:
+    def __init__(self, false_alarm_rate=DEFAULT_FALSE_ALARM_RATE, clear_rate=DEFAULT_CLEAR_RATE,
+                 half_life=DEFAULT_HALF_LIFE, min_count=DEFAULT_MIN_COUNT,
+                 temperature_bucket=DEFAULT_TEMPERATURE_BUCKET, fixed_threshold=-2.0,
+                 state_path=None, save_interval=DEFAULT_SAVE_INTERVAL):
+        if not 0 < false_alarm_rate < clear_rate < 1:
+            raise ValueError("need 0 < false_alarm_rate < clear_rate < 1")
+        self.false_alarm_rate = false_alarm_rate
+        self.clear_rate = clear_rate
+        self.half_life = half_life
+        self.min_count = min_count
+        # None or 0 keeps a single sketch for all temperatures
+        self.temperature_bucket = temperature_bucket or None
+        self.fixed_threshold = fixed_threshold
+        self.state_path = state_path
+        self.save_interval = save_interval
+
+        self.sketch = QuantileSketch(half_life)
+        self.buckets = {}
+        self.alarmed = False
+        # Thresholds used for the last window, for display and metrics
+        self.threshold = fixed_threshold
+        self.clear_threshold = fixed_threshold
+        self.windows = 0
+        self.alarm_windows = 0
+        self.alarms = 0
+
+    def bucket(self, temperature):
+        if self.temperature_bucket is None or temperature is None or not np.isfinite(temperature):
+            return None
+        return int(np.floor(temperature / self.temperature_bucket))
+
+    def thresholds(self, temperature=None):
+        """(alarm, clear) thresholds for a window at this temperature."""
+        sketch = self.buckets.get(self.bucket(temperature))
+        if sketch is None or sketch.count < self.min_count:
+            sketch = self.sketch
+        if sketch.count < self.min_count:
+            return self.fixed_threshold, self.fixed_threshold
+        return sketch.quantile(self.false_alarm_rate), sketch.quantile(self.clear_rate)
+
+    def update(self, score, temperature=None):
+        """Add one window's score; returns True while an alarm is on."""
+        score = float(score)
+        threshold, clear_threshold = self.thresholds(temperature)
+        self.threshold = threshold
+        if self.alarmed:
+            # The clear threshold is latched when the alarm starts and only
+            # follows the sketch down, as a lasting shift moves it
+            self.clear_threshold = min(self.clear_threshold, clear_threshold)
+            self.alarmed = score < self.clear_threshold
+        elif score < threshold:
+            self.clear_threshold = clear_threshold
+            self.alarmed = True
+            self.alarms += 1
+            logger.info("Adaptive alarm: score %.4f below %.4f", score, self.threshold)
+        if not self.alarmed:
+            self.clear_threshold = clear_threshold
+
+        self.windows += 1
+        if self.alarmed:
+            self.alarm_windows += 1
+        weight = ALARM_WEIGHT if self.alarmed else 1.0
+        self.sketch.add(score, weight)
+        key = self.bucket(temperature)
+        if key is not None:
+            sketch = self.buckets.get(key)
+            if sketch is None:
+                sketch = self.buckets[key] = QuantileSketch(self.half_life)
+            sketch.add(score, weight)
+
+        if self.state_path and self.save_interval and self.windows % self.save_interval == 0:
+            self.save()
+        return self.alarmed
+
+    def summary(self):
+        return (f"adaptive threshold {self.threshold:.4f} (clear {self.clear_threshold:.4f}), "
+                f"{self.alarms} alarms over {self.alarm_windows} of {self.windows} windows, "
+                f"{len(self.buckets)} temperature buckets")
+
+    def save(self, path=None):
+        """Write the sketches to path (default state_path), atomically."""
+        path = path or self.state_path
+        keys = sorted(self.buckets)
+        for sketch in [self.sketch] + [self.buckets[k] for k in keys]:
+            sketch.normalize()
+        state = {
+            'edges': _EDGES,
+            'half_life': self.half_life,
+            'temperature_bucket': self.temperature_bucket or 0.0,
+            'counts': self.sketch.counts,
+            'total': self.sketch._total,
+            'bucket_keys': np.array(keys, dtype=np.int64),
+            'bucket_counts': np.array([self.buckets[k].counts for k in keys]).reshape(len(keys), N_BINS),
+            'bucket_totals': np.array([self.buckets[k]._total for k in keys]),
+            'alarmed': self.alarmed,
+            'clear_threshold': self.clear_threshold,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **state)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        """Restore sketches saved by save(); returns False if there is nothing usable."""
+        path = path or self.state_path
+        if not path or not os.path.isfile(path):
+            return False
+        try:
+            with np.load(path) as state:
+                if (not np.array_equal(state['edges'], _EDGES)
+                        or float(state['temperature_bucket']) != (self.temperature_bucket or 0.0)):
+                    logger.warning("Threshold state %s has a different layout; starting afresh", path)
+                    return False
+                # Counts keep their decay; the configured half-life applies from now on
+                sketch = QuantileSketch(self.half_life)
+                sketch.counts[:] = state['counts']
+                sketch._total = float(state['total'])
+                buckets = {}
+                for key, counts, total in zip(state['bucket_keys'], state['bucket_counts'],
+                                              state['bucket_totals']):
+                    bucket = buckets[int(key)] = QuantileSketch(self.half_life)
+                    bucket.counts[:] = counts
+                    bucket._total = float(total)
+                alarmed = bool(state['alarmed'])
+                clear_threshold = float(state['clear_threshold'])
+        except (KeyError, ValueError, OSError, zipfile.BadZipFile) as e:
+            # Older or damaged state: learn again from scratch
+            logger.warning("Cannot read threshold state %s (%s); starting afresh", path, e)
+            return False
+        self.sketch = sketch
+        self.buckets = buckets
+        self.alarmed = alarmed
+        # Report the restored thresholds before the first update; an alarm
+        # keeps its latched clear threshold, as in update()
+        self.threshold, current_clear = self.thresholds()
+        self.clear_threshold = min(clear_threshold, current_clear) if alarmed else current_clear
+        return True
+
+
+def replay_scores(sensor_file, detector, window_size=None, hop=1.0):
+    """(timestamp, temperature, score) of every window main.py would score in a recording."""
+    import contextlib
+    import io
+    import pandas as pd
+    import sensor
+    from extract_features import load_sensor_data
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = load_sensor_data(sensor_file)
+    buffer = sensor.SensorBuffer(window_size=window_size or detector.window_size, hop=hop,
+                                 feature_set=detector.feature_stats)
+    timestamps = pd.to_datetime(df['timestamp'])
+    data = df[sensor.SENSOR_NAMES + ['temperature']].to_numpy()
+    rows = []
+    for timestamp, row in zip(timestamps, data):
+        sensor_data = dict(zip(sensor.SENSOR_NAMES, row[:6]))
+        features = buffer.add_reading(sensor_data, timestamp)
+        if features is False or features is None:
+            continue
+        rows.append((timestamp, row[6], float(np.min(detector.predict(features)))))
+    return rows
+
+
+def episodes(flags):
+    """Number of runs of consecutive True values."""
+    flags = np.asarray(flags, dtype=bool)
+    return int(np.sum(flags[1:] & ~flags[:-1]) + (flags[0] if len(flags) else 0))
+
+
+def replay(args):
+    from anomaly_detector import OneClassSVMDetector
+    from main import SCALER_PATH, select_model_path
+
+    detector = OneClassSVMDetector(args.model or select_model_path(), args.scaler or SCALER_PATH,
+                                   threshold=args.fixed_threshold)
+    calibrator = AdaptiveThreshold(args.false_alarm_rate, args.clear_rate, args.half_life,
+                                   args.min_count, args.temperature_bucket, args.fixed_threshold)
+    if args.state and calibrator.load(args.state):
+        print(f"Loaded threshold state from {args.state}")
+
+    trace = []
+    print(f"\n{'file':<36} {'windows':>8} {'adaptive':>9} {'episodes':>9} {'fixed':>9} {'episodes':>9}")
+    for sensor_file in args.files:
+        scores = replay_scores(sensor_file, detector)
+        adaptive = []
+        for timestamp, temperature, score in scores:
+            alarmed = calibrator.update(score, temperature)
+            adaptive.append(alarmed)
+            trace.append((sensor_file, timestamp, temperature, score,
+                          calibrator.threshold, calibrator.clear_threshold, alarmed))
+        fixed = [score < args.fixed_threshold for _, _, score in scores]
+        print(f"{sensor_file:<36} {len(scores):>8} {np.mean(adaptive) if scores else 0:>9.3f} "
+              f"{episodes(adaptive):>9} {np.mean(fixed) if scores else 0:>9.3f} {episodes(fixed):>9}")
+
+    print(f"\n{calibrator.summary()}")
+    if args.state:
+        calibrator.save(args.state)
+        print(f"Threshold state saved to {args.state}")
+    if args.trace:
+        import pandas as pd
+        pd.DataFrame(trace, columns=['file', 'timestamp', 'temperature', 'score', 'threshold',
+                                     'clear_threshold', 'alarmed']).to_csv(args.trace, index=False)
+        print(f"Trace saved to {args.trace}")
+    return 0
+
+
+def info(path):
+    calibrator = AdaptiveThreshold(temperature_bucket=None)
+    with np.load(path) as state:
+        calibrator.temperature_bucket = float(state['temperature_bucket']) or None
+    calibrator.min_count = 0
+    if not calibrator.load(path):
+        print(f"Cannot read {path}")
+        return 1
+    print(f"{path}: {calibrator.sketch.count:.0f} windows (decayed), alarm "
+          f"{'on' if calibrator.alarmed else 'off'}")
+    rates = [DEFAULT_FALSE_ALARM_RATE, DEFAULT_CLEAR_RATE]
+    print(f"  {'all':<12} {calibrator.sketch.count:>8.0f} windows  "
+          + "  ".join(f"q{r:g} {calibrator.sketch.quantile(r):.4f}" for r in rates))
+    for key in sorted(calibrator.buckets):
+        sketch = calibrator.buckets[key]
+        low = key * calibrator.temperature_bucket
+        label = f"{low:g}-{low + calibrator.temperature_bucket:g} C"
+        print(f"  {label:<12} {sketch.count:>8.0f} windows  "
+              + "  ".join(f"q{r:g} {sketch.quantile(r):.4f}" for r in rates))
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Replay recordings through the adaptive threshold")
+    parser.add_argument('files', nargs='+', help="raw sensor recordings, replayed in order")
+    parser.add_argument('--model', default=None, help="model file (default: as main.py)")
+    parser.add_argument('--scaler', default=None, help="scaler file (default: as main.py)")
+    parser.add_argument('--false-alarm-rate', type=float, default=DEFAULT_FALSE_ALARM_RATE)
+    parser.add_argument('--clear-rate', type=float, default=DEFAULT_CLEAR_RATE)
+    parser.add_argument('--half-life', type=float, default=DEFAULT_HALF_LIFE, help="in windows")
+    parser.add_argument('--min-count', type=float, default=DEFAULT_MIN_COUNT,
+                        help="windows before a sketch is used")
+    parser.add_argument('--temperature-bucket', type=float, default=DEFAULT_TEMPERATURE_BUCKET,
+                        help="degrees per bucket, 0 for one sketch")
+    parser.add_argument('--fixed-threshold', type=float, default=0.0,
+                        help="threshold during warm-up and for the comparison")
+    parser.add_argument('--state', default=None, help="load initial state from and save final state to this file")
+    parser.add_argument('--trace', default=None, help="write per-window scores and thresholds to this CSV")
+    return parser.parse_args(argv)
+
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == 'info':
+        return info(sys.argv[2])
+    if len(sys.argv) < 3 or sys.argv[1] != 'replay':
+        print(__doc__)
+        return 1
+    return replay(parse_args(sys.argv[2:]))
+
+if __name__ == "__main__":
+    exit(main())
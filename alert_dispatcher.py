@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python alert_dispatcher.py stub [port] [delay_s] [fail_rate]
+
+Non-blocking alert delivery for main.py.
+
+AlertDispatcher.submit() only puts the anomaly on a bounded queue; a
+background thread turns anomalies into messages and sends them through a
+transport, so a slow or failing network never holds up monitoring.
+
+- Coalescing: at most one message per min_interval seconds. The first
+  anomaly after a quiet period is sent at once; anomalies arriving during the
+  interval are summarised in one message at its end (count, worst score,
+  time span, readings at the worst score). Anomalies submitted with a stream
+  name (fleet.py) are coalesced per stream, and the message names it.
+- Retry: a failed send is retried with exponential backoff (backoff,
+  2 x backoff, ... capped at max_backoff) up to max_retries times. Retries
+  are scheduled per stream, so one stream backing off does not delay the
+  others. Anomalies keep accumulating into the stream's next summary
+  meanwhile, and anomalies dropped on a full queue are reported in the next
+  message of their own stream.
+- Transports have a send(to, message) method that raises on failure:
+  sms_alert.TwilioTransport (client created on first send), FileTransport
+  (one JSON line per message) and HTTPTransport (JSON POST, e.g. to the
+  stub server below).
+
+The stub command runs a local HTTP endpoint that accepts what HTTPTransport
+posts, optionally slowly or with random failures, to exercise throughput and
+back-pressure offline.
+"""
+
+import json
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+# Queued after the last anomaly to tell the worker to finish
+_STOP = object()
+
+
+class FileTransport:
+    """Appends each message as a JSON line to a local file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, to, message):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'time': datetime.now().isoformat(), 'to': to, 'body': message}) + '\n')
+
+
+class HTTPTransport:
+    """POSTs {'to', 'body'} as JSON to url; any non-2xx response is a failure."""
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, to, message):
+        import urllib.request
+
+        request = urllib.request.Request(
+            self.url, data=json.dumps({'to': to, 'body': message}).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class AlertSummary:
+    """Anomalies collected for one message."""
+
+    def __init__(self):
+        self.count = 0
+        self.worst_score = None
+        self.worst_sensor_data = None
+        self.first = None
+        self.last = None
+
+    def add(self, score, sensor_data, timestamp):
+        self.count += 1
+        if self.worst_score is None or score < self.worst_score:
+            self.worst_score = score
+            self.worst_sensor_data = sensor_data
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.last is None or timestamp > self.last:
+            self.last = timestamp
+
+    def message(self, dropped=0, stream=None):
+        alert = f"WIND TURBINE ALERT: {stream}\n" if stream else "WIND TURBINE ALERT\n"
+        if self.count == 1:
+            alert += f"Anomaly at {self.first:%H:%M:%S}\n"
+        else:
+            span = (self.last - self.first).total_seconds()
+            alert += (f"{self.count} anomalies in {span:.0f} s "
+                      f"({self.first:%H:%M:%S}-{self.last:%H:%M:%S})\n")
+        if dropped:
+            alert += f"({dropped} more not counted, queue full)\n"
+        alert += f"Worst SVM score: {self.worst_score:.3f}\n"
+        data = self.worst_sensor_data
+        if data:
+            alert += f"Accel: X={data['accel_x']:.2f}, Y={data['accel_y']:.2f}, Z={data['accel_z']:.2f}\n"
+            alert += f"Gyro: X={data['gyro_x']:.2f}, Y={data['gyro_y']:.2f}, Z={data['gyro_z']:.2f}\n"
+        return alert
+
+
+class AlertDispatcher:
+    """Queues anomalies and sends coalesced alerts from a background thread."""
+
+    def __init__(self, transport, to, min_interval=10.0, max_queue=1000,
+                 max_retries=5, backoff=1.0, max_backoff=60.0, send_timer=None):
+        self.transport = transport
+        self.to = to
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Optional metrics.Histogram observing each send attempt
+        self.send_timer = send_timer
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.last_message = None
+        # Per stream: anomalies dropped since its last message
+        self._dropped_unreported = {}
+
+        self._thread = threading.Thread(target=self._run, name='alerts', daemon=True)
+        self._thread.start()
+
+    def submit(self, score, sensor_data=None, timestamp=None, stream=None):
+        """Queue one anomaly; never blocks. Returns False if it was dropped."""
+        if timestamp is None:
+            timestamp = datetime.now()
+        with self._lock:
+            self.submitted += 1
+        try:
+            self._queue.put_nowait((stream, score, sensor_data, timestamp))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._dropped_unreported[stream] = self._dropped_unreported.get(stream, 0) + 1
+            return False
+
+    def close(self, timeout=30.0):
+        """Send what is pending (without further retries) and stop."""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def summary(self):
+        return (f"alerts   submitted {self.submitted}, sent {self.sent} messages, "
+                f"dropped {self.dropped}, retries {self.retries}, failed {self.failed}")
+
+    def _run(self):
+        # Per stream (None for main.py's single sensor): the summary waiting
+        # to be sent, a failed message waiting to be retried with its attempt
+        # number, and the earliest time the stream may send again. A stream
+        # backing off never holds up the others.
+        pending = {}
+        retrying = {}
+        next_send = {}
+        while True:
+            waiting = set(pending) | set(retrying)
+            if not waiting:
+                timeout = None
+            else:
+                timeout = max(0.0, min(next_send.get(s, 0.0) for s in waiting) - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            stop = item is _STOP
+            # Take everything already queued into the same messages
+            while item is not None and not stop:
+                stream, *anomaly = item
+                if stream not in pending:
+                    pending[stream] = AlertSummary()
+                pending[stream].add(*anomaly)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+                stop = item is _STOP
+
+            if stop:
+                # One last attempt for everything, without retries
+                for stream in list(retrying):
+                    if not self._send(retrying.pop(stream)[0]):
+                        self.failed += 1
+                for stream in list(pending):
+                    if not self._send(self._message(stream, pending.pop(stream))):
+                        self.failed += 1
+                return
+
+            now = time.monotonic()
+            for stream in [s for s in set(pending) | set(retrying) if now >= next_send.get(s, 0.0)]:
+                # A retry goes first; anomalies meanwhile wait for the next message
+                if stream in retrying:
+                    message, attempt = retrying.pop(stream)
+                else:
+                    message, attempt = self._message(stream, pending.pop(stream)), 0
+                if self._send(message):
+                    delay = self.min_interval
+                elif attempt < self.max_retries:
+                    self.retries += 1
+                    retrying[stream] = (message, attempt + 1)
+                    delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                else:
+                    self.failed += 1
+                    delay = self.min_interval
+                next_send[stream] = time.monotonic() + delay
+
+    def _message(self, stream, summary):
+        with self._lock:
+            dropped = self._dropped_unreported.pop(stream, 0)
+        return summary.message(dropped, stream)
+
+    def _send(self, message):
+        start = time.perf_counter()
+        try:
+            self.transport.send(self.to, message)
+        except Exception as e:
+            if self.send_timer:
+                self.send_timer.observe(time.perf_counter() - start)
+            logger.error("Error sending alert: %s", e)
+            return False
+        if self.send_timer:
+            self.send_timer.observe(time.perf_counter() - start)
+        self.sent += 1
+        self.last_message = message
+        logger.info("Alert sent (%d chars)", len(message))
+        return True
+
+
+class StubAlertServer:
+    """Local HTTP endpoint for HTTPTransport: records messages, can be slow or fail."""
+
+    def __init__(self, port=0, delay=0.0, fail_rate=0.0):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.messages = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(stub.delay)
+                if random.random() < stub.fail_rate:
+                    self.send_response(503)
+                else:
+                    stub.messages.append(json.loads(body))
+                    self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/alerts"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != 'stub':
+        print(__doc__)
+        return 1
+    args = sys.argv[2:]
+    port = int(args[0]) if len(args) > 0 else 8025
+    delay = float(args[1]) if len(args) > 1 else 0.0
+    fail_rate = float(args[2]) if len(args) > 2 else 0.0
+    stub = StubAlertServer(port, delay, fail_rate)
+    print(f"Stub alert endpoint at {stub.url} (delay {delay} s, fail rate {fail_rate})")
+    print("Press Ctrl+C to stop")
+    seen = 0
+    try:
+        while True:
+            time.sleep(0.5)
+            for message in stub.messages[seen:]:
+                print(f"--- to {message['to']}\n{message['body']}")
+            seen = len(stub.messages)
+    except KeyboardInterrupt:
+        stub.close()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
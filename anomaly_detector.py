@@ -1,12 +1,218 @@
 #!/usr/bin/env python3
-import joblib
+# Only NumPy is imported at module level so that loading a compact .npz model
+# (see export_compact) does not pull in pandas, sklearn or joblib. Those are
+# imported where the pickle/sklearn paths need them.
+import hashlib
+
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
+
+import features as feature_engine
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+# Layout version of the compact .npz model written by export_compact()
+COMPACT_FORMAT_VERSION = 1
+
+# Window length in seconds assumed for models that do not record theirs: one
+# rotation of the turbine, what every model used to be trained on
+DEFAULT_WINDOW_SIZE = 6.6
+
+
+def rbf_expansion(model):
+    """Return (centres, coefficients, intercept, gamma) of an RBF decision function.
+
+    Both supported model types score a standardized vector z as
+
+        decision(z) = sum_i coef_i * exp(-gamma * ||z - centre_i||^2) + intercept
+
+    - OneClassSVM(kernel='rbf'): centres are the support vectors, coefficients
+      dual_coef_.
+    - Pipeline of Nystroem(kernel='rbf') and a linear one-class model
+      (SGDOneClassSVM): centres are the Nystroem components, and the linear
+      weights are pushed back through the Nystroem normalization.
+    """
+    if getattr(model, 'kernel', None) == 'rbf' and hasattr(model, 'dual_coef_'):
+        return (model.support_vectors_, np.ravel(model.dual_coef_),
+                float(np.ravel(model.intercept_)[0]), float(model._gamma))
+
+    steps = getattr(model, 'steps', None)
+    if steps and len(steps) == 2:
+        kernel_map, linear = steps[0][1], steps[1][1]
+        if (getattr(kernel_map, 'kernel', None) == 'rbf' and hasattr(kernel_map, 'normalization_')
+                and hasattr(linear, 'coef_') and hasattr(linear, 'offset_')):
+            centres = kernel_map.components_
+            gamma = kernel_map.gamma if kernel_map.gamma is not None else 1.0 / centres.shape[1]
+            # decision = (k(z) @ normalization_.T) @ w - offset
+            coef = kernel_map.normalization_.T @ np.ravel(linear.coef_)
+            return centres, coef, -float(np.ravel(linear.offset_)[0]), float(gamma)
+
+    raise ValueError(f"Compiled scoring needs an RBF kernel model, got {type(model).__name__}")
+
+
+class CompiledRBFScorer:
+    """Allocation-free decision_function for an RBF one-class model plus StandardScaler.
+
+    For a standardized input z = (x - mean) / scale the RBF distance to a
+    support vector v is
+
+        gamma * ||z - v||^2 = sum_j (gamma / scale_j^2) * (x_j - (mean_j + scale_j * v_j))^2
+
+    so the scaler is folded into the support vectors (moved back to raw feature
+    space) and into per-feature weights once, at load time. Scoring a raw
+    feature vector is then one weighted squared distance, one exp and one dot
+    product, all written into preallocated buffers. Scores agree with
+    sklearn's decision_function to floating point rounding (~1e-12). Works for
+    any model rbf_expansion() understands.
+    """
+
+    def __init__(self, support_vectors, dual_coef, intercept, gamma, mean=None, scale=None):
+        support_vectors = np.asarray(support_vectors, dtype=np.float64)
+        n_features = support_vectors.shape[1]
+        mean = np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64)
+        scale = np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64)
+
+        self.gamma = float(gamma)
+        self.support_vectors = mean + scale * support_vectors
+        self.weights = self.gamma / (scale * scale)
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64).ravel()
+        self.intercept = float(intercept)
+        self.n_features = n_features
+
+        # Scratch buffers reused on every call
+        self._x = np.empty(n_features)
+        self._diff = np.empty_like(self.support_vectors)
+        self._kernel = np.empty(len(self.support_vectors))
+
+    @classmethod
+    def from_model(cls, model, scaler=None):
+        """Compile a fitted sklearn model and optional StandardScaler."""
+        return cls(*rbf_expansion(model), *scaler_params(scaler))
+
+    def score(self, features):
+        """Score one raw feature vector of shape (n_features,)."""
+        features = np.asarray(features)
+        # copyto would broadcast a scalar or a (1,) array over every feature
+        if features.shape != (self.n_features,):
+            raise ValueError(f"expected {self.n_features} features, got shape {features.shape}")
+        np.copyto(self._x, features)
+        np.subtract(self.support_vectors, self._x, out=self._diff)
+        np.multiply(self._diff, self._diff, out=self._diff)
+        np.dot(self._diff, self.weights, out=self._kernel)
+        np.negative(self._kernel, out=self._kernel)
+        np.exp(self._kernel, out=self._kernel)
+        return float(np.dot(self.dual_coef, self._kernel)) + self.intercept
+
+    def score_batch(self, matrix, chunk_size=1024):
+        """Score an (n_samples, n_features) matrix of raw features."""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        scores = np.empty(len(matrix))
+        # Chunks bound the (chunk, n_support_vectors, n_features) temporary
+        for start in range(0, len(matrix), chunk_size):
+            chunk = matrix[start:start + chunk_size]
+            diff = chunk[:, None, :] - self.support_vectors[None, :, :]
+            diff *= diff
+            kernel = np.exp(-(diff @ self.weights))
+            scores[start:start + len(chunk)] = kernel @ self.dual_coef + self.intercept
+        return scores
+
+
+def scaler_params(scaler):
+    # (mean, scale) of a StandardScaler; None where it does not apply
+    if scaler is None:
+        return None, None
+    return getattr(scaler, 'mean_', None), getattr(scaler, 'scale_', None)
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compact_source_digest(path):
+    """SHA-256 of the pickle a compact model was exported from, or None if unrecorded."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return str(data['source_sha256']) if 'source_sha256' in data.files else None
+    except (OSError, ValueError):
+        return None
+
+
+def export_compact(model, scaler, feature_names, feature_spec, output_path, source_digest=None):
+    """Write a model and scaler as a compact .npz that loads with NumPy only.
+
+    The file holds the RBF expansion (support vectors in scaled space, dual
+    coefficients, intercept, gamma), the scaler mean/scale, the feature names,
+    the feature statistics and, if known, the window size and the SHA-256 of
+    the model pickle it was made from (source_digest). Raises ValueError for models rbf_expansion()
+    cannot handle.
+    """
+    support_vectors, dual_coef, intercept, gamma = rbf_expansion(model)
+    mean, scale = scaler_params(scaler)
+    n_features = np.shape(support_vectors)[1]
+    if feature_spec:
+        stats = feature_spec['stats']
+        spec_version = feature_spec.get('version', feature_engine.FEATURE_SPEC_VERSION)
+    else:
+        stats = feature_engine.stats_from_feature_names(feature_names) if feature_names else ['mean', 'std']
+        spec_version = feature_engine.FEATURE_SPEC_VERSION
+    # Optional: older files without it load with DEFAULT_WINDOW_SIZE
+    extra = {}
+    if feature_spec and feature_spec.get('window_size') is not None:
+        extra['window_size'] = np.float64(feature_spec['window_size'])
+    if source_digest is not None:
+        extra['source_sha256'] = np.array(source_digest)
+    np.savez(
+        output_path,
+        format_version=np.int64(COMPACT_FORMAT_VERSION),
+        support_vectors=np.asarray(support_vectors, dtype=np.float64),
+        dual_coef=np.asarray(dual_coef, dtype=np.float64).ravel(),
+        intercept=np.float64(intercept),
+        gamma=np.float64(gamma),
+        scaler_mean=np.zeros(n_features) if mean is None else np.asarray(mean, dtype=np.float64),
+        scaler_scale=np.ones(n_features) if scale is None else np.asarray(scale, dtype=np.float64),
+        feature_names=np.array(feature_names, dtype=str),
+        feature_stats=np.array(stats, dtype=str),
+        feature_spec_version=np.int64(spec_version),
+        **extra,
+    )
+
+
+def export_model_files(model_path, scaler_path, output_path):
+    """Convert a model/scaler pickle pair into the compact .npz format."""
+    import joblib
+
+    model_data = joblib.load(model_path)
+    scaler_data = joblib.load(scaler_path)
+    if isinstance(model_data, dict):
+        model = model_data['model']
+        feature_names = model_data.get('feature_names', [])
+        feature_spec = model_data.get('feature_spec')
+    else:
+        model, feature_names, feature_spec = model_data, [], None
+    scaler = scaler_data['scaler'] if isinstance(scaler_data, dict) else scaler_data
+    export_compact(model, scaler, feature_names, feature_spec, output_path, file_sha256(model_path))
+
 
 class OneClassSVMDetector:
-    def __init__(self, model_path='models/model_svm.pkl', scaler_path='models/scaler.pkl', sensitivity=0.5, threshold=-0.5):
-        
+    def __init__(self, model_path='models/model_svm.pkl', scaler_path='models/scaler.pkl', sensitivity=0.5, threshold=-0.5,
+                 compiled=True):
+        # Set sensitivity (0.0 to 1.0, higher = less sensitive)
+        self.sensitivity = max(0.0, min(1.0, sensitivity))
+        # Set threshold directly
+        self.threshold = threshold
+        self.scorer = None
+
+        # A compact .npz model carries its own scaler and needs NumPy only
+        if str(model_path).endswith('.npz'):
+            self._load_compact(model_path)
+            return
+
+        import joblib
+
         # Load model
         try:
             model_data = joblib.load(model_path)
@@ -20,24 +226,23 @@ class OneClassSVMDetector:
             if isinstance(model_data, dict):
                 self.model = model_data['model']
                 self.feature_names = model_data.get('feature_names', [])
+                self.feature_spec = model_data.get('feature_spec')
                 print("Loaded model from dictionary")
                 print(f"Feature names: {self.feature_names}")
             else:
                 self.model = model_data
                 self.feature_names = []
+                self.feature_spec = None
                 print("Loaded model directly")
+            self.feature_stats = self._resolve_feature_stats()
+            print(f"Feature statistics: {self.feature_stats}")
             print(f"Model type: {type(self.model)}")
-            
-            # Set sensitivity (0.0 to 1.0, higher = less sensitive)
-            self.sensitivity = max(0.0, min(1.0, sensitivity))
             print(f"SVM sensitivity set to {self.sensitivity}")
-            
-            # Set threshold directly
-            self.threshold = threshold
             print(f"Anomaly threshold set to {self.threshold}")
         except Exception as e:
             print(f"Error loading model: {e}")
             self.model = None
+            self.feature_stats = feature_engine.resolve_stats('basic')
         
         # Load scaler
         try:
@@ -56,10 +261,106 @@ class OneClassSVMDetector:
         except (FileNotFoundError, IOError):
             print(f"Scaler file {scaler_path} not found. Using identity scaling.")
             self.scaler = None
+
+        # Compile the model and scaler into a fast scorer. Models that cannot
+        # be compiled keep using the sklearn path.
+        if compiled and self.model is not None:
+            try:
+                self.scorer = CompiledRBFScorer.from_model(self.model, self.scaler)
+                print("Using compiled RBF scorer")
+            except Exception as e:
+                print(f"Compiled scoring unavailable, using sklearn: {e}")
                 
+    def _load_compact(self, model_path):
+        self.model = None
+        self.scaler = None
+        self.scaler_feature_names = []
+        try:
+            with np.load(model_path, allow_pickle=False) as data:
+                if int(data['format_version']) != COMPACT_FORMAT_VERSION:
+                    raise ValueError(f"Unsupported compact model version {int(data['format_version'])}")
+                self.scorer = CompiledRBFScorer(
+                    data['support_vectors'], data['dual_coef'], data['intercept'], data['gamma'],
+                    data['scaler_mean'], data['scaler_scale'])
+                self.feature_names = [str(name) for name in data['feature_names']]
+                self.feature_spec = {
+                    'version': int(data['feature_spec_version']),
+                    'stats': [str(stat) for stat in data['feature_stats']],
+                }
+                if 'window_size' in data.files:
+                    self.feature_spec['window_size'] = float(data['window_size'])
+            self.feature_stats = self._resolve_feature_stats()
+            print(f"Loaded compact model from {model_path}")
+            print(f"Anomaly threshold set to {self.threshold}")
+        except Exception as e:
+            print(f"Error loading model: {e}")
+            self.scorer = None
+            self.feature_names = []
+            self.feature_spec = None
+            self.feature_stats = feature_engine.resolve_stats('basic')
+
+    def is_loaded(self):
+        return self.scorer is not None or self.model is not None
+
+    @property
+    def window_size(self):
+        """Window length in seconds the model was trained on."""
+        spec = getattr(self, 'feature_spec', None) or {}
+        return spec.get('window_size', DEFAULT_WINDOW_SIZE)
+
+    def _resolve_feature_stats(self):
+        # Statistics SensorBuffer must compute for this model: taken from the
+        # saved feature spec, else recovered from the feature names, else the
+        # basic set older models were trained on.
+        if self.feature_spec:
+            if self.feature_spec.get('version') != feature_engine.FEATURE_SPEC_VERSION:
+                print(f"Warning: model feature spec version {self.feature_spec.get('version')} "
+                      f"differs from {feature_engine.FEATURE_SPEC_VERSION}")
+            return feature_engine.resolve_stats(self.feature_spec['stats'])
+        if self.feature_names:
+            return feature_engine.stats_from_feature_names(self.feature_names)
+        return feature_engine.resolve_stats('basic')
+
+    def predict_batch(self, matrix):
+        """Decision scores for many feature vectors at once.
+
+        matrix is an (n_samples, n_features) array in feature_names order, or
+        a DataFrame containing those columns. Returns a float array of scores,
+        the same values predict() returns for each row.
+        """
+        if not self.is_loaded():
+            return np.zeros(len(matrix))
+        # DataFrame input: select the model's columns in order
+        if hasattr(matrix, 'columns') and self.feature_names:
+            matrix = matrix[self.feature_names]
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if len(matrix) == 0:
+            return np.zeros(0)
+
+        if self.scorer is not None:
+            return self.scorer.score_batch(matrix)
+
+        import pandas as pd
+
+        if self.scaler is not None:
+            if self.scaler_feature_names:
+                matrix = self.scaler.transform(pd.DataFrame(matrix, columns=self.scaler_feature_names))
+            else:
+                matrix = self.scaler.transform(matrix)
+        if hasattr(self.model, 'decision_function'):
+            return np.asarray(self.model.decision_function(matrix), dtype=np.float64)
+        return np.where(self.model.predict(matrix) == -1, -1.0, 1.0)
+
     def predict(self, features):
-        if features is None or self.model is None:
+        if features is None or not self.is_loaded():
             return 0.0
+
+        if self.scorer is not None:
+            try:
+                return self.scorer.score(features)
+            except Exception as e:
+                logger.error("Error in prediction: %s", e)
+                return 0.0
             
         # 1. np.array(features): Converts the input features to a NumPy array if it isn't already
         # 2. .reshape(1, -1): Reshapes the array to have 1 row and automatically determines the number of columns
@@ -72,20 +373,22 @@ class OneClassSVMDetector:
         # as it comes in, rather than batch processing multiple samples
         features = np.array(features).reshape(1, -1)
 
+        import pandas as pd
+
         # If a scaler is available, it means we trained the model with feature scaling
         # This is important for consistent performance and preventing features with larger values from dominating   
         if self.scaler is not None:
             try:
                 # Convert features to DataFrame with feature names if available
                 if hasattr(self, 'scaler_feature_names') and self.scaler_feature_names:
-                    print(f"Using scaler feature names: {self.scaler_feature_names}")
+                    logger.debug("Using scaler feature names: %s", self.scaler_feature_names)
                     features_df = pd.DataFrame(features, columns=self.scaler_feature_names)
                     features = self.scaler.transform(features_df)
                 else:
-                    print("No feature names available, using direct transformation")
+                    logger.debug("No feature names available, using direct transformation")
                     features = self.scaler.transform(features)
             except Exception as e:
-                print(f"Error in scaling: {e}")
+                logger.error("Error in scaling: %s", e)
                 return 0.0
         
         try:
@@ -101,8 +404,7 @@ class OneClassSVMDetector:
                 #    - Scores below the threshold are considered anomalies
                 #    - Scores above the threshold are considered normal
                 score = self.model.decision_function(features)[0]
-                print(f"SVM score: {score}")
-                print(f"Threshold: {self.threshold}")
+                logger.debug("SVM score: %s, threshold: %s", score, self.threshold)
                 
                 return float(score)
             else:
@@ -111,5 +413,5 @@ class OneClassSVMDetector:
                 score = -1.0 if pred == -1 else 1.0
                 return float(score)
         except Exception as e:
-            print(f"Error in prediction: {e}")
+            logger.error("Error in prediction: %s", e)
             return 0.0
\ No newline at end of file
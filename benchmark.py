@@ -0,0 +1,675 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python benchmark.py predict [model_file] [scaler_file] [features.csv] [iterations]
+    python benchmark.py startup [compact_model.npz] [model_file] [scaler_file]
+    python benchmark.py lcd [sensor_data.csv]
+    python benchmark.py alerts [n_anomalies] [delay_s] [fail_rate]
+    python benchmark.py logging [sensor_data.csv]
+    python benchmark.py fifo [sample_rate] [seconds]
+    python benchmark.py suite [--only NAME ...] [--quick] [--output FILE] [--baseline FILE]
+                              [--threshold FRACTION] [--save-baseline]
+
+predict: latency of OneClassSVMDetector.predict on single feature vectors,
+sklearn path vs compiled scorer, plus the largest score difference.
+
+startup: cold-start time of a fresh interpreter that imports sensor and
+anomaly_detector, loads the model and scores one vector, for the compact .npz
+and the pickle. Fails if the compact path exceeds STARTUP_BUDGET_S.
+
+lcd: LCD bus traffic for a recorded sensor file, drawing every reading the
+old way (clear and rewrite both lines) and with LCDAlert's diff renderer,
+on a FakeCharLCD.
+
+alerts: submit() latency and delivery for AlertDispatcher posting to a local
+stub HTTP endpoint that is slow and fails some requests.
+
+logging: cost per scored window of the monitoring path (buffer, features,
+predict) with every message logged at DEBUG and no rate limit, which is what
+the old unconditional print() calls did, against the default WARNING level
+with rate limiting. Output goes to os.devnull, so a real terminal or serial
+console would make the first case slower still.
+
+fifo: host CPU time, I2C transactions and bus time per sample on a simulated
+MPU6050, reading each sample with separate accel, gyro and temperature
+register reads (what adafruit_mpu6050's properties do) against burst FIFO
+reads every 20 ms decoded in one vectorized step, and how many frames are
+lost to FIFO overflows when it is polled too slowly.
+
+suite: the sensor -> features -> score pipeline on the bundled data, one
+benchmark per stage (see SUITE below): SensorBuffer.add_reading per reading,
+_process_window per window, OneClassSVMDetector.predict single and batch,
+extract_features.py end to end and training. Each reports mean, p50 and p99
+latency, throughput and the peak memory allocated during the calls
+(tracemalloc, in a separate untimed pass). Results are written as JSON to
+--output; with a baseline file (written by --save-baseline on the same
+machine) any benchmark whose p50 is more than --threshold slower than the
+baseline is reported as a regression and the exit status is 1.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detector import OneClassSVMDetector
+
+# Cold-start budget for main.py's model path on the Pi: interpreter start,
+# imports, model load and first score
+STARTUP_BUDGET_S = 1.0
+
+# Rough PCF8574 costs at 100 kHz I2C: one LCD byte (character or command)
+# is sent as two nibbles with enable pulses, and clear() waits ~2 ms more
+LCD_BYTE_S = 0.0008
+LCD_CLEAR_S = 0.002
+
+# Suite defaults: a benchmark whose p50 latency grows by more than
+# REGRESSION_THRESHOLD over the baseline fails the comparison
+SUITE_RESULTS = 'data/benchmark_results.json'
+SUITE_BASELINE = 'data/benchmark_baseline.json'
+REGRESSION_THRESHOLD = 0.20
+
+# Modules the compact path must not import
+HEAVY_MODULES = ['pandas', 'sklearn', 'joblib', 'twilio']
+
+_STARTUP_SCRIPT = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import sensor, anomaly_detector
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    detector = anomaly_detector.OneClassSVMDetector(sys.argv[1], sys.argv[2])
+loaded = time.perf_counter()
+detector.predict([0.0] * len(detector.feature_names))
+scored = time.perf_counter()
+print(json.dumps({
+    'import_s': imported - start,
+    'load_s': loaded - imported,
+    'first_predict_s': scored - loaded,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def time_calls(func, inputs, iterations):
+    # Latency of each call in seconds, cycling through inputs
+    latencies = np.empty(iterations)
+    n_inputs = len(inputs)
+    for i in range(iterations):
+        x = inputs[i % n_inputs]
+        start = time.perf_counter()
+        func(x)
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+
+def summarize(latencies):
+    return {
+        'mean_us': float(np.mean(latencies) * 1e6),
+        'p50_us': float(np.percentile(latencies, 50) * 1e6),
+        'p99_us': float(np.percentile(latencies, 99) * 1e6),
+        'per_second': float(1.0 / np.mean(latencies)),
+    }
+
+
+def print_summary(name, stats):
+    print(f"{name:<12} mean {stats['mean_us']:9.1f} us  p50 {stats['p50_us']:9.1f} us  "
+          f"p99 {stats['p99_us']:9.1f} us  {stats['per_second']:10.0f}/s")
+
+
+def bench_predict(model_file='models/model_svm.pkl', scaler_file='models/scaler.pkl',
+                  features_file='data/features_normal.csv', iterations=2000):
+    with contextlib.redirect_stdout(io.StringIO()):
+        sklearn_detector = OneClassSVMDetector(model_file, scaler_file, compiled=False)
+        compiled_detector = OneClassSVMDetector(model_file, scaler_file, compiled=True)
+    if compiled_detector.scorer is None:
+        print("Model cannot be compiled; nothing to compare")
+        return None
+
+    feature_names = sklearn_detector.feature_names
+    inputs = pd.read_csv(features_file)[feature_names].dropna().to_numpy()
+    print(f"Scoring {len(inputs)} feature vectors from {features_file}, {iterations} calls each")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        reference = np.array([sklearn_detector.predict(x) for x in inputs])
+        sklearn_latencies = time_calls(sklearn_detector.predict, inputs, iterations)
+    compiled_scores = np.array([compiled_detector.predict(x) for x in inputs])
+    compiled_latencies = time_calls(compiled_detector.predict, inputs, iterations)
+
+    results = {
+        'sklearn': summarize(sklearn_latencies),
+        'compiled': summarize(compiled_latencies),
+        'max_abs_score_diff': float(np.max(np.abs(reference - compiled_scores))),
+    }
+    print_summary('sklearn', results['sklearn'])
+    print_summary('compiled', results['compiled'])
+    print(f"Speedup: {results['sklearn']['mean_us'] / results['compiled']['mean_us']:.1f}x")
+    print(f"Max |score difference|: {results['max_abs_score_diff']:.3e}")
+    return results
+
+
+def measure_startup(model_file, scaler_file, runs=5):
+    # Median over fresh interpreters, so the OS file cache is warm but no
+    # Python module is
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', _STARTUP_SCRIPT, model_file, scaler_file],
+                                capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - start
+        result = json.loads(output.strip().splitlines()[-1])
+        result['total_s'] = total
+        samples.append(result)
+    summary = {key: float(np.median([s[key] for s in samples]))
+               for key in ['import_s', 'load_s', 'first_predict_s', 'total_s']}
+    summary['heavy_modules'] = samples[-1]['heavy_modules']
+    return summary
+
+
+def bench_startup(compact_file='models/model_svm.npz', model_file='models/model_svm.pkl',
+                  scaler_file='models/scaler.pkl'):
+    results = {
+        'compact': measure_startup(compact_file, scaler_file),
+        'pickle': measure_startup(model_file, scaler_file),
+    }
+    for name, r in results.items():
+        print(f"{name:<8} total {r['total_s']:6.3f} s  imports {r['import_s']:6.3f} s  "
+              f"load {r['load_s']:6.3f} s  first predict {r['first_predict_s'] * 1e3:6.2f} ms  "
+              f"heavy modules: {', '.join(r['heavy_modules']) or 'none'}")
+
+    compact = results['compact']
+    ok = compact['total_s'] <= STARTUP_BUDGET_S and not compact['heavy_modules']
+    print(f"Budget {STARTUP_BUDGET_S:.2f} s for the compact path: {'OK' if ok else 'EXCEEDED'}")
+    results['within_budget'] = ok
+    return results
+
+
+def lcd_bus_time(lcd):
+    return ((lcd.chars_written + lcd.cursor_moves + lcd.clears) * LCD_BYTE_S
+            + lcd.clears * LCD_CLEAR_S)
+
+
+def bench_lcd(sensor_file='data/sensor_data_normal.csv'):
+    from extract_features import load_sensor_data
+    from lcd_alert import FakeCharLCD, LCDAlert
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = load_sensor_data(sensor_file)
+    lines = [(f"X:{x:.1f} Y:{y:.1f}", f"Z:{z:.1f}")
+             for x, y, z in df[['accel_x', 'accel_y', 'accel_z']].to_numpy()]
+
+    # What main.py used to do for every reading
+    naive = FakeCharLCD()
+    for line1, line2 in lines:
+        naive.clear()
+        naive.cursor_pos = (0, 0)
+        naive.write_string(line1)
+        naive.cursor_pos = (1, 0)
+        naive.write_string(line2)
+
+    # The renderer, refreshed once per reading (refresh_rate = sample rate)
+    fake = FakeCharLCD()
+    renderer = LCDAlert(lcd=fake, start=False)
+    start = time.perf_counter()
+    for line1, line2 in lines:
+        renderer.show_reading(line1, line2)
+        renderer.refresh()
+    cpu = time.perf_counter() - start
+    if fake.lines() != naive.lines():
+        print("Screens differ after the run!")
+
+    results = {}
+    print(f"{len(lines)} readings from {sensor_file}")
+    for name, lcd in (('clear+write', naive), ('diff', fake)):
+        results[name] = {
+            'clears': lcd.clears,
+            'cursor_moves': lcd.cursor_moves,
+            'chars_written': lcd.chars_written,
+            'est_bus_ms_per_reading': lcd_bus_time(lcd) / len(lines) * 1e3,
+        }
+        r = results[name]
+        print(f"{name:<12} clears {r['clears']:6d}  cursor moves {r['cursor_moves']:6d}  "
+              f"chars {r['chars_written']:7d}  est. bus time {r['est_bus_ms_per_reading']:6.2f} ms/reading")
+    results['diff_cpu_us_per_refresh'] = cpu / len(lines) * 1e6
+    print(f"Diff renderer CPU: {results['diff_cpu_us_per_refresh']:.1f} us/refresh")
+    return results
+
+
+def bench_alerts(n_anomalies=5000, delay=0.2, fail_rate=0.3):
+    from alert_dispatcher import AlertDispatcher, HTTPTransport, StubAlertServer
+
+    stub = StubAlertServer(delay=delay, fail_rate=fail_rate)
+    dispatcher = AlertDispatcher(HTTPTransport(stub.url), '+1234567890', min_interval=0.5,
+                                 max_queue=1000, backoff=0.05, max_backoff=0.5)
+    sensor_data = dict.fromkeys(['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z'], 0.0)
+    latencies = np.empty(n_anomalies)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(n_anomalies):
+            t = time.perf_counter()
+            dispatcher.submit(-1.0 - i % 7, sensor_data)
+            latencies[i] = time.perf_counter() - t
+            # About 2000 anomalies a second: far more than any real burst
+            time.sleep(0.0005)
+        submit_time = time.perf_counter() - start
+        dispatcher.close()
+    stub.close()
+
+    results = {'submit': summarize(latencies), 'submitted': dispatcher.submitted,
+               'dropped': dispatcher.dropped, 'sent': dispatcher.sent,
+               'retries': dispatcher.retries, 'failed': dispatcher.failed,
+               'received_by_stub': len(stub.messages)}
+    print(f"{n_anomalies} anomalies in {submit_time:.2f} s to a stub with {delay} s delay "
+          f"and {fail_rate:.0%} failures")
+    print_summary('submit()', results['submit'])
+    print(f"Messages sent {dispatcher.sent} (stub received {len(stub.messages)}), "
+          f"retries {dispatcher.retries}, failed {dispatcher.failed}, dropped {dispatcher.dropped}")
+    return results
+
+
+def bench_logging(sensor_file='data/sensor_data_anomaly1.csv', model_file='models/model_svm.pkl',
+                  scaler_file='models/scaler.pkl', repeats=3):
+    import logutil
+    import main as monitor_main
+    import sensor
+    from extract_features import load_sensor_data
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = load_sensor_data(sensor_file)
+        detector = OneClassSVMDetector(model_file, scaler_file, threshold=0.0)
+    names = ['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z']
+    readings = [(datetime.fromisoformat(str(ts)), dict(zip(names, values)))
+                for ts, values in zip(df['timestamp'], df[names].to_numpy().tolist())]
+
+    def run():
+        buffer = sensor.SensorBuffer(window_size=6.6, hop=1.0, feature_set=detector.feature_stats)
+        monitor = monitor_main.Monitor(buffer, detector)
+        start = time.perf_counter()
+        for timestamp, sensor_data in readings:
+            monitor.score((timestamp, sensor_data, time.perf_counter()))
+        return time.perf_counter() - start, monitor
+
+    results = {}
+    print(f"{len(readings)} readings from {sensor_file}, best of {repeats} runs")
+    with open(os.devnull, 'w') as devnull:
+        for name, level, rate_limit in (('DEBUG', 'DEBUG', 0),
+                                        ('WARNING', logutil.DEFAULT_LEVEL, logutil.DEFAULT_RATE_LIMIT)):
+            best = None
+            for _ in range(repeats):
+                # Fresh handler per run, so the rate limiter starts empty
+                handler = logutil.configure(level, rate_limit, devnull)
+                records = []
+                handler.addFilter(lambda record: records.append(record) or True)
+                elapsed, monitor = run()
+                best = elapsed if best is None else min(best, elapsed)
+            windows = len(monitor.latencies)
+            results[name] = {'windows': windows, 'anomalies': monitor.n_anomalies,
+                             'records_written': len(records),
+                             'us_per_window': best / windows * 1e6,
+                             'us_per_reading': best / len(readings) * 1e6}
+            r = results[name]
+            print(f"{name:<8} {r['us_per_window']:8.1f} us/window  {r['us_per_reading']:6.1f} us/reading  "
+                  f"{r['records_written']:6d} log lines  ({windows} windows, {monitor.n_anomalies} anomalies)")
+    logutil.configure()
+    saved = 1 - results['WARNING']['us_per_window'] / results['DEBUG']['us_per_window']
+    print(f"Quiet hot path saves {saved:.0%} per window")
+    return results
+
+
+class _TimedRegisters:
+    # Register access that keeps the time spent inside the simulator, and
+    # the bytes a real bus would carry (address and register bytes included)
+    def __init__(self, registers):
+        self.registers = registers
+        self.seconds = 0.0
+        self.transactions = 0
+        self.bus_bytes = 0
+
+    def write(self, register, value):
+        start = time.perf_counter()
+        self.registers.write(register, value)
+        self.seconds += time.perf_counter() - start
+        self.transactions += 1
+        self.bus_bytes += 3
+
+    def read(self, register, n):
+        start = time.perf_counter()
+        data = self.registers.read(register, n)
+        self.seconds += time.perf_counter() - start
+        self.transactions += 1
+        self.bus_bytes += 3 + n
+        return data
+
+
+def bench_fifo(sample_rate=500.0, seconds=60.0, poll_interval=0.02):
+    import struct
+
+    from mpu6050_fifo import (ACCEL_XOUT_H, FRAME_SCALE, TEMP_OUT_H, MPU6050FIFO, SimulatedMPU6050,
+                              temperature_from_raw)
+
+    names = ['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z']
+    # Simulated time, advanced by hand, so the chip produces exactly the
+    # frames of `seconds`; time spent in the simulator is not counted
+    now = [0.0]
+    clock = lambda: now[0]
+
+    def run_polling(n_samples):
+        # Three register reads and a struct decode per sample, as the
+        # adafruit_mpu6050 properties do
+        registers = _TimedRegisters(SimulatedMPU6050(clock=clock))
+        MPU6050FIFO(registers, sample_rate, sleep=lambda s: None)
+        registers.seconds = registers.transactions = registers.bus_bytes = 0
+        start = time.perf_counter()
+        for i in range(n_samples):
+            now[0] = i / sample_rate
+            accel = struct.unpack('>hhh', registers.read(ACCEL_XOUT_H, 6))
+            gyro = struct.unpack('>hhh', registers.read(ACCEL_XOUT_H + 8, 6))
+            temp = temperature_from_raw(struct.unpack('>h', registers.read(TEMP_OUT_H, 2))[0])
+            sensor_data = {name: value * scale for name, value, scale in zip(names, accel + gyro, FRAME_SCALE)}
+            sensor_data['temp'] = temp
+        return n_samples, time.perf_counter() - start - registers.seconds, registers, None
+
+    def run_fifo(poll_interval):
+        now[0] = 0.0
+        registers = _TimedRegisters(SimulatedMPU6050(clock=clock))
+        fifo = MPU6050FIFO(registers, sample_rate, sleep=lambda s: None, clock=clock)
+        registers.seconds = registers.transactions = registers.bus_bytes = 0
+        frames = 0
+        start = time.perf_counter()
+        for i in range(round(seconds / poll_interval)):
+            now[0] = (i + 1) * poll_interval
+            timestamps_ns, values, temperature = fifo.read_block()
+            # What MPU6050FIFOSource does per frame
+            for row in values.tolist():
+                sensor_data = dict(zip(names, row))
+                sensor_data['temp'] = temperature
+            frames += len(values)
+        return frames, time.perf_counter() - start - registers.seconds, registers, fifo
+
+    n_samples = int(sample_rate * seconds)
+    results = {}
+    print(f"{seconds:g} s at {sample_rate:g} Hz from a simulated MPU6050; host CPU excludes the simulator, "
+          f"bus time is for 400 kHz I2C")
+    for name, (frames, cpu, registers, fifo) in (('polling', run_polling(n_samples)),
+                                                 ('fifo', run_fifo(poll_interval))):
+        r = results[name] = {
+            'frames': frames,
+            'host_us_per_sample': cpu / frames * 1e6,
+            'transactions_per_sample': registers.transactions / frames,
+            'bus_us_per_sample': registers.bus_bytes * 9 / 400e3 / frames * 1e6,
+        }
+        print(f"{name:<8} host {r['host_us_per_sample']:6.2f} us/sample  "
+              f"{r['transactions_per_sample']:6.3f} transactions/sample  "
+              f"bus {r['bus_us_per_sample']:6.1f} us/sample")
+        if fifo:
+            r['overflows'] = fifo.overflows
+            r['max_fill_bytes'] = fifo.max_fill
+            print(f"         polled every {poll_interval * 1e3:g} ms: {frames} of {n_samples} frames, "
+                  f"{fifo.overflows} overflows, max fill {fifo.max_fill} of 1024 bytes")
+
+    # Polling slower than the FIFO fills loses data, and is counted
+    for interval in (0.1, 0.25):
+        frames, _, _, fifo = run_fifo(interval)
+        results[f'fifo_poll_{interval:g}s'] = {'frames': frames, 'overflows': fifo.overflows}
+        print(f"         polled every {interval * 1e3:g} ms: {frames} of {n_samples} frames, "
+              f"{fifo.overflows} overflows")
+    return results
+
+
+def run_case(make, inputs, iterations, items_per_call=1):
+    """Times iterations calls of a fresh make()'d function over inputs, then
+    measures the peak memory of one more pass with tracemalloc."""
+    n = min(len(inputs), iterations)
+    func = make()
+    for x in inputs[:min(n, 10)]:
+        func(x)
+    func = make()
+    latencies = time_calls(func, inputs, iterations)
+
+    func = make()
+    tracemalloc.start()
+    for x in inputs[:n]:
+        func(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = summarize(latencies)
+    result['calls'] = iterations
+    result['items_per_call'] = items_per_call
+    result['items_per_second'] = result['per_second'] * items_per_call
+    result['peak_kib'] = peak / 1024
+    return result
+
+
+def suite_readings(sensor_file):
+    from extract_features import load_sensor_data
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = load_sensor_data(sensor_file)
+    timestamps = pd.to_datetime(df['timestamp']).dt.to_pydatetime()
+    names = ['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z']
+    return [(t, dict(zip(names, values))) for t, values in zip(timestamps, df[names].to_numpy().tolist())]
+
+
+def bench_add_reading(quick, hop=1.0, resample_rate=None):
+    import sensor
+
+    readings = suite_readings('data/sensor_data_normal.csv')
+
+    def make():
+        buffer = sensor.SensorBuffer(window_size=6.6, hop=hop, resample_rate=resample_rate)
+        return lambda reading: buffer.add_reading(reading[1], reading[0])
+    # One pass over the file, so timestamps keep increasing
+    return run_case(make, readings, len(readings))
+
+
+def bench_process_window(quick, hop=None):
+    import sensor
+
+    # One 6.6 s window of readings (about 26 at the recorded rate)
+    readings = suite_readings('data/sensor_data_normal.csv')
+    window = [r for r in readings if (r[0] - readings[0][0]).total_seconds() < 6.6]
+
+    def make():
+        buffer = sensor.SensorBuffer(window_size=1e9, hop=hop)
+        for timestamp, sensor_data in window:
+            buffer.add_reading(sensor_data, timestamp)
+        return lambda _: buffer._process_window()
+    return run_case(make, [None], 500 if quick else 5000)
+
+
+def suite_detector(compiled=True):
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = OneClassSVMDetector('models/model_svm.pkl', 'models/scaler.pkl', compiled=compiled)
+    inputs = pd.read_csv('data/features_normal.csv')[detector.feature_names].dropna().to_numpy()
+    return detector, inputs
+
+
+def bench_predict_single(quick, compiled=True):
+    detector, inputs = suite_detector(compiled)
+    iterations = 200 if quick else 2000
+    return run_case(lambda: detector.predict, inputs, iterations if compiled else iterations // 4)
+
+
+def bench_predict_batch(quick):
+    detector, inputs = suite_detector()
+    return run_case(lambda: detector.predict_batch, [inputs], 20 if quick else 200, len(inputs))
+
+
+def bench_extract_features(quick):
+    from extract_features import extract_file, load_sensor_data
+
+    sensor_file = 'data/sensor_data_normal.csv'
+    with contextlib.redirect_stdout(io.StringIO()):
+        n_rows = len(load_sensor_data(sensor_file))
+    with tempfile.TemporaryDirectory() as tmp:
+        output_file = os.path.join(tmp, 'features.csv')
+
+        def extract(_):
+            # Load, window, compute and write, as the command line does
+            with contextlib.redirect_stdout(io.StringIO()):
+                extract_file(sensor_file, output_file, 6.6)
+        return run_case(lambda: extract, [None], 3 if quick else 20, n_rows)
+
+
+def bench_spectral_features(quick, n_samples=26, n_windows=64):
+    import features as feature_engine
+
+    # A batch of windows, as extract_features.py passes them; 26 samples is
+    # a 6.6 s window at the recorded rate, 3300 one at 500 Hz
+    rng = np.random.default_rng(0)
+    batch = rng.standard_normal((n_windows, n_samples, 6))
+    stats = feature_engine.FEATURE_SETS['spectral']
+    return run_case(lambda: lambda _: feature_engine.compute_features(batch, stats), [None],
+                    20 if quick else 200, n_windows)
+
+
+def bench_train(quick):
+    from train_ocsvm import fit_model, get_features, load_data
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        features, feature_names = get_features(load_data('data/features_normal.csv'))
+
+    def fit(_):
+        with contextlib.redirect_stdout(io.StringIO()):
+            fit_model(features, feature_names)
+    return run_case(lambda: fit, [None], 3 if quick else 10, len(features))
+
+
+# name -> (function, unit of items_per_second)
+SUITE = {
+    'add_reading': (bench_add_reading, 'readings'),
+    'add_reading_tumbling': (lambda quick: bench_add_reading(quick, hop=None), 'readings'),
+    'add_reading_resampled': (lambda quick: bench_add_reading(quick, resample_rate=4.0), 'readings'),
+    'process_window': (bench_process_window, 'windows'),
+    'process_window_ring': (lambda quick: bench_process_window(quick, hop=1.0), 'windows'),
+    'predict': (bench_predict_single, 'vectors'),
+    'predict_sklearn': (lambda quick: bench_predict_single(quick, compiled=False), 'vectors'),
+    'predict_batch': (bench_predict_batch, 'vectors'),
+    'extract_features': (bench_extract_features, 'readings'),
+    'spectral_features': (bench_spectral_features, 'windows'),
+    'spectral_features_500hz': (lambda quick: bench_spectral_features(quick, 3300, 8), 'windows'),
+    'train': (bench_train, 'windows'),
+}
+
+
+def compare_results(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Names of the benchmarks whose p50 grew by more than threshold over the baseline."""
+    regressions = []
+    print(f"\n{'benchmark':<22}{'p50 us':>12}{'baseline':>12}{'change':>9}")
+    for name, r in results['benchmarks'].items():
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            print(f"{name:<22}{r['p50_us']:12.1f}{'-':>12}{'new':>9}")
+            continue
+        change = r['p50_us'] / base['p50_us'] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<22}{r['p50_us']:12.1f}{base['p50_us']:12.1f}{change:+9.0%}"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def bench_suite(argv):
+    parser = argparse.ArgumentParser(prog='benchmark.py suite')
+    parser.add_argument('--only', nargs='+', choices=list(SUITE), help="run only these benchmarks")
+    parser.add_argument('--quick', action='store_true', help="fewer calls, for a smoke test")
+    parser.add_argument('--output', default=SUITE_RESULTS)
+    parser.add_argument('--baseline', default=SUITE_BASELINE)
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed relative p50 slowdown, e.g. 0.2 for 20%%")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="also write the results to the baseline file")
+    args = parser.parse_args(argv)
+
+    results = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'quick': args.quick,
+        },
+        'benchmarks': {},
+    }
+    for name in args.only or SUITE:
+        func, unit = SUITE[name]
+        r = func(args.quick)
+        r['unit'] = unit
+        results['benchmarks'][name] = r
+        print(f"{name:<22} mean {r['mean_us']:10.1f} us  p50 {r['p50_us']:10.1f} us  "
+              f"p99 {r['p99_us']:10.1f} us  {r['items_per_second']:12.0f} {unit}/s  "
+              f"peak {r['peak_kib']:9.1f} KiB")
+
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {path}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_results(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('predict', 'startup', 'lcd', 'alerts', 'logging',
+                                                'fifo', 'suite'):
+        print(__doc__)
+        return 1
+    args = sys.argv[2:]
+
+    if sys.argv[1] == 'suite':
+        return bench_suite(args)
+
+    if sys.argv[1] == 'fifo':
+        bench_fifo(*[float(a) for a in args[:2]])
+        return 0
+
+    if sys.argv[1] == 'logging':
+        bench_logging(*args[:1])
+        return 0
+
+    if sys.argv[1] == 'alerts':
+        bench_alerts(*[t(a) for t, a in zip([int, float, float], args)])
+        return 0
+
+    if sys.argv[1] == 'lcd':
+        bench_lcd(*args[:1])
+        return 0
+
+    if sys.argv[1] == 'startup':
+        kwargs = dict(zip(['compact_file', 'model_file', 'scaler_file'], args))
+        return 0 if bench_startup(**kwargs)['within_budget'] else 1
+
+    kwargs = {}
+    for key, value in zip(['model_file', 'scaler_file', 'features_file'], args):
+        kwargs[key] = value
+    if len(args) > 3:
+        kwargs['iterations'] = int(args[3])
+    bench_predict(**kwargs)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
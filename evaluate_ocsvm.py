@@ -1,81 +1,243 @@
 #!/usr/bin/env python3
 """
 Usage:
-    python evaluate_ocsvm.py <model_file> <scaler_file> <normal_data.csv> <anomaly1.csv> <anomaly2.csv>
+    python evaluate_ocsvm.py <model_file> <scaler_file> <normal_data.csv> <anomaly1.csv> [anomaly2.csv ...]
+        [--threshold T] [--chunksize N] [--output-dir DIR] [--curve-file FILE]
+        [--window-size S] [--resample HZ] [--cache-dir DIR | --no-cache]
+
+Feature files are streamed in chunks through OneClassSVMDetector.predict_batch,
+so they can be arbitrarily large. Decision scores are computed once and used
+for the accuracy at --threshold (default 0.0, the same as model.predict), the
+ROC/PR curves, per-file recall and the threshold to pass to main.py.
+
+--output-dir writes one <name>_evaluation.csv per input with the features and
+prediction, prediction_label, decision_score, confidence_category and
+evaluation_timestamp columns, the layout of data/*_evaluation.csv.
+--curve-file writes the ROC/PR curve as CSV.
+
+Inputs can also be raw sensor recordings. They are windowed with
+--window-size (and --resample) and the features the model needs come from
+the feature cache shared with extract_features.py and train_ocsvm.py.
 """
 
-import pandas as pd
+import argparse
+import os
+from datetime import datetime
+
 import numpy as np
-import joblib
-import sys
+import pandas as pd
+
+import extract_features
+import features as feature_engine
+from anomaly_detector import OneClassSVMDetector
 from sensor import get_feature_names
 
-def main():
-    model_file = sys.argv[1]
-    scaler_file = sys.argv[2]
-    normal_file = sys.argv[3]
-    anomaly1_file = sys.argv[4]
-    anomaly2_file = sys.argv[5]
-    
+# Scores this far from the threshold are "strong"; closer ones are
+# weak_normal (above) or borderline (below)
+CONFIDENCE_MARGIN = 0.5
+
+
+def confidence_categories(scores, threshold):
+    margin = scores - threshold
+    return np.select(
+        [margin >= CONFIDENCE_MARGIN, margin >= 0, margin > -CONFIDENCE_MARGIN],
+        ['strong_normal', 'weak_normal', 'borderline'],
+        default='strong_anomaly')
+
+
+def evaluation_rows(features_df, scores, threshold, timestamp):
+    # Per-row output in the schema of data/*_evaluation.csv
+    # The predict() method of One-Class SVM returns:
+    #   +1 for samples that are classified as "normal" (inside the decision boundary)
+    #   -1 for samples that are classified as "anomaly" (outside the decision boundary)
+    # Here the boundary is moved to the threshold main.py would use.
+    predictions = np.where(scores < threshold, -1, 1)
+    out = features_df.copy()
+    out['prediction'] = predictions
+    out['prediction_label'] = np.where(predictions == 1, 'normal_operation', 'potential_anomaly')
+    out['decision_score'] = scores
+    out['confidence_category'] = confidence_categories(scores, threshold)
+    out['evaluation_timestamp'] = timestamp
+    return out
+
+
+def feature_chunks(filepath, feature_cols, chunksize, extraction=None):
+    # A raw recording is windowed (through the feature cache) in one go; a
+    # feature CSV is read in chunks
+    if extract_features.is_raw_file(filepath):
+        stats = feature_engine.stats_from_feature_names(feature_cols)
+        frame = extract_features.feature_frame(filepath, stats, **(extraction or {}))
+        return (frame.iloc[i:i + chunksize] for i in range(0, len(frame), chunksize))
+    return pd.read_csv(filepath, usecols=feature_cols, chunksize=chunksize)
+
+
+def score_file(detector, filepath, feature_cols, threshold, chunksize=10000, output_file=None,
+               extraction=None):
+    """Stream a feature CSV (or raw recording) through the detector and return its decision scores."""
+    timestamp = str(datetime.now())
+    scores = []
+    first = True
+    for chunk in feature_chunks(filepath, feature_cols, chunksize, extraction):
+        chunk = chunk[feature_cols].dropna()
+        chunk_scores = detector.predict_batch(chunk)
+        scores.append(chunk_scores)
+        if output_file is not None:
+            rows = evaluation_rows(chunk, chunk_scores, threshold, timestamp)
+            rows.to_csv(output_file, mode='w' if first else 'a', header=first, index=False)
+        first = False
+    return np.concatenate(scores) if scores else np.zeros(0)
+
+
+def threshold_sweep(normal_scores, anomaly_scores):
+    """Detection rates for every distinct threshold, in one vectorized pass.
+
+    A window is flagged when its score is below the threshold (as in
+    main.py). Candidate thresholds are the midpoints between consecutive
+    distinct scores plus one below and one above all of them. Anomalies are
+    the positive class.
+    """
+    all_scores = np.unique(np.concatenate([normal_scores, anomaly_scores]))
+    if len(all_scores) == 0:
+        raise ValueError("No scores to sweep")
+    thresholds = np.concatenate([
+        [all_scores[0] - 1.0],
+        (all_scores[:-1] + all_scores[1:]) / 2,
+        [all_scores[-1] + 1.0],
+    ])
+
+    # Number of scores strictly below each threshold
+    flagged_anomalies = np.searchsorted(np.sort(anomaly_scores), thresholds, side='left')
+    flagged_normals = np.searchsorted(np.sort(normal_scores), thresholds, side='left')
+
+    n_anomaly = max(len(anomaly_scores), 1)
+    n_normal = max(len(normal_scores), 1)
+    tpr = flagged_anomalies / n_anomaly
+    fpr = flagged_normals / n_normal
+    flagged = flagged_anomalies + flagged_normals
+    precision = np.divide(flagged_anomalies, flagged, out=np.ones(len(thresholds)), where=flagged > 0)
+    accuracy = (flagged_anomalies + (len(normal_scores) - flagged_normals)) / (len(anomaly_scores) + len(normal_scores))
+
+    return pd.DataFrame({
+        'threshold': thresholds,
+        'tpr': tpr,
+        'fpr': fpr,
+        'precision': precision,
+        'recall': tpr,
+        'accuracy': accuracy,
+    })
+
+
+def summarize_sweep(curve):
+    # Area under the ROC curve (fpr and tpr both increase with the threshold)
+    tpr = curve['tpr'].to_numpy()
+    fpr = curve['fpr'].to_numpy()
+    roc_auc = float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+    # Average precision: precision weighted by each recall step
+    recall_steps = np.diff(curve['recall'].to_numpy(), prepend=0.0)
+    average_precision = float(np.sum(recall_steps * curve['precision'].to_numpy()))
+    # Best threshold by Youden's J (tpr - fpr)
+    best = curve.iloc[int(np.argmax(curve['tpr'] - curve['fpr']))]
+    return roc_auc, average_precision, best
+
+
+def output_name(filepath, output_dir):
+    # data/features_normal.csv (or sensor_data_normal.csv) -> <output_dir>/normal_evaluation.csv
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    for prefix in ('features_', 'sensor_data_'):
+        if stem.startswith(prefix):
+            stem = stem[len(prefix):]
+    return os.path.join(output_dir, f"{stem}_evaluation.csv")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a One-Class SVM on normal and anomaly feature files")
+    parser.add_argument('model_file')
+    parser.add_argument('scaler_file')
+    parser.add_argument('normal_file')
+    parser.add_argument('anomaly_files', nargs='+')
+    parser.add_argument('--threshold', type=float, default=0.0,
+                        help="decision score below which a window is an anomaly")
+    parser.add_argument('--chunksize', type=int, default=10000, help="rows read per chunk")
+    parser.add_argument('--output-dir', default=None, help="write per-row evaluation CSVs here")
+    parser.add_argument('--curve-file', default=None, help="write the ROC/PR curve to this CSV")
+    extract_features.add_extraction_args(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    threshold = args.threshold
+
     # Load model and scaler
-    model_data = joblib.load(model_file)
-    scaler_data = joblib.load(scaler_file)
-    model = model_data['model']
-    scaler = scaler_data['scaler']
-    
-    feature_cols = get_feature_names()
-    
+    detector = OneClassSVMDetector(args.model_file, args.scaler_file, threshold=threshold)
+    if not detector.is_loaded():
+        return 1
+
+    # Use the features the model was trained on; older pickles without
+    # feature names were trained on the basic set
+    feature_cols = detector.feature_names or get_feature_names()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    extraction = extract_features.extraction_options(args)
+
+    def score(filepath):
+        output_file = output_name(filepath, args.output_dir) if args.output_dir else None
+        scores = score_file(detector, filepath, feature_cols, threshold, args.chunksize, output_file,
+                            extraction)
+        if output_file:
+            print(f"Per-row results saved to: {output_file}")
+        return scores
+
     # Process normal data
-    normal_df = pd.read_csv(normal_file)    
-    normal_df = normal_df.dropna()
-    normal_features = normal_df[feature_cols]
-    normal_scaled = scaler.transform(normal_features)
+    normal_scores = score(args.normal_file)
+    print(f"Loaded {len(normal_scores)} normal samples")
+
+    anomaly_scores = {}
+    for i, filepath in enumerate(args.anomaly_files, start=1):
+        anomaly_scores[filepath] = score(filepath)
+        print(f"Loaded {len(anomaly_scores[filepath])} Anomaly {i} samples")
+    all_anomaly_scores = np.concatenate(list(anomaly_scores.values()))
 
-    # The predict() method of One-Class SVM returns:
-        #   +1 for samples that are classified as "normal" (inside the decision boundary)
-        #   -1 for samples that are classified as "anomaly" (outside the decision boundary)
-        # For anomaly data, we expect most samples to be classified as -1 (anomaly)
-        # If many samples are classified as +1, it means the model is missing anomalies
-    normal_predictions = model.predict(normal_scaled)
-    print(f"Loaded {len(normal_df)} normal samples")
-    
-    anomaly_files = {
-        "Anomaly 1": anomaly1_file,
-        "Anomaly 2": anomaly2_file
-    }
-    
-    anomaly_dfs = []
-    anomaly_predictions = []
-    
-    for name, filepath in anomaly_files.items():
-        anomaly_df = pd.read_csv(filepath)
-        anomaly_df = anomaly_df.dropna()
-        anomaly_features = anomaly_df[feature_cols]
-        anomaly_scaled = scaler.transform(anomaly_features)
-        predictions = model.predict(anomaly_scaled)
-        anomaly_dfs.append(anomaly_df)
-        anomaly_predictions.append(predictions)
-        print(f"Loaded {len(anomaly_df)} {name} samples")
-    
-    all_anomaly_predictions = np.concatenate(anomaly_predictions)
-    
-    # Calculate metrics for normal data
     # Count how many normal samples were correctly classified
-    n_normal_correct = sum(normal_predictions == 1)
-    total_normal = len(normal_predictions)
-    
+    n_normal_correct = int(np.sum(normal_scores >= threshold))
+    total_normal = len(normal_scores)
+
     # Count how many anomaly samples were correctly classified
-    n_anomaly_correct = sum(all_anomaly_predictions == -1)
-    total_anomaly = len(all_anomaly_predictions)
+    n_anomaly_correct = int(np.sum(all_anomaly_scores < threshold))
+    total_anomaly = len(all_anomaly_scores)
     total_samples = total_normal + total_anomaly
     correct_predictions = n_normal_correct + n_anomaly_correct
     accuracy = correct_predictions / total_samples
-    
+
     print(f"Total samples: {total_samples}")
     print(f"Correct predictions: {correct_predictions}")
     print(f"Overall accuracy: {accuracy:.3f}")
 
+    # Full curve from the same scores
+    curve = threshold_sweep(normal_scores, all_anomaly_scores)
+    roc_auc, average_precision, best = summarize_sweep(curve)
+    best_threshold = float(best['threshold'])
+
+    print(f"\nROC AUC: {roc_auc:.3f}")
+    print(f"Average precision: {average_precision:.3f}")
+    print(f"Best threshold: {best_threshold:.4f} "
+          f"(recall {best['tpr']:.3f}, false alarm rate {best['fpr']:.3f}, accuracy {best['accuracy']:.3f})")
+
+    print("\nPer-file recall:")
+    print(f"  {'file':<40} {'at ' + format(threshold, '.3f'):>10} {'at best':>10}")
+    print(f"  {args.normal_file + ' (specificity)':<40} "
+          f"{np.mean(normal_scores >= threshold):>10.3f} {np.mean(normal_scores >= best_threshold):>10.3f}")
+    for filepath, scores in anomaly_scores.items():
+        print(f"  {filepath:<40} {np.mean(scores < threshold):>10.3f} {np.mean(scores < best_threshold):>10.3f}")
+
+    print(f"\nRun main.py with threshold {best_threshold:.4f}, e.g. python main.py true {best_threshold:.4f}")
+
+    if args.curve_file:
+        curve.to_csv(args.curve_file, index=False)
+        print(f"ROC/PR curve saved to: {args.curve_file}")
+
     return 0
 
 if __name__ == "__main__":
-    exit(main()) 
\ No newline at end of file
+    exit(main())
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python export_model.py <model_file.pkl> <scaler_file.pkl> [output_file.npz]
+
+Writes the model and scaler as a compact .npz (support vectors, coefficients,
+intercept, gamma, scaler mean/scale, feature names and statistics) that
+OneClassSVMDetector loads with NumPy only. The output defaults to the model
+path with a .npz extension. train_ocsvm.py writes this file automatically.
+"""
+
+import os
+import sys
+
+from anomaly_detector import export_model_files
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return 1
+    model_file = sys.argv[1]
+    scaler_file = sys.argv[2]
+    output_file = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(model_file)[0] + '.npz'
+
+    try:
+        export_model_files(model_file, scaler_file, output_file)
+    except Exception as e:
+        print(f"Error exporting model: {e}")
+        return 1
+    print(f"Compact model saved to {output_file} ({os.path.getsize(output_file)} bytes)")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
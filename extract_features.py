@@ -1,98 +1,418 @@
 #!/usr/bin/env python3
 """
 USAGE:
-    python extract_features_using_sensor.py <input_file> [output_file] [sampling_rate] [window_size]
+    python extract_features.py <input_file> <output_file> <sampling_rate> <window_size> [--streaming]
+    python extract_features.py --inputs <a.csv> <b.csv> ... --output-dir <dir> <sampling_rate> <window_size> [--workers N]
+
+Options:
+    --feature-set basic|full|spectral   features to compute (default: basic)
+    --window-samples N                  fixed-count windows of N readings instead of window_size seconds
+    --step-samples M                    readings between fixed-count window starts (default: N)
+    --resample HZ                       interpolate onto a uniform HZ grid first
+    --max-gap S                         with --resample, longest gap bridged (default: 1.0)
+    --cache-dir DIR                     feature cache (default: data/feature_cache)
+    --no-cache                          always extract, and do not store the result
+
+Input files are raw sensor CSVs or binary stores written by raw_store.py
+(.wtr). The default batch engine parses the timestamps once, finds the window
+boundaries with searchsorted and computes the features with grouped NumPy
+reductions. Its output is identical to feeding the rows one by one through
+SensorBuffer, which is still available with --streaming.
+
+With --resample HZ, the readings are first interpolated onto a uniform grid at
+HZ (see resample.py), so every window holds exactly round(window_size * HZ)
+samples; --window-samples and
+--step-samples then count grid samples. No window spans a gap longer than
+--max-gap seconds.
+
+Batch results go through the feature cache (see feature_cache.py): running
+again on an unchanged file with the same options reads the features back
+instead of extracting them.
 """
 
-import pandas as pd
+import argparse
+import os
 import sys
-from sensor import SensorBuffer, get_feature_names
-
-def main():
-    
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
-    sampling_rate = int(sys.argv[3])
-    window_size = float(sys.argv[4])
-    
-    print("Starting feature extraction using SensorBuffer...")
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import features as feature_engine
+import resample
+from feature_cache import CACHE_DIR, FeatureCache
+from raw_store import RAW_STORE_EXT, RawStoreReader
+from sensor import SensorBuffer, SENSOR_NAMES, get_feature_names
+
+COLUMNS = [
+    'timestamp',
+    'accel_x', 'accel_y', 'accel_z',
+    'gyro_x', 'gyro_y', 'gyro_z',
+    'temperature'
+]
+
+def has_header(input_file):
+    # Files written by sensor.py start with a header row; the bundled
+    # recordings do not
+    with open(input_file) as f:
+        return f.readline().startswith(COLUMNS[0])
+
+
+def is_raw_file(input_file):
+    """True for a raw store or raw sensor CSV, False for a feature CSV."""
+    if input_file.endswith(RAW_STORE_EXT):
+        return True
+    with open(input_file) as f:
+        first = f.readline().split(',', 1)[0]
+    if first == COLUMNS[0]:
+        return True
+    try:
+        # Headerless recordings start with an ISO timestamp
+        pd.Timestamp(first)
+        return True
+    except ValueError:
+        return False
+
+
+def load_sensor_data(input_file):
+    # Load sensor data, from a binary raw store or a CSV
+    if input_file.endswith(RAW_STORE_EXT):
+        df = RawStoreReader(input_file).to_dataframe()
+    else:
+        df = pd.read_csv(input_file, names=COLUMNS, header=0 if has_header(input_file) else None)
+    print(f"Loaded {len(df)} rows of sensor data")
+
+    # Drop missing values
+    missing = df.isnull().sum()
+    if missing.any():
+        print("\nDropping rows with missing values:")
+        print(missing[missing > 0])
+        df = df.dropna()
+        print(f"Remaining rows: {len(df)}")
+    return df
+
+
+def extract_features_streaming(df, window_size, feature_set='basic',
+                               resample_rate=None, max_gap=resample.DEFAULT_MAX_GAP):
+    # Create a SensorBuffer instance
+    buffer = SensorBuffer(window_size=window_size, feature_set=feature_set,
+                          resample_rate=resample_rate, max_gap=max_gap)
+
+    # Process data row by row
+    all_features = []
+    window_count = 0
+
+    for _, row in df.iterrows():
+        # Create sensor data dictionary
+        sensor_data = {
+            'accel_x': row['accel_x'],
+            'accel_y': row['accel_y'],
+            'accel_z': row['accel_z'],
+            'gyro_x': row['gyro_x'],
+            'gyro_y': row['gyro_y'],
+            'gyro_z': row['gyro_z'],
+            'temp': row['temperature']
+        }
+
+        # Add reading to buffer
+        features = buffer.add_reading(sensor_data, timestamp=pd.to_datetime(row['timestamp']))
+
+        # If features were extracted, add them to the list
+        if features is not False:
+            all_features.append(features)
+            window_count += 1
+
+            if window_count % 10 == 0:
+                print(f"Processed {window_count} windows...")
+
+    return all_features
+
+
+def window_bounds(timestamps_ns, window_size):
+    """Return (starts, ends) row indices of the windows SensorBuffer would emit.
+
+    A window closes on the first reading at least ``window_size`` seconds
+    after the reading that closed the previous one (or after the first
+    reading), and includes that reading. Trailing readings that never close a
+    window are dropped, as in the streaming path.
+    """
+    n = len(timestamps_ns)
+    starts = []
+    ends = []
+    if n == 0:
+        return np.array(starts, dtype=np.intp), np.array(ends, dtype=np.intp)
+
+    def elapsed(i, origin):
+        # Same arithmetic as Timedelta.total_seconds() in the streaming path
+        return (timestamps_ns[i] - origin) / 1e9
+
+    seconds = (timestamps_ns - timestamps_ns[0]) / 1e9
+    monotonic = bool(np.all(np.diff(timestamps_ns) >= 0))
+    start = 0
+    anchor = 0
+    while True:
+        origin = timestamps_ns[anchor]
+        if monotonic:
+            end = int(np.searchsorted(seconds, seconds[anchor] + window_size, side='left'))
+            end = min(max(end, start), n)
+            # searchsorted works on rounded offsets; nudge the index so the
+            # boundary agrees with the exact elapsed-time comparison.
+            while end > start and elapsed(end - 1, origin) >= window_size:
+                end -= 1
+            while end < n and not (elapsed(end, origin) >= window_size):
+                end += 1
+        else:
+            end = start
+            while end < n and not (elapsed(end, origin) >= window_size):
+                end += 1
+        if end >= n:
+            break
+        starts.append(start)
+        ends.append(end + 1)
+        start = end + 1
+        anchor = end
+        if start >= n:
+            break
+    return np.array(starts, dtype=np.intp), np.array(ends, dtype=np.intp)
+
+
+def count_window_bounds(n_rows, window_samples, step_samples=None):
+    """Return (starts, ends) for fixed-count windows of window_samples readings."""
+    if step_samples is None:
+        step_samples = window_samples
+    starts = np.arange(0, max(n_rows - window_samples + 1, 0), step_samples, dtype=np.intp)
+    return starts, starts + window_samples
+
+
+def features_for_windows(data, starts, ends, stats):
+    # Group windows by sample count so each group is one (k, n, 6) batch that
+    # the feature engine processes in a single vectorized pass.
+    features = np.empty((len(starts), len(SENSOR_NAMES) * len(stats)))
+    lengths = ends - starts
+    for n in np.unique(lengths):
+        rows = np.flatnonzero(lengths == n)
+        idx = starts[rows][:, None] + np.arange(n)
+        features[rows] = feature_engine.compute_features(data[idx], stats)
+    return features
+
+
+def extract_features_batch(df, window_size, feature_set='basic',
+                           window_samples=None, step_samples=None,
+                           resample_rate=None, max_gap=resample.DEFAULT_MAX_GAP):
+    stats = feature_engine.resolve_stats(feature_set)
+    data = df[SENSOR_NAMES].to_numpy(dtype=np.float64)
+
+    if resample_rate is not None:
+        # Fixed-rate grid: every window has the same sample count, so all
+        # windows go through the feature engine as one batch
+        timestamps = pd.to_datetime(df['timestamp']).values.astype('datetime64[ns]').astype(np.int64)
+        data, segment_starts = resample.resample(timestamps, data, resample_rate, max_gap)
+        if window_samples is None:
+            window_samples = max(1, int(round(window_size * resample_rate)))
+        starts, ends = resample.grid_window_bounds(segment_starts, len(data), window_samples,
+                                                   step_samples)
+    elif window_samples is not None:
+        starts, ends = count_window_bounds(len(data), window_samples, step_samples)
+    else:
+        # Parse all timestamps at once
+        timestamps = pd.to_datetime(df['timestamp']).values.astype('datetime64[ns]').astype(np.int64)
+        starts, ends = window_bounds(timestamps, window_size)
+
+    return features_for_windows(data, starts, ends, stats)
+
+
+def cached_features(input_file, window_size, feature_set='basic', window_samples=None,
+                    step_samples=None, resample_rate=None, max_gap=resample.DEFAULT_MAX_GAP,
+                    cache=None):
+    """Batch features of a raw file, read from cache when it already holds them.
+
+    cache is a FeatureCache, or None to always extract.
+    """
+    def compute():
+        df = load_sensor_data(input_file)
+        return extract_features_batch(df, window_size, feature_set, window_samples,
+                                      step_samples, resample_rate, max_gap)
+
+    if cache is None:
+        return compute()
+    params = {
+        'window_size': window_size,
+        'window_samples': window_samples,
+        'step_samples': step_samples,
+        'resample_rate': resample_rate,
+        'max_gap': max_gap if resample_rate is not None else None,
+        'stats': feature_engine.resolve_stats(feature_set),
+    }
+    hits = cache.hits
+    features = cache.get_or_compute(input_file, params, compute)
+    if cache.hits > hits:
+        print(f"Features of {input_file} read from {cache.directory}")
+    return features
+
+
+def feature_frame(input_file, feature_set='basic', window_size=6.6, resample_rate=None,
+                  max_gap=resample.DEFAULT_MAX_GAP, cache=None):
+    """Window features of a raw sensor file as a DataFrame with get_feature_names() columns."""
+    features = cached_features(input_file, window_size, feature_set, resample_rate=resample_rate,
+                               max_gap=max_gap, cache=cache)
+    return pd.DataFrame(features, columns=get_feature_names(feature_set))
+
+
+def add_extraction_args(parser):
+    """Options of the train/evaluate scripts for raw sensor files given as input."""
+    group = parser.add_argument_group("raw sensor input",
+                                      "raw recordings are windowed and cached like extract_features.py")
+    group.add_argument('--window-size', type=float, default=6.6, help="window length in seconds")
+    group.add_argument('--resample', type=float, default=None, metavar='HZ',
+                       help="resample onto a uniform HZ grid before windowing")
+    group.add_argument('--max-gap', type=float, default=resample.DEFAULT_MAX_GAP,
+                       help="with --resample, longest gap in seconds to interpolate across")
+    group.add_argument('--cache-dir', default=CACHE_DIR, help="feature cache directory")
+    group.add_argument('--no-cache', action='store_true', help="do not read or write the feature cache")
+
+
+def extraction_options(args):
+    """feature_frame() keyword arguments from add_extraction_args() options."""
+    return {
+        'window_size': args.window_size,
+        'resample_rate': args.resample,
+        'max_gap': args.max_gap,
+        'cache': None if args.no_cache else FeatureCache(args.cache_dir),
+    }
+
+
+def extract_file(input_file, output_file, window_size, streaming=False, feature_set='basic',
+                 window_samples=None, step_samples=None, resample_rate=None,
+                 max_gap=resample.DEFAULT_MAX_GAP, cache_dir=None):
+    feature_names = get_feature_names(feature_set)
+
+    if streaming:
+        df = load_sensor_data(input_file)
+        all_features = extract_features_streaming(df, window_size, feature_set,
+                                                  resample_rate, max_gap)
+    else:
+        cache = FeatureCache(cache_dir) if cache_dir else None
+        all_features = cached_features(input_file, window_size, feature_set,
+                                       window_samples, step_samples,
+                                       resample_rate, max_gap, cache)
+    window_count = len(all_features)
+
+    print(f"\nTotal windows processed: {window_count}")
+
+    if window_count == 0:
+        print("No windows were processed. Check your data and parameters.")
+        return 1
+
+    # Convert to DataFrame
+    features_df = pd.DataFrame(all_features, columns=feature_names)
+    print(f"Feature matrix shape: {features_df.shape}")
+
+    # Save features
+    features_df.to_csv(output_file, index=False)
+    print(f"\nFeatures saved to: {output_file}")
+    return 0
+
+
+def _extract_job(job):
+    input_file, output_file, window_size, options = job
+    try:
+        return input_file, extract_file(input_file, output_file, window_size, **options)
+    except Exception as e:
+        print(f"Error processing {input_file}: {str(e)}")
+        return input_file, 1
+
+
+def output_name(input_file, output_dir):
+    # data/sensor_data_normal.csv -> <output_dir>/features_normal.csv
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    if stem.startswith('sensor_data_'):
+        stem = stem[len('sensor_data_'):]
+    return os.path.join(output_dir, f"features_{stem}.csv")
+
+
+def extract_many(input_files, output_dir, window_size, workers=None, **options):
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(f, output_name(f, output_dir), window_size, options) for f in input_files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = dict(pool.map(_extract_job, jobs))
+    failed = [f for f, code in results.items() if code != 0]
+    for f in failed:
+        print(f"Failed: {f}")
+    return 1 if failed else 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Extract window features from raw sensor CSVs")
+    parser.add_argument('paths', nargs='+',
+                        help="<input_file> <output_file> <sampling_rate> <window_size>, "
+                             "or <sampling_rate> <window_size> with --inputs")
+    parser.add_argument('--streaming', action='store_true',
+                        help="feed rows through SensorBuffer one at a time")
+    parser.add_argument('--inputs', nargs='+', help="raw CSVs to process in parallel")
+    parser.add_argument('--output-dir', default='data', help="output directory for --inputs")
+    parser.add_argument('--workers', type=int, default=None, help="process pool size for --inputs")
+    parser.add_argument('--feature-set', default='basic', choices=sorted(feature_engine.FEATURE_SETS),
+                        help="features to compute")
+    parser.add_argument('--window-samples', type=int, default=None,
+                        help="use fixed-count windows of this many readings")
+    parser.add_argument('--step-samples', type=int, default=None,
+                        help="readings between fixed-count window starts")
+    parser.add_argument('--resample', type=float, default=None, metavar='HZ',
+                        help="resample onto a uniform HZ grid before windowing")
+    parser.add_argument('--max-gap', type=float, default=resample.DEFAULT_MAX_GAP,
+                        help="with --resample, longest gap in seconds to interpolate across")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="feature cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the feature cache")
+    args = parser.parse_args(argv)
+
+    if args.streaming and args.window_samples is not None:
+        parser.error("--window-samples is only supported by the batch engine")
+    if args.resample is not None and args.resample <= 0:
+        parser.error("--resample must be a positive rate")
+
+    expected = 2 if args.inputs else 4
+    if len(args.paths) != expected:
+        parser.error(f"expected {expected} positional arguments, got {len(args.paths)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    if args.inputs:
+        sampling_rate = int(args.paths[0])
+        window_size = float(args.paths[1])
+        print(f"Extracting features from {len(args.inputs)} files into {args.output_dir}")
+        print(f"Sampling rate: {sampling_rate} Hz")
+        print(f"Window size: {window_size} seconds")
+        return extract_many(args.inputs, args.output_dir, window_size, args.workers,
+                            feature_set=args.feature_set, window_samples=args.window_samples,
+                            step_samples=args.step_samples,
+                            resample_rate=args.resample,
+                            max_gap=args.max_gap,
+                            cache_dir=None if args.no_cache else args.cache_dir)
+
+    input_file = args.paths[0]
+    output_file = args.paths[1]
+    sampling_rate = int(args.paths[2])
+    window_size = float(args.paths[3])
+
+    print("Starting feature extraction using SensorBuffer..." if args.streaming
+          else "Starting batch feature extraction...")
     print(f"Input file: {input_file}")
     print(f"Output file: {output_file}")
     print(f"Sampling rate: {sampling_rate} Hz")
     print(f"Window size: {window_size} seconds")
-    
+
     try:
-        # Load sensor data
-        columns = [
-            'timestamp',
-            'accel_x', 'accel_y', 'accel_z',
-            'gyro_x', 'gyro_y', 'gyro_z',
-            'temperature'
-        ]
-        
-        df = pd.read_csv(input_file, names=columns)
-        print(f"Loaded {len(df)} rows of sensor data")
-        
-        # Drop missing values
-        missing = df.isnull().sum()
-        if missing.any():
-            print("\nDropping rows with missing values:")
-            print(missing[missing > 0])
-            df = df.dropna()
-            print(f"Remaining rows: {len(df)}")
-        
-        # Create a SensorBuffer instance
-        buffer = SensorBuffer(window_size=window_size)
-        
-        # Process data row by row
-        all_features = []
-        window_count = 0
-        
-        for _, row in df.iterrows():
-            # Create sensor data dictionary
-            sensor_data = {
-                'accel_x': row['accel_x'],
-                'accel_y': row['accel_y'],
-                'accel_z': row['accel_z'],
-                'gyro_x': row['gyro_x'],
-                'gyro_y': row['gyro_y'],
-                'gyro_z': row['gyro_z'],
-                'temp': row['temperature']
-            }
-            
-            # Add reading to buffer
-            features = buffer.add_reading(sensor_data, timestamp=pd.to_datetime(row['timestamp']))
-            
-            # If features were extracted, add them to the list
-            if features is not False:
-                all_features.append(features)
-                window_count += 1
-                
-                if window_count % 10 == 0:
-                    print(f"Processed {window_count} windows...")
-        
-        print(f"\nTotal windows processed: {window_count}")
-        
-        if window_count == 0:
-            print("No windows were processed. Check your data and parameters.")
-            return 1
-        
-        # Get feature names
-        feature_names = get_feature_names()
-        
-        # Convert to DataFrame
-        features_df = pd.DataFrame(all_features, columns=feature_names)
-        print(f"Feature matrix shape: {features_df.shape}")
-        
-        # Save features
-        features_df.to_csv(output_file, index=False)
-        print(f"\nFeatures saved to: {output_file}")
-        
+        return extract_file(input_file, output_file, window_size, streaming=args.streaming,
+                            feature_set=args.feature_set, window_samples=args.window_samples,
+                            step_samples=args.step_samples,
+                            resample_rate=args.resample,
+                            max_gap=args.max_gap,
+                            cache_dir=None if args.no_cache else args.cache_dir)
     except Exception as e:
         print(f"Error processing data: {str(e)}")
         return 1
-    
-    return 0
 
 if __name__ == "__main__":
-    exit(main()) 
\ No newline at end of file
+    exit(main())
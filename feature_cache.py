@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python feature_cache.py info [cache_dir]
+    python feature_cache.py clear [cache_dir]
+
+On-disk cache of window features extracted from raw sensor files.
+
+extract_features.py, train_ocsvm.py, evaluate_ocsvm.py and search_ocsvm.py
+extract features through this cache, so rerunning an experiment on unchanged
+recordings (say, with different SVM parameters) skips extraction entirely.
+
+An entry is keyed by a SHA-256 of the raw file's content and everything that
+decides its features: window size and step, resampling rate and gap limit,
+the statistics computed and FEATURE_SPEC_VERSION. Editing the file, changing
+a parameter or changing a feature definition therefore gives a new key, and
+the stale entry simply ages out. Hashing a file is much cheaper than parsing
+it, and the digest is remembered against the file's size and mtime, so an
+unchanged file is only read once. Each raw file's digest is kept in its own
+small file under digests/, so workers hashing different files never
+overwrite each other's digests.
+
+Each entry is one .npy file (float64, n_windows x n_features), written to a
+temporary name and renamed, so concurrent extract_features.py --inputs
+workers never see a partial entry. A hit touches the entry's mtime; when the
+cache grows beyond max_bytes the least recently used entries are deleted.
+"""
+
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+CACHE_DIR = 'data/feature_cache'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bumped when the key or the entry layout changes
+CACHE_VERSION = 1
+
+_DIGESTS = 'digests'
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._digests = {}
+
+    def key(self, raw_file, params):
+        """Cache key for the features of raw_file extracted with params (a JSON-able dict)."""
+        from features import FEATURE_SPEC_VERSION
+
+        payload = json.dumps({
+            'cache_version': CACHE_VERSION,
+            'feature_spec_version': FEATURE_SPEC_VERSION,
+            'file': self.digest(raw_file),
+            'params': params,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def digest(self, path):
+        """Content digest of path, re-read only if its size or mtime changed."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        entry = self._digests.get(path) or self._load_digest(path)
+        if entry is not None and entry['stat'] == stamp:
+            self._digests[path] = entry
+            return entry['sha256']
+        entry = {'path': path, 'stat': stamp, 'sha256': file_digest(path)}
+        self._digests[path] = entry
+        self._save_digest(entry)
+        return entry['sha256']
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            features = np.load(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Touch so eviction sees this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return features
+
+    def put(self, key, features):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(features, dtype=np.float64))
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def get_or_compute(self, raw_file, params, compute):
+        """Features of raw_file from the cache, or compute() them and store them."""
+        key = self.key(raw_file, params)
+        features = self.get(key)
+        if features is not None:
+            logger.info("Feature cache hit for %s", raw_file)
+            return features
+        features = compute()
+        self.put(key, features)
+        return features
+
+    def entries(self):
+        """(path, size, mtime) of every entry, least recently used first."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # Evicted by another process meanwhile
+                continue
+            entries.append((path, st.st_size, st.st_mtime_ns))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        entries = self.entries()
+        digest_dir = os.path.join(self.directory, _DIGESTS)
+        try:
+            digest_files = [os.path.join(digest_dir, name) for name in os.listdir(digest_dir)]
+        except FileNotFoundError:
+            digest_files = []
+        for path in [path for path, _, _ in entries] + digest_files:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._digests = {}
+        return len(entries)
+
+    def summary(self):
+        return f"feature cache {self.hits} hits, {self.misses} misses ({self.directory})"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _digest_path(self, path):
+        name = hashlib.sha256(path.encode()).hexdigest() + '.json'
+        return os.path.join(self.directory, _DIGESTS, name)
+
+    def _load_digest(self, path):
+        try:
+            with open(self._digest_path(path)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('path') == path else None
+
+    def _save_digest(self, entry):
+        # One file per raw file, written whole and renamed into place
+        path = self._digest_path(entry['path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('info', 'clear'):
+        print(__doc__)
+        return 1
+    cache = FeatureCache(sys.argv[2] if len(sys.argv) > 2 else CACHE_DIR)
+    if sys.argv[1] == 'clear':
+        print(f"Removed {cache.clear()} entries from {cache.directory}")
+        return 0
+    entries = cache.entries()
+    total = sum(size for _, size, _ in entries)
+    print(f"{cache.directory}: {len(entries)} entries, {total / 1024:.1f} KiB "
+          f"of {cache.max_bytes / 1024 / 1024:.0f} MiB")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Feature engine shared by SensorBuffer, extract_features.py, train_ocsvm.py,
+evaluate_ocsvm.py and main.py.
+
+Each feature is a named function registered in FEATURES. It receives a
+WindowContext wrapping one window of shape (n_samples, 6) (or a batch of
+windows, shape (n_windows, n_samples, 6)) and returns one value per sensor.
+Intermediates such as the sorted samples or the autocorrelation are computed
+once per window and shared between features, so the whole feature vector is
+produced in a single vectorized pass.
+
+Spectral features treat a window as a uniform grid of samples and measure
+frequency in cycles per window. The 6.6 s window is one rotor revolution, so
+rFFT bin k is the k-th rotation order at any sample rate, and band edges are
+given as fractions of the Nyquist frequency.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+SENSOR_NAMES = ['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z']
+
+# Bumped whenever the definition of an existing feature changes
+FEATURE_SPEC_VERSION = 1
+
+ACF_LAGS = 4
+
+# Rotation orders 1x..3x, and the strongest spectral peaks, reported per axis
+ROTATION_ORDERS = 3
+SPECTRAL_PEAKS = 2
+# Band power edges as fractions of the Nyquist frequency
+BAND_EDGES = (0.0, 0.125, 0.25, 0.5, 1.0)
+# Welch segment length; shorter windows use a single periodogram
+WELCH_SEGMENT = 256
+
+SPECTRAL_STATS = ([f'band{band}_power' for band in range(1, len(BAND_EDGES))]
+                  + [f'order{order}_amp' for order in range(1, ROTATION_ORDERS + 1)]
+                  + [f'peak{peak}_{stat}' for peak in range(1, SPECTRAL_PEAKS + 1)
+                     for stat in ('order', 'amp')])
+
+# Named feature sets. 'basic' is what the deployed model was trained on,
+# 'full' matches data/normal_evaluation.csv and data/features_anomaly_combined.csv.
+FEATURE_SETS = {
+    'basic': ['mean', 'std'],
+    'full': ['mean', 'std', 'max', 'min', 'median', 'q1', 'q3', 'iqr',
+             'sum_abs', 'sum_squares'] + [f'acf_lag{lag}' for lag in range(1, ACF_LAGS + 1)],
+    'spectral': ['mean', 'std'] + SPECTRAL_STATS,
+}
+
+FEATURES = {}
+
+
+def feature(name):
+    """Register a feature function under ``name``."""
+    def register(func):
+        FEATURES[name] = func
+        return func
+    return register
+
+
+def _hann(n):
+    # Periodic Hann window, so an integer number of cycles per window
+    # falls exactly on one bin
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)
+
+
+@lru_cache(maxsize=64)
+def spectral_plan(n_samples):
+    """Welch window and bin map for windows of n_samples, cached per length.
+
+    Returns (segment, step, segment_hann, band_map): the Welch segment length
+    and step, its Hann window, and a (n_segment_bins, n_bands) matrix summing
+    a periodogram into band power, scaled so the bands add up to the variance
+    of the window.
+    """
+    segment = min(max(n_samples, 1), WELCH_SEGMENT)
+    step = max(segment // 2, 1)
+    segment_hann = _hann(segment)
+    n_bins = segment // 2 + 1
+    # One-sided spectrum: every bin but DC and Nyquist stands for two
+    weight = np.full(n_bins, 2.0)
+    weight[0] = 1.0
+    if segment % 2 == 0:
+        weight[-1] = 1.0
+    power = (segment_hann ** 2).sum()
+    weight = weight / (segment * power) if power > 0 else weight * 0.0
+
+    fraction = np.arange(n_bins) / max(segment / 2, 1)
+    band_map = np.zeros((n_bins, len(BAND_EDGES) - 1))
+    for band, (low, high) in enumerate(zip(BAND_EDGES[:-1], BAND_EDGES[1:])):
+        last = band == len(BAND_EDGES) - 2
+        in_band = (fraction >= low) & ((fraction <= high) if last else (fraction < high))
+        band_map[in_band, band] = weight[in_band]
+
+    for array in (segment_hann, band_map):
+        array.setflags(write=False)
+    return segment, step, segment_hann, band_map
+
+
+class WindowContext:
+    """One window (or batch of windows) plus lazily computed intermediates.
+
+    The samples are stored as a contiguous (..., 6, n_samples) array so every
+    reduction runs along the last axis. This gives the same results, to the
+    last bit, as reducing each sensor's 1-D column separately.
+    """
+
+    def __init__(self, window):
+        window = np.asarray(window, dtype=np.float64)
+        self.data = np.ascontiguousarray(np.swapaxes(window, -1, -2))
+        self.n_samples = self.data.shape[-1]
+        self._sorted = None
+        self._mean = None
+        self._centered = None
+        self._quartiles = None
+        self._acf = None
+        self._amplitude = None
+        self._band_power = None
+        self._peaks = None
+
+    @property
+    def sorted(self):
+        if self._sorted is None:
+            self._sorted = np.sort(self.data, axis=-1)
+        return self._sorted
+
+    @property
+    def mean(self):
+        if self._mean is None:
+            self._mean = np.mean(self.data, axis=-1)
+        return self._mean
+
+    @property
+    def centered(self):
+        if self._centered is None:
+            self._centered = self.data - self.mean[..., None]
+        return self._centered
+
+    @property
+    def quartiles(self):
+        if self._quartiles is None:
+            self._quartiles = np.percentile(self.sorted, [25, 75], axis=-1)
+        return self._quartiles
+
+    @property
+    def acf(self):
+        """Autocorrelation for lags 1..ACF_LAGS, shape (..., 6, ACF_LAGS).
+
+        Computed with one zero-padded rFFT per axis (all axes and windows in
+        a single call). A window with zero variance has an ACF of 0.
+        """
+        if self._acf is None:
+            n = self.n_samples
+            nfft = 1 << max(0, (2 * n - 1) - 1).bit_length()
+            spectrum = np.fft.rfft(self.centered, n=nfft, axis=-1)
+            acov = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n=nfft, axis=-1)
+            lags = np.zeros(self.data.shape[:-1] + (ACF_LAGS,))
+            max_lag = min(ACF_LAGS, n - 1)
+            var = acov[..., :1]
+            np.divide(acov[..., 1:max_lag + 1], var, out=lags[..., :max_lag], where=var > 0)
+            self._acf = lags
+        return self._acf
+
+    @property
+    def amplitude(self):
+        """Sine amplitude per rFFT bin, shape (..., 6, n_samples // 2 + 1).
+
+        One rFFT over the last axis covers all six axes (and every window of a
+        batch); bin k is k cycles per window. No taper is applied: the window
+        spans one revolution, so rotation orders fall on bins and a Hann
+        window would only leak each order into its neighbours.
+        """
+        if self._amplitude is None:
+            spectrum = np.fft.rfft(self.centered, axis=-1)
+            self._amplitude = np.abs(spectrum) * (2.0 / self.n_samples)
+        return self._amplitude
+
+    @property
+    def band_power(self):
+        """Welch band power per axis, shape (..., 6, len(BAND_EDGES) - 1).
+
+        Segments of WELCH_SEGMENT samples overlap by half and each has its
+        mean removed; the averaged periodogram is summed into bands. With
+        longer windows, content slower than one cycle per segment is left to
+        the rotation order features.
+        """
+        if self._band_power is None:
+            segment, step, segment_hann, band_map = spectral_plan(self.n_samples)
+            frames = np.lib.stride_tricks.sliding_window_view(self.data, segment, axis=-1)[..., ::step, :]
+            frames = frames - frames.mean(axis=-1, keepdims=True)
+            spectrum = np.fft.rfft(frames * segment_hann, axis=-1)
+            periodogram = (spectrum.real ** 2 + spectrum.imag ** 2).mean(axis=-2)
+            self._band_power = periodogram @ band_map
+        return self._band_power
+
+    @property
+    def peaks(self):
+        """(orders, amplitudes) of the SPECTRAL_PEAKS strongest non-DC bins, strongest first.
+
+        Missing peaks (windows too short to have that many bins) are 0.
+        """
+        if self._peaks is not None:
+            return self._peaks
+        amplitude = self.amplitude[..., 1:]
+        shape = amplitude.shape[:-1] + (SPECTRAL_PEAKS,)
+        orders = np.zeros(shape)
+        amps = np.zeros(shape)
+        k = min(SPECTRAL_PEAKS, amplitude.shape[-1])
+        if k:
+            top = np.argsort(-amplitude, axis=-1, kind='stable')[..., :k]
+            orders[..., :k] = top + 1
+            amps[..., :k] = np.take_along_axis(amplitude, top, axis=-1)
+        self._peaks = orders, amps
+        return self._peaks
+
+
+@feature('mean')
+def _mean(ctx):
+    return ctx.mean
+
+
+@feature('std')
+def _std(ctx):
+    return np.std(ctx.data, axis=-1)
+
+
+@feature('max')
+def _max(ctx):
+    return ctx.sorted[..., -1]
+
+
+@feature('min')
+def _min(ctx):
+    return ctx.sorted[..., 0]
+
+
+@feature('median')
+def _median(ctx):
+    return np.median(ctx.sorted, axis=-1)
+
+
+@feature('q1')
+def _q1(ctx):
+    return ctx.quartiles[0]
+
+
+@feature('q3')
+def _q3(ctx):
+    return ctx.quartiles[1]
+
+
+@feature('iqr')
+def _iqr(ctx):
+    return ctx.quartiles[1] - ctx.quartiles[0]
+
+
+@feature('sum_abs')
+def _sum_abs(ctx):
+    return np.sum(np.abs(ctx.data), axis=-1)
+
+
+@feature('sum_squares')
+def _sum_squares(ctx):
+    return np.sum(ctx.data * ctx.data, axis=-1)
+
+
+def _register_acf_lag(lag):
+    @feature(f'acf_lag{lag}')
+    def _acf_lag(ctx):
+        return ctx.acf[..., lag - 1]
+
+
+for _lag in range(1, ACF_LAGS + 1):
+    _register_acf_lag(_lag)
+
+
+def _register_band(band):
+    @feature(f'band{band}_power')
+    def _band_power(ctx):
+        return ctx.band_power[..., band - 1]
+
+
+def _register_order(order):
+    @feature(f'order{order}_amp')
+    def _order_amp(ctx):
+        amplitude = ctx.amplitude
+        if order >= amplitude.shape[-1]:
+            return np.zeros(amplitude.shape[:-1])
+        return amplitude[..., order]
+
+
+def _register_peak(peak):
+    @feature(f'peak{peak}_order')
+    def _peak_order(ctx):
+        return ctx.peaks[0][..., peak - 1]
+
+    @feature(f'peak{peak}_amp')
+    def _peak_amp(ctx):
+        return ctx.peaks[1][..., peak - 1]
+
+
+for _band in range(1, len(BAND_EDGES)):
+    _register_band(_band)
+for _order in range(1, ROTATION_ORDERS + 1):
+    _register_order(_order)
+for _peak in range(1, SPECTRAL_PEAKS + 1):
+    _register_peak(_peak)
+
+
+def resolve_stats(feature_set):
+    """Return the list of per-sensor statistics for a set name or list."""
+    if isinstance(feature_set, str):
+        if feature_set not in FEATURE_SETS:
+            raise ValueError(f"Unknown feature set: {feature_set}")
+        return list(FEATURE_SETS[feature_set])
+    stats = list(feature_set)
+    for stat in stats:
+        if stat not in FEATURES:
+            raise ValueError(f"Unknown feature: {stat}")
+    return stats
+
+
+def get_feature_names(feature_set='basic'):
+    """Return the list of feature names in the correct order."""
+    stats = resolve_stats(feature_set)
+    return [f'{sensor_name}_{stat}' for sensor_name in SENSOR_NAMES for stat in stats]
+
+
+def stats_from_feature_names(feature_names):
+    """Recover the statistics list from sensor-major feature names.
+
+    Raises ValueError if the names are not in get_feature_names() layout.
+    """
+    prefix = SENSOR_NAMES[0] + '_'
+    stats = [name[len(prefix):] for name in feature_names if name.startswith(prefix)]
+    if not stats or get_feature_names(stats) != list(feature_names):
+        raise ValueError(f"Feature names do not follow the sensor-major layout: {feature_names}")
+    return stats
+
+
+def make_feature_spec(feature_set='basic', window_size=None):
+    """Feature spec stored in the model pickle alongside the model."""
+    spec = {
+        'version': FEATURE_SPEC_VERSION,
+        'stats': resolve_stats(feature_set),
+    }
+    if window_size is not None:
+        spec['window_size'] = float(window_size)
+    return spec
+
+
+def compute_features(window, stats):
+    """Compute features for a window of shape (n_samples, 6).
+
+    A batch of equal-length windows, shape (n_windows, n_samples, 6), gives
+    an (n_windows, n_features) result. Columns follow get_feature_names(stats).
+    """
+    ctx = WindowContext(window)
+    values = [FEATURES[stat](ctx) for stat in stats]
+    # (..., 6, n_stats) -> (..., 6 * n_stats), sensor-major
+    stacked = np.stack(values, axis=-1)
+    return stacked.reshape(stacked.shape[:-2] + (-1,))
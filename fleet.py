@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python fleet.py --config fleet.json [options]
+    python fleet.py --simulate N [--files a.csv b.csv ...] [options]
+
+Monitors many turbines from one process. Every stream (an MPU6050 or a
+recorded file) has its own SensorBuffer and threshold, but all of them share
+one loaded model: each tick reads every stream once (or replays the readings
+due by then), and the windows that completed during the tick are scored
+together with one predict_batch() call. Anomalies are logged under
+fleet.<name> and alerts are coalesced per stream.
+
+fleet.json lists the streams; "threshold" at the top is the default:
+    {"threshold": -0.5,
+     "streams": [
+        {"name": "T01", "i2c_address": "0x68"},
+        {"name": "T02", "i2c_address": "0x69", "threshold": -0.8},
+        {"name": "T03", "replay": "data/sensor_data_anomaly1.csv", "loop": true}]}
+
+--simulate N replays the bundled recordings (or --files) as N streams, each
+starting at a different point of its file, to measure how many turbines one
+core can keep up with. The simulated streams loop over their files, so the run
+stops after --duration (default 300 s of stream time). Live streams log their raw readings to
+data/<name>/sensor_data_<date>.csv.
+
+Options:
+    --speed N          replay speed, 1 = real time, 0 = as fast as possible (default: 1)
+    --duration S       stop after S seconds of stream time (--simulate: default 300)
+    --threshold T      default threshold (default: -2.0)
+    --interval S       tick interval, the sampling period of live streams (default: 0.2)
+    --alert-file FILE, --alert-url URL, --sms    where alerts go (default: none)
+    --metrics-file FILE, --metrics-port N       metrics export, as in main.py
+    --log-level LEVEL, --log-rate-limit S       as in main.py
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import anomaly_detector
+import features as feature_engine
+import logutil
+import metrics
+import sensor
+import sensor_source
+from main import ALERT_PHONE, SCALER_PATH, select_model_path
+
+logger = logutil.get_logger('fleet')
+
+SIMULATION_FILES = ['data/sensor_data_normal.csv', 'data/sensor_data_anomaly1.csv',
+                    'data/sensor_data_anomaly2.csv']
+
+# Stream time a --simulate run covers unless --duration says otherwise; its
+# streams loop, so it would never end by itself
+SIMULATION_DURATION = 300.0
+
+BATCH_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000]
+
+
+class TurbineStream:
+    """One turbine: its source, buffer, threshold and counts."""
+
+    def __init__(self, name, source, threshold, feature_stats, window_size=6.6, hop=1.0, skip=0):
+        self.name = name
+        self.source = source
+        self.threshold = threshold
+        self.live = source.live
+        self.buffer = sensor.SensorBuffer(window_size=window_size, hop=hop, feature_set=feature_stats)
+        # Rate limited per stream, as the logger name is part of the key
+        self.logger = logutil.get_logger(f'fleet.{name}')
+        self.data_logger = None
+        if self.live:
+            self.data_logger = sensor.SensorDataLogger(f'data/{name}/sensor_data.csv', rotate_daily=True)
+
+        # Replays: the next reading not yet due, and the first timestamp,
+        # against which stream time is measured
+        self._readings = None if self.live else iter(source)
+        for _ in range(skip):
+            next(self._readings, None)
+        self._next = None
+        self._origin = None
+        self.finished = False
+
+        self.readings = 0
+        self.windows = 0
+        self.anomalies = 0
+        self.worst_score = None
+
+    def poll(self, until):
+        """Readings due by `until` seconds of stream time: one live reading
+        per tick, or every recorded reading up to that time."""
+        if self.live:
+            return [self.source.read()]
+        due = []
+        while True:
+            if self._next is None:
+                self._next = next(self._readings, None)
+                if self._next is None:
+                    self.finished = True
+                    return due
+            timestamp = self._next[0]
+            if self._origin is None:
+                self._origin = timestamp
+            if (timestamp - self._origin).total_seconds() > until:
+                return due
+            due.append(self._next)
+            self._next = None
+
+    def record(self, score, timestamp, sensor_data, dispatcher=None):
+        self.windows += 1
+        if self.worst_score is None or score < self.worst_score:
+            self.worst_score = score
+        if score >= self.threshold:
+            self.logger.debug("SVM score: %s", score)
+            return False
+        self.anomalies += 1
+        self.logger.warning("Anomaly detected: SVM score %.3f, accel X=%.2f Y=%.2f Z=%.2f",
+                            score, sensor_data['accel_x'], sensor_data['accel_y'], sensor_data['accel_z'])
+        if dispatcher:
+            dispatcher.submit(score, sensor_data, timestamp, stream=self.name)
+        return True
+
+    def close(self):
+        if self.data_logger:
+            self.data_logger.close()
+
+
+class Fleet:
+    """Ticks every stream and scores the windows completed in each tick as one batch."""
+
+    def __init__(self, streams, detector, dispatcher=None, interval=0.2, speed=1.0, registry=None):
+        self.streams = streams
+        self.detector = detector
+        self.dispatcher = dispatcher
+        self.interval = interval
+        self.speed = speed if speed else None
+        self.ticks = 0
+        self.windows = 0
+        self.anomalies = 0
+        self.max_batch = 0
+        # Grown when a tick completes more windows than it has rows. Sized
+        # from the statistics the buffers compute: a legacy model has no
+        # feature names
+        n_features = len(feature_engine.get_feature_names(detector.feature_stats))
+        self._batch = np.empty((max(len(streams), 1), n_features))
+
+        registry = registry or metrics.Registry()
+        self.tick_time = registry.histogram('fleet_tick_seconds', "Time to read and score one tick")
+        self.batch_size = registry.histogram('fleet_batch_windows', "Windows scored per batch",
+                                             buckets=BATCH_BUCKETS)
+        self.window_counters = [registry.counter('windows_total', "Windows scored", stream=s.name)
+                                for s in streams]
+        self.anomaly_counters = [registry.counter('anomalies_total', "Windows scored as anomalies",
+                                                  stream=s.name) for s in streams]
+
+    def tick(self, until):
+        """Feed every stream its readings due by `until`; returns the number of windows scored."""
+        start = time.perf_counter()
+        rows = []
+        for i, stream in enumerate(self.streams):
+            for timestamp, sensor_data in stream.poll(until):
+                stream.readings += 1
+                if stream.data_logger:
+                    stream.data_logger.log(sensor_data, timestamp.isoformat())
+                features = stream.buffer.add_reading(sensor_data, timestamp)
+                if features is False or features is None:
+                    continue
+                if len(rows) == len(self._batch):
+                    self._batch = np.concatenate([self._batch, np.empty_like(self._batch)])
+                self._batch[len(rows)] = features
+                rows.append((i, timestamp, sensor_data))
+
+        if rows:
+            scores = self.detector.predict_batch(self._batch[:len(rows)])
+            for (i, timestamp, sensor_data), score in zip(rows, scores):
+                score = float(score)
+                self.window_counters[i].inc()
+                if self.streams[i].record(score, timestamp, sensor_data, self.dispatcher):
+                    self.anomaly_counters[i].inc()
+                    self.anomalies += 1
+            self.windows += len(rows)
+            self.batch_size.observe(len(rows))
+            self.max_batch = max(self.max_batch, len(rows))
+        self.ticks += 1
+        self.tick_time.observe(time.perf_counter() - start)
+        return len(rows)
+
+    def done(self):
+        # Only replays end; a fleet with a live stream runs until stopped
+        return all(s.finished for s in self.streams)
+
+    def run(self, duration=None):
+        """Tick until every replay has ended, duration seconds of stream time
+        have passed, or Ctrl+C. Returns the stream time covered."""
+        until = 0.0
+        if self.speed is None:
+            # As fast as possible: stream time advances one interval per tick
+            while not self.done() and (duration is None or until < duration):
+                until += self.interval
+                self.tick(until)
+            return until
+
+        self.scheduler = sensor_source.DeadlineScheduler(self.interval)
+        start = None
+        while not self.done() and (duration is None or until < duration):
+            tick = self.scheduler.wait()
+            if start is None:
+                start = tick
+            until = (tick - start) * self.speed
+            self.tick(until)
+        return until
+
+
+def load_config(path, default_threshold):
+    with open(path) as f:
+        config = json.load(f)
+    default_threshold = config.get('threshold', default_threshold)
+    specs = []
+    for spec in config['streams']:
+        spec = dict(spec)
+        spec.setdefault('threshold', default_threshold)
+        specs.append(spec)
+    return specs
+
+
+def simulation_specs(n, files, threshold):
+    return [{'name': f"sim{i:03d}", 'replay': files[i % len(files)], 'loop': True,
+             'threshold': threshold, 'stagger': True}
+            for i in range(n)]
+
+
+def open_streams(specs, feature_stats, speed, interval, window_size=6.6):
+    # One ReplaySource per file, shared by every stream replaying it: each
+    # stream iterates it separately, so the recording is loaded once
+    replays = {}
+    streams = []
+    for i, spec in enumerate(specs):
+        if 'replay' in spec:
+            key = (spec['replay'], bool(spec.get('loop')))
+            if key not in replays:
+                replays[key] = sensor_source.ReplaySource(spec['replay'], speed=None, loop=key[1])
+            source = replays[key]
+            # Simulated streams start at different points of their file, so
+            # their windows do not all complete on the same tick
+            skip = (i * 37) % len(source) if spec.get('stagger') else 0
+        else:
+            address = spec.get('i2c_address')
+            if isinstance(address, str):
+                address = int(address, 0)
+            source = sensor_source.MPU6050Source(interval=interval, address=address)
+            skip = 0
+        streams.append(TurbineStream(spec['name'], source, float(spec['threshold']),
+                                     feature_stats, window_size, skip=skip))
+    return streams
+
+
+def print_fleet_stats(fleet, stream_time, elapsed, limit=20):
+    streams = fleet.streams
+    readings = sum(s.readings for s in streams)
+    print(f"\n{len(streams)} streams, {stream_time:.0f} s of stream time in {elapsed:.2f} s "
+          f"({stream_time / max(elapsed, 1e-9):.1f}x real time)")
+    print(f"{readings} readings ({readings / max(elapsed, 1e-9):.0f}/s), {fleet.windows} windows, "
+          f"{fleet.anomalies} anomalies; {fleet.ticks} ticks, largest batch {fleet.max_batch}, "
+          f"mean tick {fleet.tick_time.sum / max(fleet.tick_time.count, 1) * 1e3:.2f} ms")
+    scheduler = getattr(fleet, 'scheduler', None)
+    if scheduler:
+        print(f"Ticks: {scheduler.summary()}")
+    # The busiest streams first
+    shown = sorted(streams, key=lambda s: (-s.anomalies, s.name))[:limit]
+    print(f"\n{'stream':<12}{'readings':>10}{'windows':>9}{'anomalies':>11}{'worst':>9}{'threshold':>11}")
+    for s in shown:
+        worst = f"{s.worst_score:9.3f}" if s.worst_score is not None else f"{'-':>9}"
+        print(f"{s.name:<12}{s.readings:>10}{s.windows:>9}{s.anomalies:>11}{worst}{s.threshold:>11.2f}")
+    if len(streams) > limit:
+        print(f"... and {len(streams) - limit} more")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor many turbines with one shared model")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--config', help="JSON file listing the streams")
+    group.add_argument('--simulate', type=int, metavar='N', help="replay recordings as N streams")
+    parser.add_argument('--files', nargs='+', default=SIMULATION_FILES,
+                        help="recordings used by --simulate")
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--duration', type=float, default=None)
+    parser.add_argument('--threshold', type=float, default=-2.0)
+    parser.add_argument('--interval', type=float, default=0.2)
+    alerts = parser.add_mutually_exclusive_group()
+    alerts.add_argument('--alert-file', default=None)
+    alerts.add_argument('--alert-url', default=None)
+    alerts.add_argument('--sms', action='store_true', help="send alerts by SMS")
+    parser.add_argument('--metrics-file', default=None)
+    parser.add_argument('--metrics-interval', type=float, default=10.0)
+    parser.add_argument('--metrics-port', type=int, default=None)
+    parser.add_argument('--log-level', default=logutil.DEFAULT_LEVEL, choices=logutil.LEVELS)
+    parser.add_argument('--log-rate-limit', type=float, default=logutil.DEFAULT_RATE_LIMIT)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logutil.configure(args.log_level, args.log_rate_limit)
+
+    detector = anomaly_detector.OneClassSVMDetector(select_model_path(), SCALER_PATH)
+    if args.config:
+        specs = load_config(args.config, args.threshold)
+    else:
+        specs = simulation_specs(args.simulate, args.files, args.threshold)
+        if args.duration is None:
+            args.duration = SIMULATION_DURATION
+
+    registry = metrics.Registry()
+    dispatcher = None
+    if args.alert_file or args.alert_url or args.sms:
+        import alert_dispatcher
+        if args.alert_file:
+            transport = alert_dispatcher.FileTransport(args.alert_file)
+        elif args.alert_url:
+            transport = alert_dispatcher.HTTPTransport(args.alert_url)
+        else:
+            import sms_alert
+            transport = sms_alert.TwilioTransport()
+        dispatcher = alert_dispatcher.AlertDispatcher(transport, ALERT_PHONE, min_interval=10.0)
+
+    streams = open_streams(specs, detector.feature_stats, args.speed, args.interval,
+                           detector.window_size)
+    fleet = Fleet(streams, detector, dispatcher, args.interval, args.speed, registry)
+    exporter = None
+    if args.metrics_file or args.metrics_port is not None:
+        exporter = metrics.MetricsExporter(registry, args.metrics_file, args.metrics_interval,
+                                           args.metrics_port)
+
+    print(f"\nMonitoring {len(streams)} streams")
+    print("Press Ctrl+C to stop")
+    start = time.perf_counter()
+    stream_time = 0.0
+    try:
+        stream_time = fleet.run(args.duration)
+    except KeyboardInterrupt:
+        print("\nStopping...")
+    finally:
+        elapsed = time.perf_counter() - start
+        for stream in streams:
+            stream.close()
+        if dispatcher:
+            dispatcher.close()
+            print(dispatcher.summary())
+        if exporter:
+            exporter.close()
+        print_fleet_stats(fleet, stream_time, elapsed)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python flight_recorder.py info <event.npz>
+    python flight_recorder.py csv <event.npz> [output.csv]
+
+Raw capture around detections.
+
+FlightRecorder keeps the most recent readings in a fixed-size in-memory ring
+(preallocated NumPy arrays, no allocation per reading). When a window is
+scored as an anomaly, trigger() marks an event; once post_seconds of readings
+after the trigger have arrived, and the detector has scored past them (it
+reports every window to advance(), as it may lag behind or run ahead of the
+recorder), the readings from pre_seconds before the
+trigger to post_seconds after it are copied out and handed to a background
+writer thread, which saves them as one compressed .npz per event with the
+trigger times, SVM scores and window features. Anomalies arriving while an
+event is still open extend it (up to max_event_seconds), so a burst of
+anomalous windows becomes one file rather than one per window.
+
+record() and trigger() never wait on the disk: if the writer falls more than
+max_pending events behind, new events are dropped and counted. A replay
+passes drop_events=False to wait for the writer instead, so every event is
+saved.
+
+The csv command writes an event's readings in the sensor CSV format, so
+they can be replayed with main.py --replay or fed to extract_features.py.
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from shm_ring import COLUMNS, READING_FIELDS
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+EVENT_DIR = 'data/events'
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Queued after the last event to tell the writer to finish
+_STOP = object()
+
+
+def to_ns(timestamp):
+    # Exact integer conversion of a naive datetime, as in shm_ring
+    return (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def from_ns(timestamp_ns):
+    return _EPOCH + timedelta(microseconds=int(timestamp_ns) // 1000)
+
+
+class _Event:
+    """An open event: its triggers, and the time range it covers."""
+
+    def __init__(self, trigger_ns, pre_ns, post_ns):
+        self.start_ns = trigger_ns - pre_ns
+        self.end_ns = trigger_ns + post_ns
+        self.triggers = []
+        self.scores = []
+        self.features = []
+
+
+class FlightRecorder:
+    def __init__(self, directory=EVENT_DIR, pre_seconds=10.0, post_seconds=5.0,
+                 max_event_seconds=60.0, capacity=4096, max_pending=8, drop_events=True,
+                 write_timer=None):
+        self.directory = directory
+        self.pre_ns = int(pre_seconds * 1e9)
+        self.post_ns = int(post_seconds * 1e9)
+        self.max_event_ns = int(max_event_seconds * 1e9)
+        self.drop_events = drop_events
+        self.feature_names = None
+        # Optional metrics.Histogram observing each event file write
+        self.write_timer = write_timer
+
+        # Ring of the latest readings, oldest overwritten first
+        self.capacity = capacity
+        self._times = np.zeros(capacity, dtype=np.int64)
+        self._values = np.zeros((capacity, len(COLUMNS)), dtype=np.float32)
+        self._head = 0
+        self._count = 0
+        self._latest_ns = None
+        # Timestamp of the last window the detector scored
+        self._scored_ns = None
+
+        # trigger() runs on the scoring thread, record() on the recorder
+        # stage; triggers are handed over under the lock
+        self._lock = threading.Lock()
+        self._triggers = []
+        self._event = None
+
+        self.events = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+        self._thread.start()
+
+    def record(self, timestamp, sensor_data):
+        """Add one (datetime, sensor_data dict) reading; closes events that are complete."""
+        timestamp_ns = to_ns(timestamp)
+        i = self._head
+        self._times[i] = timestamp_ns
+        values = self._values[i]
+        for j, name in enumerate(READING_FIELDS):
+            values[j] = sensor_data[name]
+        self._head = (i + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self._latest_ns = timestamp_ns
+        self._close_events(timestamp_ns)
+
+    def record_block(self, timestamps_ns, values, temperature):
+        """Add to_ns() times, an (n, 6) array of the six axes and the block's temperature."""
+        n = len(timestamps_ns)
+        if n == 0:
+            return
+        keep = min(n, self.capacity)
+        rows = (self._head + np.arange(keep)) % self.capacity
+        self._times[rows] = timestamps_ns[n - keep:]
+        self._values[rows, :-1] = values[n - keep:]
+        self._values[rows, -1] = temperature
+        self._head = (self._head + keep) % self.capacity
+        self._count = min(self._count + keep, self.capacity)
+        self._latest_ns = int(timestamps_ns[-1])
+        self._close_events(self._latest_ns)
+
+    def _close_events(self, timestamp_ns):
+        # Read before taking the triggers: the detector calls trigger() before
+        # advance(), so every trigger up to scored is already handed over
+        scored = self._scored_ns
+        if self._triggers:
+            with self._lock:
+                triggers, self._triggers = self._triggers, []
+            for trigger in triggers:
+                self._add_trigger(*trigger)
+        event = self._event
+        if event is not None and timestamp_ns >= event.end_ns and scored is not None and scored >= event.end_ns:
+            self._finish()
+
+    def trigger(self, timestamp, score, features=None):
+        """Mark an anomaly on the window ending at timestamp; never blocks."""
+        if features is not None:
+            features = np.array(features, dtype=np.float64).ravel()
+        with self._lock:
+            self._triggers.append((to_ns(timestamp), float(score), features))
+
+    def advance(self, timestamp):
+        """The detector has scored the window ending at timestamp."""
+        self._scored_ns = to_ns(timestamp)
+
+    def close(self, timeout=30.0):
+        """Save any open event with the readings it has, and stop the writer."""
+        with self._lock:
+            triggers, self._triggers = self._triggers, []
+        for trigger in triggers:
+            self._add_trigger(*trigger)
+        if self._event is not None:
+            self._finish()
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def summary(self):
+        return (f"recorder events {self.events}, written {self.written}, "
+                f"dropped {self.dropped}, errors {self.errors}")
+
+    def _add_trigger(self, trigger_ns, score, features):
+        event = self._event
+        # A trigger inside the open event extends it, as long as the event
+        # stays under max_event_seconds; otherwise the open event is closed
+        if event is not None and (trigger_ns > event.end_ns
+                                  or trigger_ns + self.post_ns - event.start_ns > self.max_event_ns):
+            self._finish()
+            event = None
+        if event is None:
+            event = self._event = _Event(trigger_ns, self.pre_ns, self.post_ns)
+        event.end_ns = max(event.end_ns, trigger_ns + self.post_ns)
+        event.triggers.append(trigger_ns)
+        event.scores.append(score)
+        event.features.append(features)
+
+    def _snapshot(self, start_ns, end_ns):
+        # Copy of the buffered readings in [start_ns, end_ns], oldest first
+        order = (self._head - self._count + np.arange(self._count)) % self.capacity
+        times = self._times[order]
+        keep = order[(times >= start_ns) & (times <= end_ns)]
+        return self._times[keep], self._values[keep]
+
+    def _finish(self):
+        event, self._event = self._event, None
+        self.events += 1
+        timestamps_ns, values = self._snapshot(event.start_ns, event.end_ns)
+        record = {
+            'timestamps_ns': timestamps_ns,
+            'values': values,
+            'columns': np.array(COLUMNS),
+            'trigger_ns': np.array(event.triggers, dtype=np.int64),
+            'scores': np.array(event.scores),
+            'pre_seconds': self.pre_ns / 1e9,
+            'post_seconds': self.post_ns / 1e9,
+        }
+        # Features are missing when scoring runs in another process
+        if all(f is not None for f in event.features):
+            record['features'] = np.vstack(event.features)
+            if self.feature_names is not None:
+                record['feature_names'] = np.array(self.feature_names)
+        if not self.drop_events:
+            self._queue.put(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Event writer behind; dropped event at %s", from_ns(event.triggers[0]))
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                return
+            start = time.perf_counter()
+            try:
+                path = write_event(self.directory, record)
+                self.written += 1
+                logger.info("Event saved to %s (%d readings)", path, len(record['timestamps_ns']))
+            except Exception as e:
+                self.errors += 1
+                logger.error("Error writing event: %s", e)
+            if self.write_timer:
+                self.write_timer.observe(time.perf_counter() - start)
+
+
+def write_event(directory, record):
+    """Save one event as <directory>/event_<first trigger time>.npz; returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"event_{from_ns(record['trigger_ns'][0]):%Y%m%dT%H%M%S_%f}"
+    path = os.path.join(directory, name + '.npz')
+    # Write then rename, so a reader never sees a half-written file
+    tmp_path = os.path.join(directory, name + '.tmp.npz')
+    np.savez_compressed(tmp_path, **record)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_event(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def event_to_csv(event, output_file):
+    with open(output_file, 'w') as f:
+        f.write(','.join(['timestamp'] + list(event['columns'])) + '\n')
+        for timestamp_ns, row in zip(event['timestamps_ns'], event['values']):
+            f.write(from_ns(timestamp_ns).isoformat() + ',' + ','.join(repr(float(v)) for v in row) + '\n')
+
+
+def print_event(path, event):
+    timestamps = event['timestamps_ns']
+    triggers = event['trigger_ns']
+    print(f"{path}: {len(timestamps)} readings, {os.path.getsize(path)} bytes")
+    if len(timestamps):
+        print(f"Readings {from_ns(timestamps[0])} to {from_ns(timestamps[-1])}")
+    print(f"{len(triggers)} trigger(s) from {from_ns(triggers[0])} to {from_ns(triggers[-1])}, "
+          f"{float(event['pre_seconds']):g} s before and {float(event['post_seconds']):g} s after")
+    scores = event['scores']
+    print(f"SVM scores: worst {scores.min():.3f}, mean {scores.mean():.3f}")
+    if 'features' in event:
+        names = event.get('feature_names')
+        worst = event['features'][int(np.argmin(scores))]
+        print("Features at the worst score:")
+        for i, value in enumerate(worst):
+            name = names[i] if names is not None else f"feature_{i}"
+            print(f"  {name:<16} {value: .4f}")
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('info', 'csv'):
+        print(__doc__)
+        return 1
+    path = sys.argv[2]
+    event = load_event(path)
+    if sys.argv[1] == 'info':
+        print_event(path, event)
+        return 0
+    output_file = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(path)[0] + '.csv'
+    event_to_csv(event, output_file)
+    print(f"{len(event['timestamps_ns'])} readings written to {output_file}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
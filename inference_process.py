@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Multi-process mode for main.py: scoring in its own process.
+
+The acquisition process writes readings into a shm_ring.SampleRing and never
+waits on scoring, so feature extraction and SVM work (and the GIL they hold)
+cannot delay sampling. InferenceProcess starts run_inference() in a child
+process, receives its results on a queue, and restarts it if it dies. A
+restarted worker rebuilds its window from the readings still in the ring.
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+
+import numpy as np
+
+from logutil import get_logger
+from shm_ring import READING_FIELDS, SampleRing
+
+logger = get_logger(__name__)
+
+# How often an idle worker checks for new readings
+POLL_INTERVAL = 0.01
+
+# Minimum time between restarts of a crashed worker
+RESTART_BACKOFF = 1.0
+
+
+def run_inference(ring_name, ring_lock, results, model_path, scaler_path, threshold,
+                  window_size=None, hop=1.0, from_start=True):
+    """Worker: score sliding windows read from the ring until it is closed.
+
+    Windows follow SensorBuffer's ring mode: a window holds the readings no
+    more than window_size seconds older than the newest (None: the window
+    the model was trained on), and one is scored every hop seconds.
+    from_start scores everything still in the ring; otherwise (after a
+    restart) scoring resumes at the newest reading and older readings are
+    only used as window history. Each decision is put on results as
+    (timestamp_ns, score, is_anomaly, latency_s, sensor_data).
+    """
+    # Imported here so a restarted worker reloads the model from disk
+    from anomaly_detector import OneClassSVMDetector
+
+    ring = SampleRing(name=ring_name, lock=ring_lock)
+    try:
+        detector = OneClassSVMDetector(model_path, scaler_path, threshold=threshold)
+        if window_size is None:
+            window_size = detector.window_size
+        _score_ring(ring, detector, results, window_size, hop, from_start)
+    finally:
+        ring.close()
+
+
+def _score_ring(ring, detector, results, window_size, hop, from_start):
+    import features as feature_engine
+
+    stats = detector.feature_stats
+    n_sensors = len(feature_engine.SENSOR_NAMES)
+    capacity = ring.capacity
+
+    # A restarted worker starts at the newest reading, but keeps what is
+    # still in the ring as window history so it scores again immediately
+    start = ring.oldest_seq()
+    seq = start if from_start else ring.write_seq
+    t0_us = None
+    last_emit = None
+
+    while True:
+        end = ring.write_seq
+        if seq == end:
+            if ring.closed:
+                return
+            ring.publish_position(seq)
+            time.sleep(POLL_INTERVAL)
+            continue
+        if seq < end - capacity + 1:
+            logger.warning("Inference fell behind; skipped %d readings", end - capacity + 1 - seq)
+            seq = end - capacity + 1
+        start = max(start, end - capacity + 1)
+        # One copy of the current window and the new readings
+        block = ring.read(start, end)
+        if block is None:
+            # Lapped since write_seq was read; catch up from the newest
+            continue
+        timestamps, received, values = block
+        base = start
+        if t0_us is None:
+            t0_us = int(timestamps[0]) // 1000
+
+        def seconds(s):
+            # Seconds since the first reading, computed like
+            # timedelta.total_seconds() in SensorBuffer
+            return (int(timestamps[s - base]) // 1000 - t0_us) / 1e6
+
+        for s in range(seq, end):
+            t = seconds(s)
+            while t - seconds(start) > window_size:
+                start += 1
+
+            if last_emit is None:
+                window_complete = t >= window_size
+            else:
+                window_complete = t - last_emit >= hop
+            if not window_complete:
+                continue
+            last_emit = t
+
+            window = values[start - base:s + 1 - base, :n_sensors]
+            features = feature_engine.compute_features(window, stats)
+            score = float(np.ravel(detector.predict(features))[0])
+            i = s - base
+            latency = (time.monotonic_ns() - int(received[i])) / 1e9
+            results.put((int(timestamps[i]), score, score < detector.threshold,
+                         latency, dict(zip(READING_FIELDS, values[i].tolist()))))
+        seq = end
+        ring.publish_position(seq)
+
+
+class InferenceProcess:
+    """Runs run_inference() in a child process and keeps it running.
+
+    on_result(timestamp_ns, score, is_anomaly, latency_s, sensor_data) is called
+    from a thread in this process for every decision.
+    """
+
+    def __init__(self, ring, on_result, model_path, scaler_path, threshold,
+                 window_size=None, hop=1.0):
+        self.ring = ring
+        self.on_result = on_result
+        self._worker_args = (model_path, scaler_path, threshold, window_size, hop)
+        self._results = multiprocessing.Queue()
+        self.process = None
+        self.restarts = 0
+        self._last_start = 0.0
+        self._stop = threading.Event()
+        self._reader = threading.Thread(target=self._read_results, name='inference-results', daemon=True)
+        self._reader.start()
+        self._start()
+
+    def _start(self):
+        args = (self.ring.name, self.ring.lock, self._results) + self._worker_args + (self.restarts == 0,)
+        self.process = multiprocessing.Process(target=run_inference, args=args,
+                                               name='inference', daemon=True)
+        self.process.start()
+        self._last_start = time.monotonic()
+
+    def check(self):
+        """Restart the worker if it has died; cheap enough to call per reading."""
+        if self.process.is_alive() or self.ring.closed:
+            return
+        if time.monotonic() - self._last_start < RESTART_BACKOFF:
+            return
+        print(f"Inference process exited with code {self.process.exitcode}; restarting")
+        self.restarts += 1
+        self._start()
+
+    def wait_for_room(self, margin=1):
+        """Replay backpressure: wait until the worker has room in the ring."""
+        while self.ring.lag() >= self.ring.capacity - margin:
+            self.check()
+            time.sleep(POLL_INTERVAL)
+
+    def stop(self, timeout=30.0):
+        """Let the worker score what is in the ring, then stop it."""
+        self.ring.close_stream()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            print("Inference process did not stop; terminating")
+            self.process.terminate()
+            self.process.join()
+        self._stop.set()
+        self._reader.join()
+
+    def _read_results(self):
+        while True:
+            try:
+                result = self._results.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            self.on_result(*result)
@@ -1,34 +1,172 @@
 #!/usr/bin/env python3
+"""
+16x2 character LCD output.
+
+Every clear() or cursor move is a slow I2C transaction through the PCF8574
+expander, and clearing makes the screen flicker. LCDAlert therefore keeps a
+shadow copy of what the display shows and, on each refresh, writes only the
+runs of characters that changed. Refreshes happen on a background thread at
+most refresh_rate times per second, so callers only hand over text:
+show_reading() sets the live lines and display_alert() shows a message that
+takes priority over them for alert_hold seconds.
+
+FakeCharLCD stands in for RPLCD's CharLCD when there is no display, e.g.
+LCDAlert(lcd=FakeCharLCD(), start=False) followed by refresh() calls.
+"""
+
+import threading
+import time
+
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+
+class FakeCharLCD:
+    """In-memory CharLCD: same cursor_pos/write_string/clear interface."""
+
+    def __init__(self, cols=16, rows=2):
+        self.cols = cols
+        self.rows = rows
+        self.screen = [[' '] * cols for _ in range(rows)]
+        self._cursor = (0, 0)
+        # Bus operations a real display would have performed
+        self.clears = 0
+        self.cursor_moves = 0
+        self.chars_written = 0
+
+    @property
+    def cursor_pos(self):
+        return self._cursor
+
+    @cursor_pos.setter
+    def cursor_pos(self, value):
+        self._cursor = value
+        self.cursor_moves += 1
+
+    def write_string(self, text):
+        row, col = self._cursor
+        for char in text:
+            if col < self.cols:
+                self.screen[row][col] = char
+            col += 1
+        self._cursor = (row, col)
+        self.chars_written += len(text)
+
+    def clear(self):
+        self.screen = [[' '] * self.cols for _ in range(self.rows)]
+        self._cursor = (0, 0)
+        self.clears += 1
+
+    def lines(self):
+        return [''.join(row) for row in self.screen]
+
+
+def split_message(message, cols, rows):
+    # Wrap a message onto the display's lines, truncating what does not fit
+    return [message[i * cols:(i + 1) * cols] for i in range(rows)]
 
-from RPLCD.i2c import CharLCD
 
 class LCDAlert:
-    def __init__(self, i2c_address=0x27, port=1, cols=16, rows=2):
-        self.lcd = CharLCD(
-            i2c_expander='PCF8574',
-            address=i2c_address,
-            port=port,
-            cols=cols,
-            rows=rows,
-            dotsize=8
-        )
+    def __init__(self, i2c_address=0x27, port=1, cols=16, rows=2, lcd=None,
+                 refresh_rate=5.0, alert_hold=5.0, start=True, refresh_timer=None):
+        if lcd is None:
+            # Only importable on the Pi
+            from RPLCD.i2c import CharLCD
+            lcd = CharLCD(
+                i2c_expander='PCF8574',
+                address=i2c_address,
+                port=port,
+                cols=cols,
+                rows=rows,
+                dotsize=8
+            )
+        self.lcd = lcd
         self.cols = cols
         self.rows = rows
+        self.refresh_rate = refresh_rate
+        self.alert_hold = alert_hold
+        # Optional metrics.Histogram observing each background refresh
+        self.refresh_timer = refresh_timer
+        # The one clear(); afterwards the shadow always matches the display
         self.lcd.clear()
-    
+        self._shadow = [' ' * cols] * rows
+
+        self._lock = threading.Lock()
+        self._reading = [''] * rows
+        self._alert = None
+        self._alert_until = 0.0
+        self.refreshes = 0
+        self.runs_written = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name='lcd', daemon=True)
+            self._thread.start()
+
+    def show_reading(self, *lines):
+        """Set the live lines shown when no alert is active."""
+        with self._lock:
+            self._reading = list(lines)
+
     def display_alert(self, message):
-        self.lcd.clear()
-            
-        if len(message) <= self.cols:
-            self.lcd.cursor_pos = (0, 0)
-            self.lcd.write_string(message)
-        else:
-            line1 = message[:self.cols]
-            line2 = message[self.cols:self.cols*2]
-            
-            self.lcd.cursor_pos = (0, 0)
-            self.lcd.write_string(line1)
-            
-            if line2:
-                self.lcd.cursor_pos = (1, 0)
-                self.lcd.write_string(line2[:self.cols])
\ No newline at end of file
+        """Show message for alert_hold seconds, over the live lines."""
+        with self._lock:
+            self._alert = split_message(message, self.cols, self.rows)
+            self._alert_until = time.monotonic() + self.alert_hold
+
+    def current_frame(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            lines = self._alert if self._alert is not None and now < self._alert_until else self._reading
+        # Pad or cut every line to the display width
+        lines = (list(lines) + [''] * self.rows)[:self.rows]
+        return [line[:self.cols].ljust(self.cols) for line in lines]
+
+    def refresh(self, now=None):
+        """Write the changed runs of the current frame; returns the number of runs."""
+        runs = 0
+        for row, (new, old) in enumerate(zip(self.current_frame(now), self._shadow)):
+            col = 0
+            while col < self.cols:
+                if new[col] == old[col]:
+                    col += 1
+                    continue
+                end = col + 1
+                while end < self.cols and new[end] != old[end]:
+                    end += 1
+                self.lcd.cursor_pos = (row, col)
+                self.lcd.write_string(new[col:end])
+                runs += 1
+                col = end
+            self._shadow[row] = new
+        self.refreshes += 1
+        self.runs_written += runs
+        return runs
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        try:
+            self.refresh()
+        except OSError as e:
+            # The display may be gone by shutdown; that must not stop it
+            logger.error("Error updating LCD: %s", e)
+
+    def _run(self):
+        interval = 1.0 / self.refresh_rate
+        next_refresh = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                start = time.perf_counter()
+                self.refresh()
+                if self.refresh_timer:
+                    self.refresh_timer.observe(time.perf_counter() - start)
+            except Exception as e:
+                # A bus error must not kill the display thread
+                logger.error("Error updating LCD: %s", e)
+            next_refresh += interval
+            self._stop.wait(max(0.0, next_refresh - time.monotonic()))
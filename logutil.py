@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Shared leveled logging for the monitoring modules.
+
+Messages on the per-sample and per-window path are logged at DEBUG with
+%-style arguments, e.g. logger.debug("Buffer length: %d", n). Below the
+configured level such a call costs one level check: the message is never
+formatted and nothing is written. The default level is WARNING, so the hot
+path is silent unless --log-level DEBUG (or INFO) is asked for.
+
+configure() also installs a RateLimitFilter: each call site (logger, file,
+line) passes at most one record per rate_limit seconds, and the next record
+that passes reports how many were suppressed. A repeated error, such as a
+disconnected sensor, therefore costs one line every few seconds instead of
+one per sample.
+"""
+
+import logging
+import threading
+import time
+
+DEFAULT_LEVEL = 'WARNING'
+DEFAULT_RATE_LIMIT = 10.0
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most one record per call site every interval seconds."""
+
+    def __init__(self, interval=DEFAULT_RATE_LIMIT):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+
+def configure(level=DEFAULT_LEVEL, rate_limit=DEFAULT_RATE_LIMIT, stream=None):
+    """Send all logging to stream (stderr by default) at level, rate limited.
+
+    rate_limit=0 turns rate limiting off. Returns the handler.
+    """
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    if rate_limit:
+        handler.addFilter(RateLimitFilter(rate_limit))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
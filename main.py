@@ -1,21 +1,45 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import time
 import sys
-import board
-import adafruit_mpu6050
 import numpy as np
 
-from datetime import datetime
-from lcd_alert import LCDAlert      
+from datetime import datetime, timedelta
 
-import sms_alert
+# The LCD (RPLCD) and SMS (twilio) modules are imported only when alerts are
+# enabled, and a compact .npz model loads without pandas/sklearn, so the
+# first sample is read as soon as possible after a reboot.
 import anomaly_detector
 import sensor
+import sensor_source
+import pipeline
+import metrics
+import logutil
+import resample
+from mpu6050_fifo import frame_readings, frame_times_ns
 
-# "Usage: python main.py <alerts_enabled> [sensitivity] [threshold]"
+logger = logutil.get_logger('main')
+
+MODEL_PATH = 'models/model_svm.pkl'
+SCALER_PATH = 'models/scaler.pkl'
+COMPACT_MODEL_PATH = 'models/model_svm.npz'
+ALERT_PHONE = '+1234567890'
+METRICS_PATH = 'data/metrics.prom'
+EVENTS_DIR = 'data/events'
+THRESHOLD_STATE_PATH = 'data/threshold_state.npz'
+
+# "Usage: python main.py <alerts_enabled> [threshold] [--replay FILE] [--speed N] [--loop]
+#                        [--alert-file FILE | --alert-url URL] [--multiprocess]
+#                        [--fifo-rate HZ] [--simulate-sensor] [--resample HZ [--max-gap S]]
+#                        [--adaptive-threshold [--false-alarm-rate R]]"
 # alerts_enabled: 'true' or 'false'
-# sensitivity: float between 0.0 and 1.0 (default: 0.5)
-# threshold: anomaly threshold (default: -0.5)  
+# threshold: anomaly threshold (default: -2.0); with --adaptive-threshold, used until
+#            enough windows have been seen to derive one from the scores
+# --replay: run on a recorded data/sensor_data_*.csv (or .wtr) instead of the MPU6050
+# --speed: replay speed, 1 = real time, 0 = as fast as possible (default: 1)
+# --fifo-rate: sample the MPU6050 at HZ through its FIFO; --simulate-sensor: no hardware
+# --resample: interpolate readings onto an HZ grid so every window has the same sample count
 
 def format_alert(svm_score=None, sensor_data=None):
     alert = "WIND TURBINE ALERT\n"
@@ -26,93 +50,458 @@ def format_alert(svm_score=None, sensor_data=None):
         alert += f"Gyro: X={sensor_data['gyro_x']:.2f}, Y={sensor_data['gyro_y']:.2f}, Z={sensor_data['gyro_z']:.2f}\n"
     return alert
 
-def check_anomaly(buffer, svm_detector, sensor_data):
+def check_anomaly(buffer, svm_detector, sensor_data, calibrator=None, features=None):
     # Get the latest window of data
     window = buffer.get_latest_window()
     if window is None:
-        print("No window data available")
-        return False
+        logger.debug("No window data available")
+        return False, None
         
     # Use SVM detector to check for anomalies
-    svm_score = svm_detector.predict(buffer.last_features)
-    print(f"SVM score: {svm_score}")
-    if np.any(svm_score < svm_detector.threshold):
-        print(format_alert(svm_score, sensor_data))
-        return True
+    svm_score = svm_detector.predict(buffer.last_features if features is None else features)
+    logger.debug("SVM score: %s", svm_score)
+    if calibrator:
+        # Threshold from the recent score distribution (--adaptive-threshold)
+        is_anomaly = calibrator.update(np.min(svm_score), sensor_data.get('temp'))
+    else:
+        is_anomaly = np.any(svm_score < svm_detector.threshold)
+    if is_anomaly:
+        log_anomaly(svm_score, sensor_data)
+        return True, svm_score
     else:
-        print("SVM did not detect anomaly")
-    return False
-
-def main():
-    alerts_enabled = True
-    if sys.argv[1].lower() != 'true':
-        alerts_enabled = False
-    
-    threshold = -2.0
+        logger.debug("SVM did not detect anomaly")
+    return False, svm_score
+
+def log_anomaly(svm_score, sensor_data):
+    # Rate limited by logutil, so a long anomaly does not flood the console
+    logger.warning("Anomaly detected: SVM score %s, accel X=%.2f Y=%.2f Z=%.2f",
+                   svm_score, sensor_data['accel_x'], sensor_data['accel_y'], sensor_data['accel_z'])
+
+def select_model_path():
+    # Prefer the compact model if it was exported from the current pickle;
+    # a copy, checkout or restore can leave either file with any mtime
+    if not os.path.isfile(COMPACT_MODEL_PATH):
+        return MODEL_PATH
+    if not os.path.isfile(MODEL_PATH):
+        return COMPACT_MODEL_PATH
+    if anomaly_detector.compact_source_digest(COMPACT_MODEL_PATH) == anomaly_detector.file_sha256(MODEL_PATH):
+        return COMPACT_MODEL_PATH
+    print(f"{COMPACT_MODEL_PATH} was not exported from {MODEL_PATH}; loading the pickle")
+    return MODEL_PATH
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor turbine vibration for anomalies")
+    parser.add_argument('alerts_enabled', help="'true' to enable LCD and SMS alerts")
+    parser.add_argument('threshold', nargs='?', type=float, default=-2.0)
+    parser.add_argument('--replay', default=None, help="recorded sensor file to replay")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed multiplier, 0 for unthrottled")
+    parser.add_argument('--loop', action='store_true', help="replay the file forever")
+    parser.add_argument('--alert-file', default=None,
+                        help="write alerts as JSON lines to this file instead of sending SMS")
+    parser.add_argument('--alert-url', default=None,
+                        help="POST alerts as JSON to this URL instead of sending SMS")
+    parser.add_argument('--fifo-rate', type=float, default=None, metavar='HZ',
+                        help="sample the MPU6050 at HZ through its FIFO instead of polling at 5 Hz")
+    parser.add_argument('--simulate-sensor', action='store_true',
+                        help="use a simulated MPU6050 (FIFO mode, 500 Hz unless --fifo-rate)")
+    parser.add_argument('--multiprocess', action='store_true',
+                        help="score in a separate process fed through shared memory")
+    parser.add_argument('--resample', type=float, default=None, metavar='HZ',
+                        help="resample readings onto a uniform HZ grid before windowing")
+    parser.add_argument('--max-gap', type=float, default=resample.DEFAULT_MAX_GAP,
+                        help="with --resample, longest gap in seconds interpolated across")
+    parser.add_argument('--adaptive-threshold', action='store_true',
+                        help="derive the threshold from recent scores (see adaptive_threshold.py)")
+    parser.add_argument('--false-alarm-rate', type=float, default=0.01,
+                        help="with --adaptive-threshold, fraction of normal windows flagged (below 0.2)")
+    parser.add_argument('--threshold-state', default=THRESHOLD_STATE_PATH,
+                        help="adaptive threshold state kept across restarts ('' to disable)")
+    parser.add_argument('--events-dir', default=EVENTS_DIR,
+                        help="save raw readings around each detection here ('' to disable)")
+    parser.add_argument('--event-pre', type=float, default=10.0,
+                        help="seconds of readings kept from before a detection")
+    parser.add_argument('--event-post', type=float, default=5.0,
+                        help="seconds of readings kept from after a detection")
+    parser.add_argument('--log-level', default=logutil.DEFAULT_LEVEL, choices=logutil.LEVELS,
+                        help="DEBUG shows every reading, window and score")
+    parser.add_argument('--log-rate-limit', type=float, default=logutil.DEFAULT_RATE_LIMIT,
+                        help="seconds between repeats of the same log message, 0 for no limit")
+    parser.add_argument('--metrics-file', default=METRICS_PATH,
+                        help="Prometheus text file rewritten periodically ('' to disable)")
+    parser.add_argument('--metrics-interval', type=float, default=10.0,
+                        help="seconds between metrics file updates")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="also serve metrics at http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args(argv)
+    if args.resample and args.multiprocess:
+        parser.error("--resample is not supported with --multiprocess")
+    # The alarm clears at five times the false alarm rate, which must stay below 1
+    if not 0 < args.false_alarm_rate < 0.2:
+        parser.error("--false-alarm-rate must be between 0 and 0.2")
+    return args
+
+class Monitor:
+    """Window scoring and anomaly accounting, run by the 'scoring' pipeline.Stage.
+
+    Items from acquisition are (timestamp, sensor_data, received), where
+    received is the perf_counter time the reading arrived, or with a FIFO
+    source (timestamps_ns, values, temperature, received) blocks for
+    score_block.
+    """
+
+    def __init__(self, buffer, svm_detector, on_anomaly=None, registry=None, on_window=None,
+                 calibrator=None):
+        self.buffer = buffer
+        self.svm_detector = svm_detector
+        self.on_anomaly = on_anomaly
+        # Optional adaptive_threshold.AdaptiveThreshold deciding anomalies
+        self.calibrator = calibrator
+        # Called with the timestamp of every scored window, after on_anomaly
+        self.on_window = on_window
+        self.latencies = []
+        self.n_anomalies = 0
+
+        registry = registry or metrics.Registry()
+        self.buffer_time = registry.histogram('stage_seconds', STAGE_HELP, stage='buffer')
+        self.predict_time = registry.histogram('stage_seconds', STAGE_HELP, stage='predict')
+        self.detection_latency = registry.histogram(
+            'detection_latency_seconds', "Reading arrival to anomaly decision on its window")
+        self.windows = registry.counter('windows_total', "Windows scored")
+        self.anomalies = registry.counter('anomalies_total', "Windows scored as anomalies")
+        self.threshold = registry.gauge('anomaly_threshold', "Threshold the last window was compared with")
+
+    def score(self, item):
+        timestamp, sensor_data, received = item
+        # add_reading returns the window's features, or False
+        start = time.perf_counter()
+        features = self.buffer.add_reading(sensor_data, timestamp)
+        self.buffer_time.observe(time.perf_counter() - start)
+        if features is False or features is None:
+            return
+        logger.debug("Features extracted, running anomaly detection...")
+        start = time.perf_counter()
+        is_anomaly, svm_score = check_anomaly(self.buffer, self.svm_detector, sensor_data,
+                                              self.calibrator)
+        self.predict_time.observe(time.perf_counter() - start)
+        # Detection latency: reading arrived -> decision, including queueing
+        self.record(time.perf_counter() - received, is_anomaly, svm_score, sensor_data, timestamp,
+                    features)
+
+    def score_block(self, item):
+        timestamps_ns, values, temperature, received = item
+        start = time.perf_counter()
+        windows = self.buffer.add_block(timestamps_ns, values)
+        self.buffer_time.observe(time.perf_counter() - start)
+        for row, features in windows:
+            # Only the reading that completed a window becomes a dict
+            timestamp, sensor_data = next(frame_readings(timestamps_ns[row:row + 1],
+                                                         values[row:row + 1], temperature))
+            start = time.perf_counter()
+            is_anomaly, svm_score = check_anomaly(self.buffer, self.svm_detector, sensor_data,
+                                                  self.calibrator, features)
+            self.predict_time.observe(time.perf_counter() - start)
+            self.record(time.perf_counter() - received, is_anomaly, svm_score, sensor_data,
+                        timestamp, features)
+
+    def inference_result(self, timestamp_ns, score, is_anomaly, latency, sensor_data):
+        # A decision from the inference process (--multiprocess)
+        logger.debug("SVM score: %s", score)
+        if self.calibrator:
+            is_anomaly = self.calibrator.update(score, sensor_data.get('temp'))
+        if is_anomaly:
+            log_anomaly(score, sensor_data)
+        timestamp = datetime(1970, 1, 1) + timedelta(microseconds=timestamp_ns // 1000)
+        self.record(latency, is_anomaly, score, sensor_data, timestamp)
+
+    def record(self, latency, is_anomaly, svm_score, sensor_data, timestamp, features=None):
+        if self.calibrator:
+            self.threshold.set(self.calibrator.threshold)
+        self.latencies.append(latency)
+        self.detection_latency.observe(latency)
+        self.windows.inc()
+        if is_anomaly:
+            self.n_anomalies += 1
+            self.anomalies.inc()
+            if self.on_anomaly:
+                self.on_anomaly(float(np.min(svm_score)), sensor_data, timestamp, features)
+        if self.on_window:
+            self.on_window(timestamp)
+
+STAGE_HELP = "Time spent in each stage of the monitoring loop"
+
+def export_hook(registry, samples, source, stages):
+    """Updates rate, overrun and queue metrics before each metrics export."""
+    sample_rate = registry.gauge('sample_rate_hz', "Achieved sample rate since the last export")
+    overruns = registry.counter('sampling_overruns_total', "Sampling ticks missed because a read overran")
+    lateness = registry.gauge('sampling_max_lateness_seconds', "Largest delay of a reading after its tick")
+    last = [time.monotonic(), 0]
+
+    def update():
+        now = time.monotonic()
+        sample_rate.set((samples.value - last[1]) / max(now - last[0], 1e-9))
+        last[:] = [now, samples.value]
+        scheduler = getattr(source, 'scheduler', None)
+        if scheduler:
+            overruns.value = scheduler.missed
+            lateness.set(scheduler.max_lateness)
+        for stage in stages:
+            registry.counter('stage_dropped_total', "Items dropped from a full stage queue",
+                             stage=stage.name).value = stage.dropped
+            registry.gauge('stage_queue_depth', "Items waiting in a stage queue",
+                           stage=stage.name).set(stage.queue.qsize())
+    return update
+
+def print_run_stats(n_samples, elapsed, monitor, source, stages, dispatcher=None, recorder=None):
+    # Throughput of the whole run, and the time from a sample arriving to
+    # the anomaly decision on the window it completed
+    print(f"\nProcessed {n_samples} samples in {elapsed:.2f} s "
+          f"({n_samples / max(elapsed, 1e-9):.0f} samples/s)")
+    scheduler = getattr(source, 'scheduler', None)
+    if scheduler:
+        print(f"Sampling: {scheduler.summary()}")
+    for stage in stages:
+        print(stage.summary())
+    if dispatcher:
+        print(dispatcher.summary())
+    if recorder:
+        print(recorder.summary())
+    if monitor and monitor.calibrator:
+        print(monitor.calibrator.summary())
+    resampler = getattr(monitor and monitor.buffer, 'resampler', None)
+    if resampler:
+        print(resampler.summary())
+    if monitor and monitor.latencies:
+        latencies_ms = np.array(monitor.latencies) * 1e3
+        print(f"{len(latencies_ms)} windows scored, {monitor.n_anomalies} anomalies; detection latency "
+              f"p50 {np.percentile(latencies_ms, 50):.3f} ms, "
+              f"p99 {np.percentile(latencies_ms, 99):.3f} ms, "
+              f"max {latencies_ms.max():.3f} ms")
+
+def main(argv=None):
+    args = parse_args(argv)
+    logutil.configure(args.log_level, args.log_rate_limit)
+    lcd = None
+    buffer = None
+    data_logger = None
+    source = None
+    monitor = None
+    dispatcher = None
+    recorder = None
+    exporter = None
+    ring = None
+    inference = None
+    stages = []
+    alerts_enabled = args.alerts_enabled.lower() == 'true'
+    threshold = args.threshold
     sensitivity = 0.5  # Default value
-    if len(sys.argv) > 2:
-        threshold = float(sys.argv[2])
+    n_samples = 0
+    run_start = time.perf_counter()
+
+    # Per-stage timings and counters; cheap enough to keep on
+    registry = metrics.Registry()
+    samples = registry.counter('samples_total', "Readings acquired")
 
     try:
         print("Starting initialization...")
         
         # Initialize components
         if alerts_enabled:
-            lcd = LCDAlert()
+            from lcd_alert import LCDAlert
+            lcd = LCDAlert(refresh_timer=registry.histogram('stage_seconds', STAGE_HELP, stage='lcd'))
             lcd.display_alert("Hello")
+        if alerts_enabled or args.alert_file or args.alert_url:
+            # Alerts are queued and sent from a background thread, coalesced
+            # to at most one message per cooldown period
+            import alert_dispatcher
+            if args.alert_file:
+                transport = alert_dispatcher.FileTransport(args.alert_file)
+            elif args.alert_url:
+                transport = alert_dispatcher.HTTPTransport(args.alert_url)
+            else:
+                import sms_alert
+                transport = sms_alert.TwilioTransport()
+            dispatcher = alert_dispatcher.AlertDispatcher(
+                transport, ALERT_PHONE, min_interval=10.0,
+                send_timer=registry.histogram('stage_seconds', STAGE_HELP, stage='alert_send'))
             
-        i2c = board.I2C()
-        sensor_device = adafruit_mpu6050.MPU6050(i2c)
-        buffer = sensor.SensorBuffer(window_size=6.6) # 6.6 seconds is the periodicity of the turbine
-        svm_detector = anomaly_detector.OneClassSVMDetector('models/model_svm.pkl', sensitivity, threshold)
+        # The MPU6050 on a 5 Hz deadline schedule or at hundreds of Hz
+        # through its FIFO, or a recording replayed with its own timestamps
+        source = sensor_source.open_source(
+            args.replay, speed=args.speed, loop=args.loop,
+            read_timer=registry.histogram('stage_seconds', STAGE_HELP, stage='read'),
+            fifo_rate=args.fifo_rate, simulate=args.simulate_sensor)
+        # Buffers and queues are sized for 5 Hz; scale them up for FIFO rates
+        sample_rate = getattr(source, 'sample_rate', 5.0)
+        scale = max(1, int(sample_rate / 5.0))
+        # A FIFO source hands the recorder and scoring stages whole polls of
+        # about interval * sample_rate readings; their queues hold as many
+        # readings as they would one by one
+        block_source = hasattr(source, 'blocks')
+        per_item = source.interval * sample_rate if block_source else 1
+        svm_detector = None
+        if not args.multiprocess:
+            svm_detector = anomaly_detector.OneClassSVMDetector(select_model_path(), SCALER_PATH,
+                                                                sensitivity=sensitivity, threshold=threshold)
+            # Windows as long as the model was trained on (by default 6.6 s, the
+            # periodicity of the turbine); overlapping windows every second give
+            # several decisions per rotation. The buffer computes the features
+            # the loaded model was trained on.
+            buffer = sensor.SensorBuffer(window_size=svm_detector.window_size, hop=1.0,
+                                         capacity=512 * scale,
+                                         feature_set=svm_detector.feature_stats,
+                                         resample_rate=args.resample, max_gap=args.max_gap)
+
+        # Everything after the sensor read runs on consumer threads (the LCD
+        # has its own rate-limited thread in LCDAlert). Live, a
+        # full queue drops its oldest item so sampling never waits; a replay
+        # waits instead so every reading is scored.
+        drop_oldest = source.live
+
+        # Flight recorder: the last minutes of raw readings stay in memory, and
+        # the readings around each detection are saved to their own file by a
+        # background thread
+        if args.events_dir:
+            from flight_recorder import FlightRecorder
+            recorder = FlightRecorder(args.events_dir, args.event_pre, args.event_post,
+                                      capacity=4096 * scale, drop_events=drop_oldest,
+                                      write_timer=registry.histogram('stage_seconds', STAGE_HELP,
+                                                                     stage='event_write'))
+            if svm_detector:
+                recorder.feature_names = svm_detector.feature_names
+            if block_source:
+                record = lambda item: recorder.record_block(frame_times_ns(item[0]), item[1], item[2])
+            else:
+                record = lambda item: recorder.record(item[0], item[1])
+            stages.insert(0, pipeline.Stage(
+                'recorder', record, maxsize=max(1, int(1000 * scale / per_item)),
+                drop_oldest=drop_oldest,
+                timer=registry.histogram('stage_seconds', STAGE_HELP, stage='recorder')))
+
+        def on_anomaly(svm_score, sensor_data, timestamp, features=None):
+            if lcd:
+                lcd.display_alert("ANOMALY DETECTED!")
+            if dispatcher:
+                dispatcher.submit(svm_score, sensor_data, timestamp)
+            if recorder:
+                recorder.trigger(timestamp, svm_score, features)
+
+        # Adaptive threshold: the fixed threshold applies until enough
+        # windows have been scored; the learned state survives restarts
+        calibrator = None
+        if args.adaptive_threshold:
+            from adaptive_threshold import AdaptiveThreshold
+            calibrator = AdaptiveThreshold(args.false_alarm_rate, 5 * args.false_alarm_rate,
+                                           fixed_threshold=threshold,
+                                           state_path=args.threshold_state or None)
+            if calibrator.load():
+                print(f"Adaptive threshold state loaded from {args.threshold_state}")
+
+        monitor = Monitor(buffer, svm_detector, on_anomaly, registry,
+                          recorder.advance if recorder else None, calibrator)
+        if args.multiprocess:
+            # Scoring runs in its own process and reads the same windows
+            # straight from shared memory; it is restarted if it dies while
+            # acquisition carries on
+            from shm_ring import SampleRing
+            from inference_process import InferenceProcess
+            ring = SampleRing(4096 * scale)
+            inference = InferenceProcess(ring, monitor.inference_result, select_model_path(),
+                                         SCALER_PATH, threshold, hop=1.0)
+        else:
+            # About a minute of readings can queue while a window is scored
+            stages.append(pipeline.Stage(
+                'scoring', monitor.score_block if block_source else monitor.score,
+                maxsize=max(1, int(300 * scale / per_item)), drop_oldest=drop_oldest,
+                timer=registry.histogram('stage_seconds', STAGE_HELP, stage='scoring')))
+
+        # Raw samples are batched in memory and written by a background thread,
+        # one file per day. A replay is already recorded, so it is not logged
+        # again, and simulated readings are not logged at all.
+        if source.live and not args.simulate_sensor:
+            data_logger = sensor.SensorDataLogger('data/sensor_data.csv', rotate_daily=True)
+            stages.insert(0, pipeline.Stage(
+                'log', lambda item: data_logger.log(item[1], item[0].isoformat()),
+                maxsize=1000 * scale, drop_oldest=drop_oldest,
+                timer=registry.histogram('stage_seconds', STAGE_HELP, stage='log')))
+
+        if args.metrics_file or args.metrics_port is not None:
+            exporter = metrics.MetricsExporter(registry, args.metrics_file, args.metrics_interval,
+                                               args.metrics_port,
+                                               export_hook(registry, samples, source, stages))
 
         print("\nMonitoring!")
         print("Press Ctrl+C to stop")
-        
-        while True:
-            # Read sensor
-            accel = sensor_device.acceleration
-            gyro = sensor_device.gyro
-            temp = sensor_device.temperature
-            timestamp = datetime.now()
-            accel_x, accel_y, accel_z = accel
-            gyro_x, gyro_y, gyro_z = gyro
-            
-            sensor_data = {
-                'accel_x': accel_x, 'accel_y': accel_y, 'accel_z': accel_z,
-                'gyro_x': gyro_x, 'gyro_y': gyro_y, 'gyro_z': gyro_z,
-                'temp': temp
-            }
-            
-            # Log sensor data to CSV
-            sensor.log_sensor_data_to_csv(sensor_data, timestamp.isoformat())
-            
-            # Update display
-            if lcd:
-                lcd.lcd.clear()
-                lcd.lcd.cursor_pos = (0, 0)
-                lcd.lcd.write_string(f"X:{accel_x:.1f} Y:{accel_y:.1f}")
-                lcd.lcd.cursor_pos = (1, 0)
-                lcd.lcd.write_string(f"Z:{accel_z:.1f}")
-            
-            # Check for anomalies
-            if buffer.add_reading(sensor_data, timestamp):
-                features = buffer.last_features
-                if features is not None:
-                    print("Features extracted, running anomaly detection...")
-                    is_anomaly = check_anomaly(buffer, svm_detector, sensor_data)
-                    if is_anomaly:
-                        if lcd:
-                            lcd.display_alert("ANOMALY DETECTED!")
-                        if alerts_enabled:
-                            alert_message = format_alert(sensor_data)
-                            sms_alert.send_sms_alert('+1234567890', alert_message)
-            time.sleep(0.2)  # 5 Hz
+        run_start = time.perf_counter()
+
+        def acquire(timestamp, sensor_data, received, stages):
+            item = (timestamp, sensor_data, received)
+            if inference:
+                if not source.live:
+                    inference.wait_for_room()
+                ring.write_reading(timestamp, sensor_data)
+                inference.check()
+            for stage in stages:
+                stage.put(item)
+
+        def show_reading(accel_x, accel_y, accel_z):
+            # Only stores the text; the LCD thread redraws what changed
+            lcd.show_reading(f"X:{accel_x:.1f} Y:{accel_y:.1f}", f"Z:{accel_z:.1f}")
+
+        # Acquisition: the source paces itself (5 Hz deadlines from the
+        # sensor, or the recorded timestamps divided by --speed for a replay)
+        if block_source:
+            # The recorder and scoring take each FIFO block whole; frames
+            # become readings only for the data logger and --multiprocess
+            block_stages = [stage for stage in stages if stage.name in ('recorder', 'scoring')]
+            reading_stages = [stage for stage in stages if stage not in block_stages]
+            for timestamps_ns, values, temperature in source.blocks():
+                received = time.perf_counter()
+                n_samples += len(timestamps_ns)
+                samples.inc(len(timestamps_ns))
+                for stage in block_stages:
+                    stage.put((timestamps_ns, values, temperature, received))
+                if inference or reading_stages:
+                    for timestamp, sensor_data in frame_readings(timestamps_ns, values, temperature):
+                        acquire(timestamp, sensor_data, received, reading_stages)
+                if lcd:
+                    show_reading(*values[-1, :3])
+        else:
+            for timestamp, sensor_data in source:
+                n_samples += 1
+                samples.inc()
+                acquire(timestamp, sensor_data, time.perf_counter(), stages)
+                if lcd:
+                    show_reading(sensor_data['accel_x'], sensor_data['accel_y'],
+                                 sensor_data['accel_z'])
     except KeyboardInterrupt:
         print("\nStopping...")
     finally:
+        # Let the consumers finish what is queued; scoring goes first
+        # because it can still queue alerts and trigger recorder events
+        if inference:
+            inference.stop()
+            print(f"Inference process restarts: {inference.restarts}")
+        if ring:
+            ring.close()
+        for stage in sorted(stages, key=lambda stage: stage.name != 'scoring'):
+            stage.close()
+        if dispatcher:
+            dispatcher.close()
+        if recorder:
+            recorder.close()
+        if monitor and monitor.calibrator and monitor.calibrator.state_path:
+            monitor.calibrator.save()
         if buffer:
             buffer._process_window()
+        if data_logger:
+            data_logger.close()
+        if lcd:
+            lcd.close()
+        if exporter:
+            exporter.close()
+        print_run_stats(n_samples, time.perf_counter() - run_start, monitor, source, stages, dispatcher,
+                        recorder)
         
         print("\nGood bye!")
         return 0
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Lightweight metrics for the monitoring loop, exported in Prometheus text
+format.
+
+Histograms have fixed buckets, so observe() is a binary search and two
+additions with no allocation (well under a microsecond); counters and gauges
+are plain attributes. Each metric is meant to be updated from one thread;
+the exporter reads them without locking, which at worst shows a sample
+split across two scrapes.
+
+MetricsExporter rewrites a text file every interval seconds (atomically, for
+node_exporter's textfile collector or a simple cat) and can also serve the
+same text on a local HTTP port at /metrics.
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds in seconds: 50 us (a compiled predict) to 5 s (a slow SMS)
+LATENCY_BUCKETS = [50e-6, 100e-6, 250e-6, 500e-6, 1e-3, 2.5e-3, 5e-3, 10e-3,
+                   25e-3, 50e-3, 100e-3, 250e-3, 500e-3, 1.0, 2.5, 5.0]
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, labels=()):
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        yield f"{name}{_label_text(self.labels)} {self.value}"
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, labels=(), buckets=LATENCY_BUCKETS):
+        self.labels = labels
+        self.buckets = list(buckets)
+        # One count per bucket plus +Inf; cumulated only when exported
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block."""
+        return _Timer(self)
+
+    def samples(self, name):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            labels = self.labels + (('le', bound if bound == '+Inf' else repr(bound)),)
+            yield f"{name}_bucket{_label_text(labels)} {cumulative}"
+        yield f"{name}_sum{_label_text(self.labels)} {self.sum!r}"
+        yield f"{name}_count{_label_text(self.labels)} {self.count}"
+
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """Named metric families; the same name with other labels is another series."""
+
+    def __init__(self, prefix='turbine_'):
+        self.prefix = prefix
+        self._families = {}
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        name = self.prefix + name
+        family = self._families.setdefault(name, {'kind': cls.kind, 'help': help_text, 'series': {}})
+        if family['kind'] != cls.kind:
+            raise ValueError(f"{name} is already a {family['kind']}")
+        key = tuple(sorted(labels.items())) if labels else ()
+        if key not in family['series']:
+            family['series'][key] = cls(key, **kwargs)
+        return family['series'][key]
+
+    def counter(self, name, help_text='', **labels):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text='', **labels):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text='', buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """All metrics in Prometheus text exposition format."""
+        lines = []
+        for name, family in list(self._families.items()):
+            lines.append(f"# HELP {name} {family['help']}")
+            lines.append(f"# TYPE {name} {family['kind']}")
+            for metric in list(family['series'].values()):
+                lines.extend(metric.samples(name))
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsExporter:
+    """Writes registry.render() to path every interval seconds, optionally serves it over HTTP.
+
+    before_export, if given, is called before each write, e.g. to update
+    rate gauges.
+    """
+
+    def __init__(self, registry, path=None, interval=10.0, port=None, before_export=None):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.before_export = before_export
+        self._stop = threading.Event()
+        self._server = None
+        if port is not None:
+            self._server = _serve(registry, port)
+            print(f"Metrics at http://127.0.0.1:{self._server.server_address[1]}/metrics")
+        self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+        self._thread.start()
+
+    def export(self):
+        if self.before_export:
+            self.before_export()
+        if not self.path:
+            return
+        # Write then rename, so readers never see a half-written file
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.export()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+
+
+def _serve(registry, port):
+    # Imported here: http.server is only needed with a metrics port
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    # Local only: the endpoint is for a collector on the Pi or an SSH tunnel
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
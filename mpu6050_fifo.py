@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+High-rate MPU6050 acquisition through the on-chip FIFO.
+
+Polling .acceleration, .gyro and .temperature costs three I2C transactions
+and a few hundred microseconds of Python per sample. Instead MPU6050FIFO
+sets the sample-rate divider so the chip samples by itself (1 kHz / (1 +
+SMPLRT_DIV) with the low-pass filter on), has it queue accel+gyro frames in
+its 1024-byte FIFO, and every poll reads:
+
+    INT_STATUS .. TEMP_OUT   one transaction: FIFO overflow flag and temperature
+    FIFO_COUNT               bytes waiting
+    FIFO_R_W                 all whole 12-byte frames in one burst
+
+The burst is decoded for all frames at once: np.frombuffer with a
+big-endian int16 dtype (the byteswap) reshaped to (n, 6) and scaled to m/s^2
+and rad/s, the units adafruit_mpu6050 returns. Frames get timestamps from the
+sample counter at the configured rate, anchored to the host clock and
+re-anchored if the two drift apart.
+
+The FIFO holds 85 frames (170 ms at 500 Hz), so it must be polled faster
+than that. On overflow the chip drops the oldest bytes, which breaks the
+frame alignment; the driver then resets the FIFO, counts the overflow and
+starts again from fresh frames.
+
+SimulatedMPU6050 implements the same registers in memory, producing frames
+from a signal function on a clock, so decoding, timing and overflow handling
+can be exercised without hardware (main.py --simulate-sensor).
+"""
+
+import math
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Registers (MPU-6000/6050 register map)
+SMPLRT_DIV = 0x19
+CONFIG = 0x1A
+GYRO_CONFIG = 0x1B
+ACCEL_CONFIG = 0x1C
+FIFO_EN = 0x23
+INT_STATUS = 0x3A
+ACCEL_XOUT_H = 0x3B
+TEMP_OUT_H = 0x41
+USER_CTRL = 0x6A
+PWR_MGMT_1 = 0x6B
+FIFO_COUNTH = 0x72
+FIFO_R_W = 0x74
+WHO_AM_I = 0x75
+
+# Bits
+FIFO_OFLOW_INT = 0x10
+FIFO_EN_ACCEL_GYRO = 0x78      # XG, YG, ZG and ACCEL FIFO enables
+USER_CTRL_FIFO_EN = 0x40
+USER_CTRL_FIFO_RESET = 0x04
+PWR_DEVICE_RESET = 0x80
+PWR_SLEEP = 0x40
+PWR_CLOCK_PLL_XGYRO = 0x01
+DLPF_184HZ = 0x01
+
+FIFO_SIZE = 1024
+FRAME_BYTES = 12
+# 1 kHz gyro output rate while the low-pass filter is enabled
+BASE_RATE = 1000.0
+
+STANDARD_GRAVITY = 9.80665
+# LSB per unit at the default full-scale ranges (+-2 g, +-250 deg/s)
+ACCEL_LSB_PER_G = 16384.0
+GYRO_LSB_PER_DPS = 131.0
+
+# Frame columns to physical units, in SENSOR_NAMES order
+FRAME_SCALE = np.array([STANDARD_GRAVITY / ACCEL_LSB_PER_G] * 3
+                       + [math.radians(1.0) / GYRO_LSB_PER_DPS] * 3)
+
+
+def decode_frames(data):
+    """(n, 6) float array of accel (m/s^2) and gyro (rad/s) from whole FIFO frames."""
+    raw = np.frombuffer(data, dtype='>i2')
+    return raw.reshape(-1, 6) * FRAME_SCALE
+
+
+def temperature_from_raw(raw):
+    return raw / 340.0 + 36.53
+
+
+def divider_for_rate(sample_rate):
+    return max(0, min(255, round(BASE_RATE / sample_rate) - 1))
+
+
+class I2CRegisters:
+    """Register reads and writes on a real device, through adafruit_bus_device."""
+
+    def __init__(self, i2c=None, address=0x68):
+        # Only importable on the Pi
+        from adafruit_bus_device.i2c_device import I2CDevice
+
+        if i2c is None:
+            import board
+            i2c = board.I2C()
+        self.device = I2CDevice(i2c, address)
+        self._out = bytearray(2)
+
+    def write(self, register, value):
+        self._out[0] = register
+        self._out[1] = value
+        with self.device as device:
+            device.write(self._out)
+
+    def read(self, register, n):
+        data = bytearray(n)
+        with self.device as device:
+            device.write_then_readinto(bytes([register]), data)
+        return data
+
+
+def turbine_signal(t):
+    """Synthetic vibration for the simulator: gravity, the 6.6 s rotation and
+    a 35 Hz gear mesh tone plus noise, as an (n, 6) array for times t."""
+    t = np.asarray(t, dtype=np.float64)
+    rotation = 2 * np.pi * t / 6.6
+    mesh = 2 * np.pi * 35.0 * t
+    noise = np.random.default_rng(int(t[0] * 1000) if len(t) else 0).normal(0.0, 0.02, (len(t), 6))
+    values = np.column_stack([
+        0.4 * np.sin(rotation) + 0.1 * np.sin(mesh),
+        0.3 * np.cos(rotation) + 0.05 * np.sin(mesh),
+        STANDARD_GRAVITY + 0.2 * np.sin(2 * rotation),
+        0.05 * np.sin(rotation),
+        0.03 * np.cos(rotation),
+        0.02 * np.sin(mesh),
+    ])
+    return values + noise
+
+
+class SimulatedMPU6050:
+    """Register-level MPU6050 in memory, with the FIFO filled from signal(t) on clock().
+
+    Same read(register, n)/write(register, value) interface as I2CRegisters.
+    Frames are generated lazily on each access for the time elapsed since the
+    last one; when more arrive than the FIFO holds, the oldest bytes are
+    dropped and FIFO_OFLOW_INT is set, as on the chip.
+    """
+
+    def __init__(self, signal=turbine_signal, clock=time.monotonic, temperature=25.0):
+        self.signal = signal
+        self.clock = clock
+        self.temperature = temperature
+        self.registers = bytearray(128)
+        self.registers[PWR_MGMT_1] = PWR_SLEEP
+        self.registers[WHO_AM_I] = 0x68
+        self.fifo = bytearray()
+        self._start = None
+        self._generated = 0
+        # Bus traffic a real device would have seen
+        self.transactions = 0
+        self.bytes_read = 0
+
+    def sample_rate(self):
+        dlpf = self.registers[CONFIG] & 0x07
+        base = BASE_RATE if 0 < dlpf < 7 else 8 * BASE_RATE
+        return base / (1 + self.registers[SMPLRT_DIV])
+
+    def _running(self):
+        return (not self.registers[PWR_MGMT_1] & PWR_SLEEP
+                and self.registers[USER_CTRL] & USER_CTRL_FIFO_EN
+                and self.registers[FIFO_EN] & FIFO_EN_ACCEL_GYRO == FIFO_EN_ACCEL_GYRO)
+
+    def _restart(self):
+        # Sampling restarts whenever its configuration changes
+        self._start = self.clock() if self._running() else None
+        self._generated = 0
+
+    def _update(self):
+        if self._start is None:
+            return
+        rate = self.sample_rate()
+        due = int((self.clock() - self._start) * rate)
+        n = due - self._generated
+        if n <= 0:
+            return
+        # Only the newest frames can survive in the FIFO
+        keep = min(n, FIFO_SIZE // FRAME_BYTES + 1)
+        t = self._start + np.arange(due - keep, due) / rate
+        raw = np.clip(np.round(self.signal(t) / FRAME_SCALE), -32768, 32767)
+        self.fifo += raw.astype('>i2').tobytes()
+        if n > keep or len(self.fifo) > FIFO_SIZE:
+            del self.fifo[:len(self.fifo) - FIFO_SIZE]
+            self.registers[INT_STATUS] |= FIFO_OFLOW_INT
+        self._generated = due
+
+    def write(self, register, value):
+        self.transactions += 1
+        self._update()
+        if register == PWR_MGMT_1 and value & PWR_DEVICE_RESET:
+            self.registers[:] = bytes(128)
+            self.registers[PWR_MGMT_1] = PWR_SLEEP
+            self.registers[WHO_AM_I] = 0x68
+            self.fifo.clear()
+            self._restart()
+            return
+        if register == USER_CTRL and value & USER_CTRL_FIFO_RESET:
+            self.fifo.clear()
+            value &= ~USER_CTRL_FIFO_RESET
+        self.registers[register] = value
+        if register in (PWR_MGMT_1, CONFIG, SMPLRT_DIV, FIFO_EN, USER_CTRL):
+            self._restart()
+
+    def read(self, register, n):
+        self.transactions += 1
+        self.bytes_read += n
+        self._update()
+        if register == FIFO_R_W:
+            data = bytearray(self.fifo[:n])
+            del self.fifo[:n]
+            # Reading an empty FIFO returns the last byte again; zeros will do
+            return data + bytes(n - len(data))
+        out = bytearray(n)
+        for i in range(n):
+            reg = register + i
+            if reg == INT_STATUS:
+                out[i] = self.registers[INT_STATUS]
+                # Reading INT_STATUS clears it
+                self.registers[INT_STATUS] = 0
+            elif reg in (FIFO_COUNTH, FIFO_COUNTH + 1):
+                out[i] = len(self.fifo).to_bytes(2, 'big')[reg - FIFO_COUNTH]
+            elif reg in (TEMP_OUT_H, TEMP_OUT_H + 1):
+                raw = round((self.temperature - 36.53) * 340.0)
+                out[i] = raw.to_bytes(2, 'big', signed=True)[reg - TEMP_OUT_H]
+            else:
+                out[i] = self.registers[reg]
+        return out
+
+
+class MPU6050FIFO:
+    """Configures an MPU6050 for FIFO sampling and reads frames in bursts."""
+
+    def __init__(self, registers, sample_rate=500.0, max_burst=None, sleep=time.sleep, clock=time.time):
+        if max_burst is not None and max_burst < FRAME_BYTES:
+            raise ValueError(f"max_burst must be at least one frame ({FRAME_BYTES} bytes)")
+        self.registers = registers
+        # Some I2C adapters limit the transfer size; None reads in one go
+        self.max_burst = max_burst
+        self.sleep = sleep
+        self.clock = clock
+        self.divider = divider_for_rate(sample_rate)
+        self.sample_rate = BASE_RATE / (1 + self.divider)
+
+        self.frames = 0
+        self.blocks = 0
+        self.overflows = 0
+        self.resyncs = 0
+        self.max_fill = 0
+        self._anchor = None
+        self.frames_since_anchor = 0
+        self.configure()
+
+    def configure(self):
+        regs = self.registers
+        regs.write(PWR_MGMT_1, PWR_DEVICE_RESET)
+        self.sleep(0.1)
+        # Wake up on the gyro PLL clock, which is more stable than the internal oscillator
+        regs.write(PWR_MGMT_1, PWR_CLOCK_PLL_XGYRO)
+        regs.write(CONFIG, DLPF_184HZ)
+        regs.write(SMPLRT_DIV, self.divider)
+        regs.write(GYRO_CONFIG, 0x00)
+        regs.write(ACCEL_CONFIG, 0x00)
+        regs.write(FIFO_EN, FIFO_EN_ACCEL_GYRO)
+        self.reset_fifo()
+
+    def reset_fifo(self):
+        self.registers.write(USER_CTRL, USER_CTRL_FIFO_RESET)
+        self.registers.write(USER_CTRL, USER_CTRL_FIFO_EN)
+        self._anchor = None
+
+    def read_block(self):
+        """Read every whole frame waiting in the FIFO.
+
+        Returns (timestamps_ns, values, temperature): int64 timestamps of
+        each frame, an (n, 6) float array accel_x .. gyro_z, and the die
+        temperature at the time of the read. n is 0 after an overflow.
+        """
+        status = self.registers.read(INT_STATUS, TEMP_OUT_H + 2 - INT_STATUS)
+        raw_temp = int.from_bytes(status[TEMP_OUT_H - INT_STATUS:], 'big', signed=True)
+        temperature = temperature_from_raw(raw_temp)
+        if status[0] & FIFO_OFLOW_INT:
+            # Bytes were dropped mid-frame, so what is left is misaligned
+            self.overflows += 1
+            self.reset_fifo()
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 6)), temperature
+
+        count = int.from_bytes(self.registers.read(FIFO_COUNTH, 2), 'big')
+        self.max_fill = max(self.max_fill, count)
+        n = count // FRAME_BYTES
+        if n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 6)), temperature
+        size = n * FRAME_BYTES
+        if self.max_burst is None or size <= self.max_burst:
+            data = self.registers.read(FIFO_R_W, size)
+        else:
+            chunk = self.max_burst - self.max_burst % FRAME_BYTES
+            data = b''.join(self.registers.read(FIFO_R_W, min(chunk, size - i))
+                            for i in range(0, size, chunk))
+        values = decode_frames(data)
+        now_ns = int(self.clock() * 1e9)
+        self.blocks += 1
+        return self._timestamps(n, now_ns), values, temperature
+
+    def _timestamps(self, n, now_ns):
+        # Frames are evenly spaced at the sample rate; the newest was taken
+        # at most one period before the read
+        period_ns = 1e9 / self.sample_rate
+        if self._anchor is not None:
+            first = self._anchor + self.frames_since_anchor * period_ns
+            # Re-anchor if the chip's clock and the host's disagree by more
+            # than a few periods (oscillator drift, a missed overflow)
+            if abs(first + (n - 1) * period_ns - now_ns) > 5 * period_ns + 0.02e9:
+                self.resyncs += 1
+                self._anchor = None
+        if self._anchor is None:
+            self._anchor = now_ns - (n - 1) * period_ns
+            self.frames_since_anchor = 0
+        start = self._anchor + self.frames_since_anchor * period_ns
+        self.frames_since_anchor += n
+        self.frames += n
+        return (start + np.arange(n) * period_ns).astype(np.int64)
+
+
+class MPU6050FIFOSource:
+    """Readings from MPU6050FIFO at sample_rate, as a source for main.py.
+
+    Polls the FIFO every poll_interval seconds on a DeadlineScheduler.
+    blocks() yields each poll's frames as arrays, for SensorBuffer.add_block;
+    iterating yields each frame as a (timestamp, sensor_data) reading.
+    """
+
+    live = True
+
+    def __init__(self, sample_rate=500.0, poll_interval=None, registers=None, address=0x68,
+                 read_timer=None, max_burst=None):
+        from sensor_source import DeadlineScheduler
+
+        if registers is None:
+            registers = I2CRegisters(address=address)
+        self.registers = registers
+        self.fifo = MPU6050FIFO(registers, sample_rate, max_burst=max_burst)
+        self.sample_rate = self.fifo.sample_rate
+        if poll_interval is None:
+            # Read when the FIFO is at most about half full
+            poll_interval = min(0.05, 0.5 * (FIFO_SIZE // FRAME_BYTES) / self.sample_rate)
+        self.interval = poll_interval
+        self.scheduler = DeadlineScheduler(poll_interval)
+        # Optional metrics.Histogram observing each burst read
+        self.read_timer = read_timer
+
+    def blocks(self):
+        """Yields (timestamps_ns, values, temperature) for each poll with frames."""
+        while True:
+            self.scheduler.wait()
+            start = time.perf_counter()
+            block = self.fifo.read_block()
+            if self.read_timer:
+                self.read_timer.observe(time.perf_counter() - start)
+            if len(block[0]):
+                yield block
+
+    def __iter__(self):
+        for block in self.blocks():
+            yield from frame_readings(*block)
+
+
+def frame_readings(timestamps_ns, values, temperature):
+    """Yields each frame of a block as a (timestamp, sensor_data) reading.
+
+    Consumers that take whole blocks (SensorBuffer.add_block) skip this.
+    """
+    # Local time, like datetime.now() in MPU6050Source
+    first = datetime.fromtimestamp(int(timestamps_ns[0]) // 1000 / 1e6)
+    offsets_us = (timestamps_ns - timestamps_ns[0]) // 1000
+    for offset_us, row in zip(offsets_us.tolist(), values.tolist()):
+        accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z = row
+        yield first + timedelta(microseconds=offset_us), {
+            'accel_x': accel_x, 'accel_y': accel_y, 'accel_z': accel_z,
+            'gyro_x': gyro_x, 'gyro_y': gyro_y, 'gyro_z': gyro_z,
+            'temp': temperature
+        }
+
+
+def frame_times_ns(timestamps_ns):
+    """The timestamps frame_readings yields, as ns of those naive local datetimes."""
+    first = datetime.fromtimestamp(int(timestamps_ns[0]) // 1000 / 1e6)
+    first_ns = (first - datetime(1970, 1, 1)) // timedelta(microseconds=1) * 1000
+    return first_ns + (timestamps_ns - timestamps_ns[0]) // 1000 * 1000
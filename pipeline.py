@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Consumer stages for main.py.
+
+Acquisition only reads the sensor and hands each reading to every Stage.
+A Stage is a thread fed through its own bounded queue, so a slow LCD, disk
+or SMS call delays only that stage and never the sample clock.
+
+When a stage's queue is full, a live run drops the stage's oldest item and
+counts it, because waiting would stall acquisition. A replay uses blocking
+puts instead (backpressure), so every reading is processed and a run is
+reproducible.
+"""
+
+import queue
+import threading
+import time
+
+from logutil import get_logger
+
+logger = get_logger(__name__)
+
+# Queued after the last item to tell a stage to finish
+_STOP = object()
+
+
+class Stage:
+    """Runs handler(item) on a thread for every item put into it."""
+
+    def __init__(self, name, handler, maxsize=100, drop_oldest=True, timer=None):
+        self.name = name
+        self.handler = handler
+        # Optional metrics.Histogram observing each handler call
+        self.timer = timer
+        self.drop_oldest = drop_oldest
+        self.queue = queue.Queue(maxsize)
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        if not self.drop_oldest:
+            self.queue.put(item)
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def close(self, timeout=10.0):
+        """Process what is queued, then stop; gives up after timeout seconds."""
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            print(f"{self.name} stage did not drain in {timeout} s")
+            return
+        self._thread.join(timeout)
+
+    def summary(self):
+        return (f"{self.name:<8} processed {self.processed}, dropped {self.dropped}, "
+                f"errors {self.errors}, max queue {self.max_depth}/{self.queue.maxsize}")
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            try:
+                if self.timer:
+                    start = time.perf_counter()
+                    self.handler(item)
+                    self.timer.observe(time.perf_counter() - start)
+                else:
+                    self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                # One bad item must not stop the stage
+                self.errors += 1
+                logger.error("Error in %s stage: %s", self.name, e)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python raw_store.py convert <sensor_data.csv> [output.wtr] [chunk_rows]
+    python raw_store.py info <store.wtr>
+
+Compact append-only binary storage for raw sensor streams.
+
+A store file is an 8-byte file header followed by chunks. Each chunk holds up
+to chunk_rows readings in columnar form:
+
+    chunk header (32 bytes): b'CHNK', n_rows (uint32), t_min (int64), t_max (int64), reserved
+    timestamps:  n_rows x int64   (nanoseconds since the epoch)
+    columns:     7 x n_rows x float32  (accel_x .. gyro_z, temperature)
+    padding to a multiple of 8 bytes
+
+That is 36 bytes per reading instead of about 150 as CSV text. The chunk
+headers form the time index: RawStoreReader memory-maps the file, walks the
+headers once, and serves time-range slices as views into the mapping.
+A chunk cut short by a crash is ignored.
+"""
+
+import os
+import struct
+import sys
+
+import numpy as np
+
+from features import SENSOR_NAMES
+
+RAW_STORE_EXT = '.wtr'
+
+FILE_MAGIC = b'WTRAW\x00\x00\x01'
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sIqq8x')
+
+# Stored float columns, in order; temperature is stored as 'temperature' as in the CSVs
+COLUMNS = SENSOR_NAMES + ['temperature']
+
+DEFAULT_CHUNK_ROWS = 4096
+
+
+def _chunk_layout(n_rows):
+    # Byte offsets of the timestamp and float columns inside a chunk, and the
+    # padded chunk size
+    ts_offset = CHUNK_HEADER.size
+    col_offset = ts_offset + 8 * n_rows
+    end = col_offset + 4 * n_rows * len(COLUMNS)
+    return ts_offset, col_offset, end + (-end % 8)
+
+
+class RawStoreWriter:
+    """Appends readings to a store file, one chunk per chunk_rows readings."""
+
+    def __init__(self, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self._timestamps = []
+        self._rows = []
+
+        exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        if exists:
+            with open(path, 'rb') as f:
+                if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                    raise ValueError(f"{path} is not a raw sensor store")
+            # Drop a partial chunk left by a crash so new chunks stay readable
+            valid_end = RawStoreReader(path).valid_bytes
+            if valid_end < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_end)
+        self._file = open(path, 'ab')
+        if not exists:
+            self._file.write(FILE_MAGIC)
+            self._file.flush()
+
+    def append(self, timestamp_ns, values):
+        """Add one reading: int64 epoch-ns timestamp and 7 values in COLUMNS order."""
+        self._timestamps.append(timestamp_ns)
+        self._rows.append(values)
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def append_many(self, timestamps_ns, values):
+        """Add readings from an int64 array and an (n, 7) array, in chunks."""
+        self.flush()
+        timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float32)
+        for start in range(0, len(timestamps_ns), self.chunk_rows):
+            stop = start + self.chunk_rows
+            self._write_chunk(timestamps_ns[start:stop], values[start:stop])
+
+    def flush(self):
+        if not self._rows:
+            return
+        timestamps = np.array(self._timestamps, dtype=np.int64)
+        values = np.array(self._rows, dtype=np.float32)
+        self._timestamps = []
+        self._rows = []
+        self._write_chunk(timestamps, values)
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_chunk(self, timestamps, values):
+        n_rows = len(timestamps)
+        if n_rows == 0:
+            return
+        _, _, size = _chunk_layout(n_rows)
+        buf = bytearray(size)
+        CHUNK_HEADER.pack_into(buf, 0, CHUNK_MAGIC, n_rows, int(timestamps.min()), int(timestamps.max()))
+        ts_offset, col_offset, _ = _chunk_layout(n_rows)
+        buf[ts_offset:col_offset] = timestamps.astype('<i8').tobytes()
+        # Column-major: all of accel_x, then all of accel_y, ...
+        columns = np.ascontiguousarray(values.astype('<f4').T)
+        buf[col_offset:col_offset + columns.nbytes] = columns.tobytes()
+        self._file.write(buf)
+        self._file.flush()
+
+
+class RawStoreReader:
+    """Memory-mapped reader with a per-chunk time index."""
+
+    def __init__(self, path):
+        self.path = path
+        size = os.path.getsize(path)
+        if size < len(FILE_MAGIC):
+            raise ValueError(f"{path} is not a raw sensor store")
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._mm[:len(FILE_MAGIC)]) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a raw sensor store")
+
+        # Time index: offset, row count and time range of every complete chunk
+        offsets, counts, t_min, t_max = [], [], [], []
+        offset = len(FILE_MAGIC)
+        while offset + CHUNK_HEADER.size <= size:
+            magic, n_rows, lo, hi = CHUNK_HEADER.unpack_from(self._mm, offset)
+            _, _, chunk_size = _chunk_layout(n_rows)
+            if magic != CHUNK_MAGIC or offset + chunk_size > size:
+                break
+            offsets.append(offset)
+            counts.append(n_rows)
+            t_min.append(lo)
+            t_max.append(hi)
+            offset += chunk_size
+        self.valid_bytes = offset
+        self.chunk_offsets = np.array(offsets, dtype=np.int64)
+        self.chunk_rows = np.array(counts, dtype=np.int64)
+        self.chunk_t_min = np.array(t_min, dtype=np.int64)
+        self.chunk_t_max = np.array(t_max, dtype=np.int64)
+
+    def __len__(self):
+        return int(self.chunk_rows.sum())
+
+    def chunk(self, i):
+        """(timestamps, values) views for chunk i; values has shape (7, n_rows)."""
+        offset = int(self.chunk_offsets[i])
+        n_rows = int(self.chunk_rows[i])
+        ts_offset, col_offset, _ = _chunk_layout(n_rows)
+        timestamps = np.frombuffer(self._mm, dtype='<i8', count=n_rows, offset=offset + ts_offset)
+        values = np.frombuffer(self._mm, dtype='<f4', count=n_rows * len(COLUMNS),
+                               offset=offset + col_offset).reshape(len(COLUMNS), n_rows)
+        return timestamps, values
+
+    def iter_range(self, start_ns=None, end_ns=None):
+        """Yield zero-copy (timestamps, values) views of readings in [start_ns, end_ns).
+
+        Chunks are selected with the time index. Within a chunk, rows are
+        located by binary search when its timestamps are sorted (the normal
+        case) and by a mask otherwise.
+        """
+        lo = np.iinfo(np.int64).min if start_ns is None else start_ns
+        hi = np.iinfo(np.int64).max if end_ns is None else end_ns
+        selected = np.flatnonzero((self.chunk_t_max >= lo) & (self.chunk_t_min < hi))
+        for i in selected:
+            timestamps, values = self.chunk(i)
+            if self.chunk_t_min[i] >= lo and self.chunk_t_max[i] < hi:
+                yield timestamps, values
+            elif np.all(timestamps[1:] >= timestamps[:-1]):
+                a = np.searchsorted(timestamps, lo, side='left')
+                b = np.searchsorted(timestamps, hi, side='left')
+                yield timestamps[a:b], values[:, a:b]
+            else:
+                mask = (timestamps >= lo) & (timestamps < hi)
+                yield timestamps[mask], values[:, mask]
+
+    def read_range(self, start_ns=None, end_ns=None):
+        """(timestamps, values) for [start_ns, end_ns); a view if one chunk covers it."""
+        parts = list(self.iter_range(start_ns, end_ns))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.zeros(0, dtype=np.int64), np.zeros((len(COLUMNS), 0), dtype=np.float32)
+        return (np.concatenate([p[0] for p in parts]),
+                np.concatenate([p[1] for p in parts], axis=1))
+
+    def to_dataframe(self, start=None, end=None):
+        """DataFrame in the layout of extract_features.load_sensor_data.
+
+        start and end may be epoch-ns integers or anything pandas.Timestamp
+        accepts.
+        """
+        import pandas as pd
+
+        def to_ns(value):
+            if value is None or isinstance(value, (int, np.integer)):
+                return value
+            return pd.Timestamp(value).value
+
+        timestamps, values = self.read_range(to_ns(start), to_ns(end))
+        df = pd.DataFrame({'timestamp': timestamps.astype('datetime64[ns]')})
+        for name, column in zip(COLUMNS, values):
+            df[name] = column.astype(np.float64)
+        return df
+
+
+def convert_csv(csv_path, store_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Convert a raw sensor CSV into a store file; returns the number of readings."""
+    import pandas as pd
+    from extract_features import load_sensor_data
+
+    df = load_sensor_data(csv_path)
+    timestamps = pd.to_datetime(df['timestamp']).values.astype('datetime64[ns]').astype(np.int64)
+    with RawStoreWriter(store_path, chunk_rows) as writer:
+        writer.append_many(timestamps, df[COLUMNS].to_numpy())
+    return len(df)
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('convert', 'info'):
+        print(__doc__)
+        return 1
+
+    if sys.argv[1] == 'convert':
+        csv_path = sys.argv[2]
+        store_path = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(csv_path)[0] + RAW_STORE_EXT
+        chunk_rows = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_CHUNK_ROWS
+        if os.path.exists(store_path):
+            print(f"{store_path} already exists")
+            return 1
+        n_rows = convert_csv(csv_path, store_path, chunk_rows)
+        csv_size = os.path.getsize(csv_path)
+        store_size = os.path.getsize(store_path)
+        print(f"Wrote {n_rows} readings to {store_path}: {store_size} bytes "
+              f"({csv_size / max(store_size, 1):.1f}x smaller than the CSV)")
+        return 0
+
+    reader = RawStoreReader(sys.argv[2])
+    print(f"{sys.argv[2]}: {len(reader)} readings in {len(reader.chunk_offsets)} chunks")
+    if len(reader):
+        first = np.datetime64(int(reader.chunk_t_min.min()), 'ns')
+        last = np.datetime64(int(reader.chunk_t_max.max()), 'ns')
+        print(f"Time range: {first} to {last}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python resample.py <input_file> <rate_hz> [max_gap_seconds]
+
+Resampling of the six sensor axes onto a fixed-rate grid.
+
+The recorded timestamps are irregular (about 250-260 ms apart, drifting), so
+a window of window_size seconds holds a varying number of readings. Resampled,
+every window of window_size seconds holds exactly round(window_size * rate)
+grid samples, so windows have a fixed shape and spectral features see a
+uniform grid.
+
+The grid starts at the first reading and has one sample every 1 / rate
+seconds, linearly interpolated between the readings on either side. Readings
+whose timestamp does not advance are dropped. Readings more than max_gap
+seconds apart are a gap: nothing is interpolated across it, and the grid
+restarts at the first reading after it, so no window spans a gap.
+
+Resampler does this one reading at a time for SensorBuffer; resample() does a
+whole recording at once for extract_features.py. Both give the same grid
+samples, to the last bit. The command line reports the reading intervals and
+gaps of a recording and the grid it resamples to.
+"""
+
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+DEFAULT_MAX_GAP = 1.0
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_ns(timestamp):
+    """Nanoseconds since the epoch of a naive datetime or pandas Timestamp."""
+    value = getattr(timestamp, 'value', None)
+    if value is not None:
+        return int(value)
+    return (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+class Resampler:
+    """Streaming resampler: readings in, fixed-rate grid samples out."""
+
+    def __init__(self, rate, max_gap=DEFAULT_MAX_GAP, n_axes=6):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.max_gap = max_gap
+        # Most grid samples one reading can produce: the interval is at most
+        # max_gap, so at most max_gap * rate + 1 grid times fall inside it
+        self._out = np.zeros((int(max_gap * rate) + 2, n_axes))
+        self._last = np.zeros(n_axes)
+        self._t0_ns = None
+        self._last_t = None
+        self._next = 0
+        self.readings = 0
+        self.dropped = 0
+        self.gaps = 0
+        self.samples = 0
+
+    def add(self, timestamp_ns, sample):
+        """Add one reading; returns (grid_samples, reset).
+
+        grid_samples is an (n, n_axes) view, valid until the next call, of
+        the grid samples this reading completes (often one, sometimes none).
+        reset is True when the reading follows a gap and starts a new grid.
+        """
+        self.readings += 1
+        if self._t0_ns is None:
+            return self._restart(timestamp_ns, sample), False
+        t = (timestamp_ns - self._t0_ns) / 1e9
+        if t <= self._last_t:
+            self.dropped += 1
+            return self._out[:0], False
+        if t - self._last_t > self.max_gap:
+            self.gaps += 1
+            return self._restart(timestamp_ns, sample), True
+
+        # Grid times in (last_t, t], interpolated between the two readings
+        out = self._out
+        n = 0
+        start = self._last_t
+        step = t - start
+        while True:
+            g = self._next / self.rate
+            if g > t:
+                break
+            f = (g - start) / step
+            np.subtract(sample, self._last, out=out[n])
+            out[n] *= f
+            out[n] += self._last
+            self._next += 1
+            n += 1
+        self._last[:] = sample
+        self._last_t = t
+        self.samples += n
+        return out[:n], False
+
+    def summary(self):
+        return (f"resampled {self.readings} readings to {self.samples} samples at {self.rate:g} Hz, "
+                f"{self.gaps} gaps, {self.dropped} out of order")
+
+    def _restart(self, timestamp_ns, sample):
+        self._t0_ns = timestamp_ns
+        self._last_t = 0.0
+        self._last[:] = sample
+        self._out[0] = sample
+        self._next = 1
+        self.samples += 1
+        return self._out[:1]
+
+
+def resample(timestamps_ns, values, rate, max_gap=DEFAULT_MAX_GAP):
+    """Resample a whole recording; returns (grid_values, segment_starts).
+
+    timestamps_ns is an int64 array of reading times and values the matching
+    (n_readings, n_axes) array. grid_values holds the grid samples of every
+    gap-free segment one after the other, and segment_starts the row where
+    each segment begins.
+    """
+    timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(timestamps_ns) == 0:
+        return np.zeros((0,) + values.shape[1:]), np.zeros(0, dtype=np.intp)
+
+    # Keep a reading only if it is later than every reading before it, as
+    # the streaming path drops readings that do not advance
+    keep = np.ones(len(timestamps_ns), dtype=bool)
+    keep[1:] = timestamps_ns[1:] > np.maximum.accumulate(timestamps_ns)[:-1]
+    timestamps_ns = timestamps_ns[keep]
+    values = values[keep]
+
+    grids = []
+    segment_starts = []
+    n_rows = 0
+    lo = 0
+    while lo < len(timestamps_ns):
+        # Offsets from the segment's first reading, and the gap test on
+        # them, are computed exactly as in the streaming path
+        t = (timestamps_ns[lo:] - timestamps_ns[lo]) / 1e9
+        split = np.flatnonzero(np.diff(t) > max_gap)
+        hi = lo + split[0] + 1 if len(split) else len(timestamps_ns)
+        t = t[:hi - lo]
+        v = values[lo:hi]
+        g = np.arange(int(t[-1] * rate) + 2) / rate
+        g = g[g <= t[-1]]
+        # b: first reading at or after each grid time; a = b - 1
+        b = np.searchsorted(t, g, side='left')
+        grid = np.empty((len(g), v.shape[1]))
+        grid[0] = v[0]
+        b = b[1:]
+        f = (g[1:] - t[b - 1]) / (t[b] - t[b - 1])
+        grid[1:] = (v[b] - v[b - 1]) * f[:, None] + v[b - 1]
+        grids.append(grid)
+        segment_starts.append(n_rows)
+        n_rows += len(grid)
+        lo = hi
+    return np.concatenate(grids), np.array(segment_starts, dtype=np.intp)
+
+
+def grid_window_bounds(segment_starts, n_rows, window_samples, step_samples=None):
+    """Return (starts, ends) of the fixed-count windows inside each segment."""
+    if step_samples is None:
+        step_samples = window_samples
+    ends = np.append(segment_starts[1:], n_rows)
+    starts = [np.arange(lo, hi - window_samples + 1, step_samples, dtype=np.intp)
+              for lo, hi in zip(segment_starts, ends)]
+    starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.intp)
+    return starts, starts + window_samples
+
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return 1
+    from extract_features import load_sensor_data
+    import pandas as pd
+    from features import SENSOR_NAMES
+
+    rate = float(sys.argv[2])
+    max_gap = float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_MAX_GAP
+    df = load_sensor_data(sys.argv[1])
+    timestamps = pd.to_datetime(df['timestamp']).values.astype('datetime64[ns]').astype(np.int64)
+    intervals = np.diff(timestamps) / 1e6
+    if len(intervals):
+        print(f"Reading interval: mean {intervals.mean():.1f} ms, min {intervals.min():.1f} ms, "
+              f"max {intervals.max():.1f} ms, std {intervals.std():.1f} ms")
+    grid, segment_starts = resample(timestamps, df[SENSOR_NAMES].to_numpy(), rate, max_gap)
+    print(f"{len(df)} readings -> {len(grid)} grid samples at {rate:g} Hz "
+          f"in {len(segment_starts)} gap-free segment(s) (max gap {max_gap:g} s)")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Usage:
+    python search_ocsvm.py <normal_raw.csv> <anomaly_raw.csv> [anomaly_raw.csv ...]
+        [--nu 0.05 0.1 ...] [--gamma scale 0.05 ...] [--window-size 3.3 6.6 ...]
+        [--feature-set basic|full|spectral] [--holdout 0.3] [--workers N]
+        [--model models/model_svm.pkl] [--scaler models/scaler.pkl] [--results results.csv]
+        [--cache-dir DIR | --no-cache]
+
+Grid search over nu, gamma and window size for the One-Class SVM.
+
+For every window size the raw CSVs are turned into features with the batch
+engine from extract_features.py, through the feature cache shared with
+extract_features.py (see feature_cache.py), so repeated searches on the same
+recordings skip extraction. The first (1 - holdout) of the normal windows
+(in time order) are used for training, the rest and all anomaly windows for
+scoring. Pairwise squared distances are computed once per window size; every
+gamma turns them into a kernel matrix once, and all nu values reuse it
+through OneClassSVM(kernel='precomputed'). Work is split over a process pool
+by window size: one worker scores every gamma of a window size.
+
+Candidates are ranked by balanced accuracy at threshold 0 (mean of normal
+and anomaly recall), then by ROC AUC. The winner is refitted on all normal
+windows and saved in the usual {'model', 'feature_names', 'feature_spec'}
+pickle format.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import euclidean_distances
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import OneClassSVM
+
+import extract_features
+from feature_cache import CACHE_DIR, FeatureCache
+import features as feature_engine
+from evaluate_ocsvm import threshold_sweep, summarize_sweep
+from train_ocsvm import save_model
+
+DEFAULT_NUS = [0.01, 0.05, 0.1, 0.2]
+DEFAULT_GAMMAS = ['scale', 0.01, 0.03, 0.1, 0.3]
+# Multiples of the 6.6 s turbine rotation period
+DEFAULT_WINDOW_SIZES = [3.3, 6.6, 13.2]
+
+# Per-process cache: window size -> prepared data and squared distances
+_distance_cache = {}
+
+
+def window_features(raw_file, window_size, feature_set, cache_dir=CACHE_DIR):
+    cache = FeatureCache(cache_dir) if cache_dir else None
+    with contextlib.redirect_stdout(io.StringIO()):
+        return extract_features.cached_features(raw_file, window_size, feature_set, cache=cache)
+
+
+def prepare_window(normal_file, anomaly_files, window_size, feature_set, holdout, cache_dir=CACHE_DIR):
+    """Features, scaler and squared distances for one window size."""
+    normal = window_features(normal_file, window_size, feature_set, cache_dir)
+    anomalies = np.concatenate([window_features(f, window_size, feature_set, cache_dir)
+                                for f in anomaly_files])
+    n_train = int(round(len(normal) * (1 - holdout)))
+    if n_train < 2 or n_train == len(normal):
+        raise ValueError(f"Window size {window_size}: not enough normal windows to split ({len(normal)})")
+
+    scaler = StandardScaler().fit(normal[:n_train])
+    train = scaler.transform(normal[:n_train])
+    test = scaler.transform(np.concatenate([normal[n_train:], anomalies]))
+    return {
+        'train_sq_dist': euclidean_distances(train, squared=True),
+        'test_sq_dist': euclidean_distances(test, train, squared=True),
+        'n_test_normal': len(normal) - n_train,
+        'n_features': train.shape[1],
+        'train_var': train.var(),
+    }
+
+
+def resolve_gamma(gamma, n_features, variance):
+    # Same rule as OneClassSVM(gamma='scale')
+    if gamma == 'scale':
+        return 1.0 / (n_features * variance)
+    return float(gamma)
+
+
+def evaluate_group(task):
+    """Score every nu for one (window size, gamma) pair."""
+    normal_file, anomaly_files, window_size, gamma, nus, feature_set, holdout, cache_dir = task
+    key = (normal_file, tuple(anomaly_files), window_size, feature_set, holdout)
+    if key not in _distance_cache:
+        _distance_cache.clear()
+        _distance_cache[key] = prepare_window(normal_file, anomaly_files, window_size, feature_set,
+                                              holdout, cache_dir)
+    data = _distance_cache[key]
+
+    gamma_value = resolve_gamma(gamma, data['n_features'], data['train_var'])
+    # One kernel matrix per gamma, shared by every nu
+    train_kernel = np.exp(-gamma_value * data['train_sq_dist'])
+    test_kernel = np.exp(-gamma_value * data['test_sq_dist'])
+
+    rows = []
+    n_normal = data['n_test_normal']
+    for nu in nus:
+        model = OneClassSVM(nu=nu, kernel='precomputed').fit(train_kernel)
+        scores = model.decision_function(test_kernel)
+        normal_scores, anomaly_scores = scores[:n_normal], scores[n_normal:]
+        roc_auc, _, _ = summarize_sweep(threshold_sweep(normal_scores, anomaly_scores))
+        normal_recall = float(np.mean(normal_scores >= 0))
+        anomaly_recall = float(np.mean(anomaly_scores < 0))
+        rows.append({
+            'window_size': window_size,
+            'gamma': gamma,
+            'gamma_value': gamma_value,
+            'nu': nu,
+            'n_support': len(model.support_),
+            'normal_recall': normal_recall,
+            'anomaly_recall': anomaly_recall,
+            'balanced_accuracy': (normal_recall + anomaly_recall) / 2,
+            'roc_auc': roc_auc,
+        })
+    return rows
+
+
+def grid_search(normal_file, anomaly_files, nus=DEFAULT_NUS, gammas=DEFAULT_GAMMAS,
+                window_sizes=DEFAULT_WINDOW_SIZES, feature_set='basic', holdout=0.3, workers=None,
+                cache_dir=CACHE_DIR):
+    # Tasks are ordered by window size, and each chunk handed to a worker is
+    # every gamma of one window size, so its distances are computed once
+    tasks = [(normal_file, list(anomaly_files), w, g, list(nus), feature_set, holdout, cache_dir)
+             for w, g in itertools.product(window_sizes, gammas)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = [row for rows in pool.map(evaluate_group, tasks, chunksize=len(gammas))
+                   for row in rows]
+    table = pd.DataFrame(results)
+    return table.sort_values(['balanced_accuracy', 'roc_auc'], ascending=False).reset_index(drop=True)
+
+
+def fit_winner(normal_file, best, feature_set, model_path, scaler_path, cache_dir=CACHE_DIR):
+    normal = window_features(normal_file, best['window_size'], feature_set, cache_dir)
+    feature_names = feature_engine.get_feature_names(feature_set)
+    scaler = StandardScaler().fit(pd.DataFrame(normal, columns=feature_names))
+    scaled = scaler.transform(pd.DataFrame(normal, columns=feature_names))
+    gamma = best['gamma'] if best['gamma'] == 'scale' else float(best['gamma'])
+    model = OneClassSVM(nu=float(best['nu']), kernel='rbf', gamma=gamma).fit(scaled)
+    save_model(model, scaler, feature_names, model_path, scaler_path, feature_set,
+               float(best['window_size']))
+
+
+def parse_gamma(value):
+    return value if value == 'scale' else float(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grid search nu, gamma and window size for the One-Class SVM")
+    parser.add_argument('normal_file', help="raw sensor CSV of normal operation")
+    parser.add_argument('anomaly_files', nargs='+', help="raw sensor CSVs with anomalies")
+    parser.add_argument('--nu', type=float, nargs='+', default=DEFAULT_NUS)
+    parser.add_argument('--gamma', type=parse_gamma, nargs='+', default=DEFAULT_GAMMAS)
+    parser.add_argument('--window-size', type=float, nargs='+', default=DEFAULT_WINDOW_SIZES)
+    parser.add_argument('--feature-set', default='basic', choices=sorted(feature_engine.FEATURE_SETS))
+    parser.add_argument('--holdout', type=float, default=0.3,
+                        help="fraction of normal windows held out for scoring")
+    parser.add_argument('--workers', type=int, default=None, help="process pool size")
+    parser.add_argument('--model', default=None, help="save the winning model here")
+    parser.add_argument('--scaler', default=None, help="save the winning scaler here")
+    parser.add_argument('--results', default=None, help="save the ranked table as CSV")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="feature cache directory")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or write the feature cache")
+    args = parser.parse_args(argv)
+    if (args.model is None) != (args.scaler is None):
+        parser.error("--model and --scaler must be given together")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache_dir = None if args.no_cache else args.cache_dir
+    n_candidates = len(args.nu) * len(args.gamma) * len(args.window_size)
+    print(f"Searching {n_candidates} candidates "
+          f"({len(args.window_size)} window sizes x {len(args.gamma)} gammas x {len(args.nu)} nus)")
+
+    table = grid_search(args.normal_file, args.anomaly_files, args.nu, args.gamma,
+                        args.window_size, args.feature_set, args.holdout, args.workers, cache_dir)
+    print(table.to_string(float_format=lambda v: f"{v:.4g}"))
+
+    if args.results:
+        table.to_csv(args.results, index=False)
+        print(f"\nResults saved to: {args.results}")
+
+    best = table.iloc[0]
+    print(f"\nBest: window_size={best['window_size']} gamma={best['gamma']} nu={best['nu']} "
+          f"(balanced accuracy {best['balanced_accuracy']:.3f}, ROC AUC {best['roc_auc']:.3f})")
+
+    if args.model:
+        fit_winner(args.normal_file, best, args.feature_set, args.model, args.scaler, cache_dir)
+        print(f"The model records window_size={best['window_size']}; main.py and fleet.py use it")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
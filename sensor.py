@@ -2,48 +2,252 @@ from datetime import datetime
 import numpy as np
 import csv
 import os
+import threading
+
+import features as feature_engine
+import resample
+from features import SENSOR_NAMES
+from logutil import get_logger
+
+# Per-sample and per-window messages are DEBUG; see logutil
+logger = get_logger(__name__)
+
+
+CSV_HEADER = ['timestamp',
+              'accel_x', 'accel_y', 'accel_z',
+              'gyro_x', 'gyro_y', 'gyro_z',
+              'temperature']
+
+# Longest wait between attempts while SensorDataLogger cannot write
+MAX_RETRY_INTERVAL = 60.0
+
+
+def _csv_row(sensor_data, timestamp):
+    return [timestamp,
+            sensor_data['accel_x'], sensor_data['accel_y'], sensor_data['accel_z'],
+            sensor_data['gyro_x'], sensor_data['gyro_y'], sensor_data['gyro_z'],
+            sensor_data['temp']]
 
 
 def log_sensor_data_to_csv(sensor_data, timestamp=None, filename='data/sensor_data.csv'):
     if timestamp is None:
         timestamp = datetime.now().isoformat()
     
-    data_row = [timestamp, 
-                sensor_data['accel_x'], sensor_data['accel_y'], sensor_data['accel_z'],
-                sensor_data['gyro_x'], sensor_data['gyro_y'], sensor_data['gyro_z'],
-                sensor_data['temp']]
+    data_row = _csv_row(sensor_data, timestamp)
     
     file_exists = os.path.isfile(filename)
     
     with open(filename, 'a', newline='') as csvfile:
         csv_writer = csv.writer(csvfile)
         if not file_exists:
-            csv_writer.writerow(['timestamp', 
-                               'accel_x', 'accel_y', 'accel_z',
-                               'gyro_x', 'gyro_y', 'gyro_z',
-                               'temperature'])
+            csv_writer.writerow(CSV_HEADER)
         csv_writer.writerow(data_row)
     return True
 
 
-def get_feature_names():
-    """Return the list of feature names in the correct order."""
-    feature_names = []
-    sensor_names = ['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z']
-    
-    for sensor_name in sensor_names:
-        feature_names.extend([
-            f'{sensor_name}_mean',
-            f'{sensor_name}_std',
-        ])
-    
-    return feature_names
+class SensorDataLogger:
+    """Long-lived raw data logger that writes rows in batches.
+
+    log() only appends the row to an in-memory list. A background thread
+    writes the pending rows when batch_size rows are waiting, every
+    flush_interval seconds, and on close(). The output has the same columns
+    (and header row) as log_sensor_data_to_csv.
+
+    Files rotate by day (rotate_daily: data/sensor_data_2025-03-31.csv, using
+    the date of each row's timestamp) and/or by size (max_bytes: continues in
+    data/sensor_data.1.csv, .2.csv, ...).
+    """
+
+    def __init__(self, filename='data/sensor_data.csv', batch_size=50, flush_interval=5.0,
+                 max_bytes=None, rotate_daily=False, max_pending=100000):
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.max_pending = max_pending
+        self.rows_written = 0
+        self.rows_dropped = 0
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._file = None
+        self._writer = None
+        self._path = None
+        self._day = None
+        self._part = 0
+
+        self._thread = threading.Thread(target=self._run, name='sensor-data-logger', daemon=True)
+        self._thread.start()
+
+    def log(self, sensor_data, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.now().isoformat()
+        elif not isinstance(timestamp, str):
+            timestamp = timestamp.isoformat()
+        row = _csv_row(sensor_data, timestamp)
+
+        with self._condition:
+            if self._closed:
+                raise ValueError("Logger is closed")
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def flush(self):
+        """Write all pending rows now, from the calling thread."""
+        with self._condition:
+            rows, self._pending = self._pending, []
+        self._write(rows)
+
+    def close(self):
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        retry_delay = None
+        while True:
+            with self._condition:
+                if retry_delay is not None:
+                    # After a failed write, back off however many rows are
+                    # waiting; only close() cuts the wait short
+                    self._condition.wait_for(lambda: self._closed, retry_delay)
+                elif not self._closed and len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                rows, self._pending = self._pending, []
+                closed = self._closed
+            if self._write(rows):
+                retry_delay = None
+            else:
+                retry_delay = min(2 * retry_delay if retry_delay else self.flush_interval,
+                                  MAX_RETRY_INTERVAL)
+            if closed:
+                # Rows logged between the swap and close() were rejected, so
+                # nothing is left behind.
+                return
+
+    def _write(self, rows):
+        """Write rows; returns False if some could not be written."""
+        if not rows:
+            return True
+        written = 0
+        try:
+            with self._write_lock:
+                for row in rows:
+                    self._writer_for(row[0]).writerow(row)
+                    written += 1
+                self._file.flush()
+        except Exception as e:
+            logger.error("Error writing sensor data: %s", e)
+            # Keep the unwritten rows for the next flush, within max_pending
+            with self._condition:
+                self._pending = rows[written:] + self._pending
+                overflow = len(self._pending) - self.max_pending
+                if overflow > 0:
+                    del self._pending[:overflow]
+                    self.rows_dropped += overflow
+            return False
+        finally:
+            self.rows_written += written
+        return True
+
+    def _writer_for(self, timestamp):
+        day = timestamp[:10] if self.rotate_daily else None
+        if self._file is not None and day == self._day and not self._over_size():
+            return self._writer
+
+        if day != self._day:
+            self._day = day
+            self._part = 0
+        elif self._file is not None:
+            self._part += 1
+        self._open(self._path_for(day, self._part))
+        # A restart may find today's file already full
+        while self._over_size():
+            self._part += 1
+            self._open(self._path_for(day, self._part))
+        return self._writer
+
+    def _over_size(self):
+        return self.max_bytes is not None and self._file.tell() >= self.max_bytes
+
+    def _path_for(self, day, part):
+        stem, ext = os.path.splitext(self.filename)
+        if day is not None:
+            stem = f"{stem}_{day}"
+        if part:
+            stem = f"{stem}.{part}"
+        return stem + ext
+
+    def _open(self, path):
+        if self._file is not None:
+            self._file.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_exists = os.path.isfile(path) and os.path.getsize(path) > 0
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.writer(self._file)
+        self._path = path
+        if not file_exists:
+            self._writer.writerow(CSV_HEADER)
+
+
+def get_feature_names(feature_set='basic'):
+    """Return the list of feature names in the correct order.
+
+    feature_set is a name from features.FEATURE_SETS or a list of statistics.
+    """
+    return feature_engine.get_feature_names(feature_set)
 
 
 class SensorBuffer:
-    def __init__(self, window_size):
+    """Collects sensor readings and extracts features once per window.
+
+    By default windows are tumbling: the lists are emptied after every window.
+    Passing ``hop`` switches to ring-buffer mode, where readings are kept in one
+    preallocated ``(capacity, 6)`` array and a window of the last
+    ``window_size`` seconds is emitted every ``hop`` seconds, so windows
+    overlap. The running mean/std are updated with Welford add/remove steps as
+    readings enter and leave the window, so emitting a window is O(1) for the
+    'basic' feature set. Other feature sets are computed from the window with
+    the vectorized feature engine. If a window holds more than ``capacity``
+    readings the ring doubles in size, so no reading in the window is dropped.
+
+    With ``resample_rate``, readings are first interpolated onto a fixed-rate
+    grid (see resample.py) and windows are counted in grid samples instead of
+    wall-clock time: every window holds round(window_size * resample_rate)
+    samples, kept in a preallocated array of that shape, and one is emitted
+    every round(hop * resample_rate) samples. A gap longer than ``max_gap``
+    seconds discards the partial window.
+    """
+
+    def __init__(self, window_size, hop=None, capacity=512, feature_set='basic',
+                 resample_rate=None, max_gap=resample.DEFAULT_MAX_GAP):
         self.window_size = window_size
+        self.hop = hop
+        self.stats = feature_engine.resolve_stats(feature_set)
+        self._incremental = self.stats == feature_engine.FEATURE_SETS['basic']
+        self.resampler = None
         self.start_time = None
+        # Epoch-ns time of the first reading when fed by add_block
+        self._start_ns = None
         self.accel_x = []
         self.accel_y = []
         self.accel_z = []
@@ -53,12 +257,56 @@ class SensorBuffer:
         self.last_window = None
         self.last_features = None
 
+        if hop is not None:
+            if hop <= 0:
+                raise ValueError("hop must be positive")
+            if capacity < 1:
+                raise ValueError("capacity must be at least 1")
+            self.capacity = capacity
+            # Ring storage: one row per reading, columns in SENSOR_NAMES order.
+            # _times holds seconds since start_time for each row.
+            self._ring = np.zeros((capacity, 6))
+            self._times = np.zeros(capacity)
+            self._head = 0
+            self._count = 0
+            self._last_emit = None
+            # Running statistics of the readings currently in the window
+            self._mean = np.zeros(6)
+            self._m2 = np.zeros(6)
+            self._evictions = 0
+            # Scratch arrays so the per-reading path does not allocate
+            self._sample = np.zeros(6)
+            self._delta = np.zeros(6)
+            self._tmp = np.zeros(6)
+
+        if resample_rate is not None:
+            self.resampler = resample.Resampler(resample_rate, max_gap)
+            self.window_samples = max(1, int(round(window_size * resample_rate)))
+            self.hop_samples = (self.window_samples if hop is None
+                                else max(1, int(round(hop * resample_rate))))
+            # Fixed-shape ring of the latest grid samples, and the window
+            # copied out of it in time order
+            self._grid = np.zeros((self.window_samples, 6))
+            self._grid_window = np.zeros((self.window_samples, 6))
+            self._grid_count = 0
+            self._sample = np.zeros(6)
+            # Windows completed by a reading that also completed a later one
+            self.skipped_windows = 0
+
     def add_reading(self, sensor_data, timestamp=None):
         if timestamp is None:
             timestamp = datetime.now()
         
         if self.start_time is None:
             self.start_time = timestamp
+        elif self._start_ns is not None:
+            raise ValueError("Buffer is already fed by add_block")
+
+        if self.resampler is not None:
+            return self._add_reading_grid(sensor_data, timestamp)
+
+        if self.hop is not None:
+            return self._add_reading_ring(sensor_data, timestamp)
         
         # Add new reading to buffer
         self.accel_x.append(sensor_data['accel_x'])
@@ -68,13 +316,15 @@ class SensorBuffer:
         self.gyro_y.append(sensor_data['gyro_y'])
         self.gyro_z.append(sensor_data['gyro_z'])
         
-        print(f"Added reading. Buffer lengths: accel_x={len(self.accel_x)}, accel_y={len(self.accel_y)}, accel_z={len(self.accel_z)}, "
-              f"gyro_x={len(self.gyro_x)}, gyro_y={len(self.gyro_y)}, gyro_z={len(self.gyro_z)}")
+        logger.debug("Added reading. Buffer lengths: accel_x=%d, accel_y=%d, accel_z=%d, "
+                     "gyro_x=%d, gyro_y=%d, gyro_z=%d",
+                     len(self.accel_x), len(self.accel_y), len(self.accel_z),
+                     len(self.gyro_x), len(self.gyro_y), len(self.gyro_z))
         
         window_complete = (timestamp - self.start_time).total_seconds() >= self.window_size
         
         if window_complete:
-            print("Window duration elapsed, processing...")
+            logger.debug("Window duration elapsed, processing...")
             
             window, features = self._process_window()
             self.start_time = timestamp
@@ -94,19 +344,199 @@ class SensorBuffer:
         
         return False
 
+    def add_block(self, timestamps_ns, values):
+        """Add a block of readings, such as one MPU6050 FIFO read.
+
+        timestamps_ns holds epoch-ns reading times and values the matching
+        (n, 6) array in SENSOR_NAMES order; rows are added without building a
+        dict or datetime per reading. Needs hop or resample_rate, and a buffer
+        fed by add_block cannot also be fed by add_reading. Returns a list of
+        (row, features) for every window the block completes, where row is
+        the index of the reading that completed it.
+        """
+        if self.hop is None and self.resampler is None:
+            raise ValueError("add_block needs hop or resample_rate")
+        timestamps_ns = np.asarray(timestamps_ns, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape != (len(timestamps_ns), len(SENSOR_NAMES)):
+            raise ValueError(f"Expected values of shape ({len(timestamps_ns)}, {len(SENSOR_NAMES)}), "
+                             f"got {values.shape}")
+        if len(timestamps_ns) == 0:
+            return []
+        if self.start_time is None:
+            self._start_ns = int(timestamps_ns[0])
+            self.start_time = datetime.fromtimestamp(self._start_ns // 1000 / 1e6)
+        elif self._start_ns is None:
+            raise ValueError("Buffer is already fed by add_reading")
+
+        windows = []
+        if self.resampler is not None:
+            for row, (timestamp_ns, sample) in enumerate(zip(timestamps_ns.tolist(), values)):
+                features = self._add_sample_grid(sample, timestamp_ns)
+                if features is not False:
+                    windows.append((row, features))
+        else:
+            seconds = (timestamps_ns - self._start_ns) / 1e9
+            for row, (t, sample) in enumerate(zip(seconds.tolist(), values)):
+                features = self._add_sample_ring(sample, t)
+                if features is not False:
+                    windows.append((row, features))
+        return windows
+
+    def _add_reading_ring(self, sensor_data, timestamp):
+        sample = self._sample
+        for i, sensor_name in enumerate(SENSOR_NAMES):
+            sample[i] = sensor_data[sensor_name]
+        return self._add_sample_ring(sample, (timestamp - self.start_time).total_seconds())
+
+    def _add_sample_ring(self, sample, t):
+        # Drop readings that have slid out of the window, and make room if the
+        # ring is full.
+        while self._count and t - self._times[self._head] > self.window_size:
+            self._remove_oldest()
+        if self._count == self.capacity:
+            self._grow()
+
+        tail = (self._head + self._count) % self.capacity
+        self._ring[tail] = sample
+        self._times[tail] = t
+        self._count += 1
+
+        # Welford update: mean += delta / n, m2 += delta * (x - new_mean)
+        np.subtract(sample, self._mean, out=self._delta)
+        np.multiply(self._delta, 1.0 / self._count, out=self._tmp)
+        self._mean += self._tmp
+        np.subtract(sample, self._mean, out=self._tmp)
+        self._tmp *= self._delta
+        self._m2 += self._tmp
+
+        if self._last_emit is None:
+            window_complete = t >= self.window_size
+        else:
+            window_complete = t - self._last_emit >= self.hop
+
+        if window_complete:
+            self._last_emit = t
+            features = self._ring_features()
+            self.last_features = features
+            if features is not None:
+                return features
+        return False
+
+    def _add_reading_grid(self, sensor_data, timestamp):
+        sample = self._sample
+        for i, sensor_name in enumerate(SENSOR_NAMES):
+            sample[i] = sensor_data[sensor_name]
+        return self._add_sample_grid(sample, resample.to_ns(timestamp))
+
+    def _add_sample_grid(self, sample, timestamp_ns):
+        rows, reset = self.resampler.add(timestamp_ns, sample)
+        if reset:
+            logger.debug("Gap before %d ns; discarding %d grid samples", timestamp_ns, self._grid_count)
+            self._grid_count = 0
+
+        features = False
+        n = self.window_samples
+        for row in rows:
+            self._grid[self._grid_count % n] = row
+            self._grid_count += 1
+            if self._grid_count >= n and (self._grid_count - n) % self.hop_samples == 0:
+                if features is not False:
+                    self.skipped_windows += 1
+                features = feature_engine.compute_features(self._grid_window_view(), self.stats)
+        if features is not False:
+            self.last_features = features
+        return features
+
+    def _grid_window_view(self):
+        # The last window_samples grid samples, oldest first
+        split = self._grid_count % self.window_samples
+        window = self._grid_window
+        window[:self.window_samples - split] = self._grid[split:]
+        window[self.window_samples - split:] = self._grid[:split]
+        return window
+
+    def _remove_oldest(self):
+        head = self._head
+        self._head = (head + 1) % self.capacity
+        self._count -= 1
+
+        if self._count == 0:
+            self._mean[:] = 0.0
+            self._m2[:] = 0.0
+            return
+
+        # Reverse Welford step: mean -= delta / (n - 1), m2 -= delta * (x - new_mean)
+        x = self._ring[head]
+        np.subtract(x, self._mean, out=self._delta)
+        np.multiply(self._delta, 1.0 / self._count, out=self._tmp)
+        self._mean -= self._tmp
+        np.subtract(x, self._mean, out=self._tmp)
+        self._tmp *= self._delta
+        self._m2 -= self._tmp
+        np.maximum(self._m2, 0.0, out=self._m2)
+
+        # Removals accumulate rounding error, so recompute the statistics
+        # exactly once per ring's worth of evictions (amortised O(1)).
+        self._evictions += 1
+        if self._evictions >= self.capacity:
+            self._evictions = 0
+            window = self._ring_window()
+            self._mean[:] = window.mean(axis=0)
+            self._m2[:] = ((window - self._mean) ** 2).sum(axis=0)
+
+    def _grow(self):
+        # Every reading in the ring is still inside the window: double the
+        # ring rather than drop one
+        logger.warning("Window holds more than %d readings; growing the ring buffer", self.capacity)
+        window = self._ring_window()
+        times = self._times[(self._head + np.arange(self._count)) % self.capacity]
+        self.capacity *= 2
+        self._ring = np.zeros((self.capacity, 6))
+        self._times = np.zeros(self.capacity)
+        self._ring[:self._count] = window
+        self._times[:self._count] = times
+        self._head = 0
+
+    def _ring_window(self):
+        # Readings currently in the window, oldest first, shape (n_samples, 6)
+        idx = (self._head + np.arange(self._count)) % self.capacity
+        return self._ring[idx]
+
+    def _ring_features(self):
+        if self._count == 0:
+            return None
+        if not self._incremental:
+            return feature_engine.compute_features(self._ring_window(), self.stats)
+        # Same layout as get_feature_names(): mean, std per sensor
+        features = np.empty(12)
+        features[0::2] = self._mean
+        np.divide(self._m2, self._count, out=self._tmp)
+        np.sqrt(self._tmp, out=features[1::2])
+        return features
+
     # Extract features
     def _process_window(self):
+        if self.resampler is not None:
+            if self._grid_count < self.window_samples:
+                logger.debug("Not enough grid samples to process")
+                return None, None
+            window = self._grid_window_view()
+            return window, feature_engine.compute_features(window, self.stats)
+
+        if self.hop is not None:
+            if self._count == 0:
+                logger.debug("No samples in buffer to process")
+                return None, None
+            return self._ring_window(), self._ring_features()
+
         if len(self.accel_x) == 0:
-            print("No samples in buffer to process")
+            logger.debug("No samples in buffer to process")
             return None, None
             
-        print("Processing window with data:")
-        print(f"Accel X: {self.accel_x}")
-        print(f"Accel Y: {self.accel_y}")
-        print(f"Accel Z: {self.accel_z}")
-        print(f"Gyro X: {self.gyro_x}")
-        print(f"Gyro Y: {self.gyro_y}")
-        print(f"Gyro Z: {self.gyro_z}")
+        logger.debug("Processing window with data:\nAccel X: %s\nAccel Y: %s\nAccel Z: %s\n"
+                     "Gyro X: %s\nGyro Y: %s\nGyro Z: %s",
+                     self.accel_x, self.accel_y, self.accel_z, self.gyro_x, self.gyro_y, self.gyro_z)
             
         # Use numpy array for performance of processing streaming data.
         # Shape: (6, n_samples)
@@ -116,28 +546,29 @@ class SensorBuffer:
         ])
         # Transpose to shape (n_samples, 6)
         window = window.T
-        features = []
         
         try:
-            # For each sensor
-            for i in range(6):
-                sensor_data = window[:, i]
-                features.extend([
-                    np.mean(sensor_data),
-                    np.std(sensor_data) 
-                ])
-                print(f"Processing sensor {i} with data: {sensor_data}")
-            features = np.array(features)
+            features = feature_engine.compute_features(window, self.stats)
             
-            print(f"Processed window. Total features: {len(features)}")
+            logger.debug("Processed window. Total features: %d", len(features))
             return window, features
         except Exception as e:
-            print(f"Error processing window: {e}")
+            logger.error("Error processing window: %s", e)
             return None, None
 
     def get_latest_window(self):
+        if self.resampler is not None:
+            if self._grid_count < self.window_samples:
+                logger.debug("Not enough grid samples")
+                return None
+            return self._grid_window_view().copy()
+        if self.hop is not None:
+            if self._count == 0:
+                logger.debug("No samples in buffer")
+                return None
+            return self._ring_window()
         if self.last_window is not None:
             return self.last_window
         if len(self.accel_x) == 0:
-            print("No samples in buffer")
+            logger.debug("No samples in buffer")
             return None
\ No newline at end of file
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Sensor sources for main.py.
+
+A source is an iterable of (timestamp, sensor_data) pairs, where timestamp is
+a datetime and sensor_data the dict used throughout the project
+(accel_x .. gyro_z, temp). Sources pace themselves, so the monitoring loop
+simply iterates.
+
+- MPU6050Source reads the real sensor over I2C on a DeadlineScheduler.
+- mpu6050_fifo.MPU6050FIFOSource samples the MPU6050 at hundreds of Hz
+  through its FIFO, from the real chip or a register-level simulation.
+- ReplaySource plays back a recorded data/sensor_data_*.csv (or .wtr store)
+  with its recorded timestamps, at 1x, Nx or unthrottled speed, so the full
+  pipeline can run and be measured on any Linux box.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+class DeadlineScheduler:
+    """Ticks at absolute times start + k * interval.
+
+    Sleeping a fixed interval after each reading adds the read time to every
+    period (0.2 s sleeps gave about 4 Hz). Waiting for absolute deadlines
+    keeps the average rate exact; a reading that overruns one or more whole
+    periods skips those ticks and counts them as missed instead of bursting
+    to catch up.
+    """
+
+    def __init__(self, interval, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.next_tick = None
+        self.ticks = 0
+        self.missed = 0
+        self.max_lateness = 0.0
+
+    def wait(self):
+        """Block until the next tick; returns the tick's scheduled time."""
+        now = self.clock()
+        if self.next_tick is None:
+            self.next_tick = now
+        elif now < self.next_tick:
+            self.sleep(self.next_tick - now)
+        elif now - self.next_tick >= self.interval:
+            skipped = int((now - self.next_tick) // self.interval)
+            self.missed += skipped
+            self.next_tick += skipped * self.interval
+
+        tick = self.next_tick
+        self.max_lateness = max(self.max_lateness, self.clock() - tick)
+        self.ticks += 1
+        self.next_tick += self.interval
+        return tick
+
+    def summary(self):
+        return (f"{self.ticks} ticks at {1 / self.interval:.1f} Hz, {self.missed} missed, "
+                f"max lateness {self.max_lateness * 1e3:.1f} ms")
+
+
+class MPU6050Source:
+    """Live readings from an MPU6050, one every `interval` seconds."""
+
+    live = True
+
+    def __init__(self, interval=0.2, i2c=None, read_timer=None, address=None):
+        # Hardware libraries are only needed (and only importable) on the Pi
+        import board
+        import adafruit_mpu6050
+
+        self.interval = interval
+        self.scheduler = DeadlineScheduler(interval)
+        # Optional metrics.Histogram observing each I2C read
+        self.read_timer = read_timer
+        if i2c is None:
+            i2c = board.I2C()
+        # 0x68 by default; 0x69 with AD0 pulled high, for a second sensor on the bus
+        if address is None:
+            self.device = adafruit_mpu6050.MPU6050(i2c)
+        else:
+            self.device = adafruit_mpu6050.MPU6050(i2c, address=address)
+
+    def read(self):
+        accel_x, accel_y, accel_z = self.device.acceleration
+        gyro_x, gyro_y, gyro_z = self.device.gyro
+        temp = self.device.temperature
+        timestamp = datetime.now()
+        sensor_data = {
+            'accel_x': accel_x, 'accel_y': accel_y, 'accel_z': accel_z,
+            'gyro_x': gyro_x, 'gyro_y': gyro_y, 'gyro_z': gyro_z,
+            'temp': temp
+        }
+        return timestamp, sensor_data
+
+    def __iter__(self):
+        while True:
+            self.scheduler.wait()
+            if self.read_timer:
+                start = time.perf_counter()
+                reading = self.read()
+                self.read_timer.observe(time.perf_counter() - start)
+                yield reading
+            else:
+                yield self.read()
+
+
+class ReplaySource:
+    """Replays a recorded sensor file using its recorded timestamps.
+
+    speed=1.0 replays in real time, speed=N N times faster, and speed=None
+    (or 0) as fast as the consumer can take readings. With real-time pacing
+    the schedule is anchored to the first reading, so slow consumers catch up
+    instead of drifting.
+    """
+
+    live = False
+
+    def __init__(self, path, speed=1.0, loop=False):
+        # Imported here so the live path does not need pandas
+        import pandas as pd
+        from extract_features import load_sensor_data
+
+        df = load_sensor_data(path)
+        self.path = path
+        self.speed = speed if speed else None
+        self.loop = loop
+        timestamps = pd.to_datetime(df['timestamp'])
+        self.timestamps = list(timestamps.dt.to_pydatetime())
+        ns = timestamps.values.astype('datetime64[ns]').astype(np.int64)
+        self._offsets = ((ns - ns[0]) / 1e9).tolist() if len(ns) else []
+        # Looping shifts each pass by the recording length plus one typical
+        # sample interval, so timestamps keep increasing
+        self._period = (self._offsets[-1] + float(np.median(np.diff(self._offsets)))
+                        if len(ns) > 1 else 0.0)
+        self._values = df[['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z',
+                           'temperature']].to_numpy(dtype=np.float64).tolist()
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        start = time.monotonic()
+        cycle = 0
+        while True:
+            shift = timedelta(seconds=cycle * self._period)
+            for offset, timestamp, values in zip(self._offsets, self.timestamps, self._values):
+                offset += cycle * self._period
+                if self.speed is not None:
+                    delay = start + offset / self.speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                accel_x, accel_y, accel_z, gyro_x, gyro_y, gyro_z, temp = values
+                yield timestamp + shift, {
+                    'accel_x': accel_x, 'accel_y': accel_y, 'accel_z': accel_z,
+                    'gyro_x': gyro_x, 'gyro_y': gyro_y, 'gyro_z': gyro_z,
+                    'temp': temp
+                }
+            if not self.loop or not self._values:
+                return
+            cycle += 1
+
+
+def open_source(replay=None, speed=1.0, loop=False, interval=0.2, read_timer=None,
+                fifo_rate=None, simulate=False):
+    """MPU6050Source, ReplaySource if a replay file is given, or
+    MPU6050FIFOSource with a FIFO sample rate or a simulated sensor."""
+    if replay:
+        return ReplaySource(replay, speed=speed, loop=loop)
+    if fifo_rate or simulate:
+        from mpu6050_fifo import MPU6050FIFOSource, SimulatedMPU6050
+
+        registers = SimulatedMPU6050() if simulate else None
+        return MPU6050FIFOSource(fifo_rate or 500.0, registers=registers, read_timer=read_timer)
+    return MPU6050Source(interval=interval, read_timer=read_timer)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Shared-memory sample ring for running acquisition and inference in
+separate processes.
+
+One producer (the acquisition process) and one consumer (the inference
+process) share a multiprocessing.shared_memory block:
+
+    header:     8 x int64   write_seq, capacity, read_seq, heartbeat_ns, closed
+    timestamps: 2 x capacity x int64    reading time, epoch ns
+    received:   2 x capacity x int64    time.monotonic_ns() when the reading arrived
+    values:     2 x capacity x 7 float64  accel_x .. gyro_z, temperature
+
+Every reading is a fixed-size record at sequence number seq, stored in slot
+seq % capacity. The producer fills the record first and publishes it by
+advancing write_seq. It does not wait for the consumer to catch up, so
+capture continues whether the consumer is slow, crashed or restarting; a
+consumer that falls more than capacity readings behind loses the oldest ones.
+
+The consumer keeps its own position and publishes it (read_seq) with a
+heartbeat for monitoring only. Each record is written twice, at slot and
+slot + capacity, so any run of up to capacity consecutive readings is one
+contiguous slice, and read() copies a window with one slice per array.
+
+Memory ordering: plain NumPy stores carry no barriers, and ARM (the
+Raspberry Pi) may make them visible to another core out of order, so a bare
+write_seq could be seen before the record it publishes. write_seq is
+therefore only advanced and read under a multiprocessing.Lock shared by both
+processes, whose acquire and release are full barriers: every record below
+the write_seq the consumer reads is complete and visible to it. read() copies
+the window while holding the lock, so the producer cannot publish, nor start
+writing, anything beyond the one record it may be filling. That record's
+slot, reading write_seq - capacity's, no longer counts as held. The producer
+waits for the lock at most for the length of one window copy.
+"""
+
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from features import SENSOR_NAMES
+
+# Stored value columns, in order (the same as raw_store.COLUMNS)
+COLUMNS = SENSOR_NAMES + ['temperature']
+
+# sensor_data keys of the same columns
+READING_FIELDS = ['accel_x', 'accel_y', 'accel_z', 'gyro_x', 'gyro_y', 'gyro_z', 'temp']
+
+_EPOCH = datetime(1970, 1, 1)
+
+_HEADER_FIELDS = 8
+_WRITE_SEQ, _CAPACITY, _READ_SEQ, _HEARTBEAT, _CLOSED = range(5)
+
+DEFAULT_CAPACITY = 4096
+
+
+def _layout(capacity):
+    # Offsets of the header, timestamp, received and value arrays, and total size
+    header = 0
+    timestamps = header + 8 * _HEADER_FIELDS
+    received = timestamps + 8 * 2 * capacity
+    values = received + 8 * 2 * capacity
+    return header, timestamps, received, values, values + 8 * 2 * capacity * len(COLUMNS)
+
+
+class SampleRing:
+    """Single-producer/single-consumer ring of readings in shared memory.
+
+    SampleRing(capacity) creates a new block and its lock; SampleRing(name=...,
+    lock=ring.lock) attaches to an existing one, e.g. in the inference
+    process, which is given the lock when it is started.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, name=None, lock=None):
+        self.owner = name is None
+        if not self.owner and lock is None:
+            raise ValueError("attaching to a ring needs the creator's lock")
+        self.lock = multiprocessing.Lock() if lock is None else lock
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=_layout(capacity)[-1])
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            capacity = int(np.ndarray((_HEADER_FIELDS,), np.int64, self._shm.buf)[_CAPACITY])
+        self.name = self._shm.name
+        self.capacity = capacity
+
+        header, timestamps, received, values, _ = _layout(capacity)
+        buf = self._shm.buf
+        self._header = np.ndarray((_HEADER_FIELDS,), np.int64, buf, header)
+        self.timestamps = np.ndarray((2 * capacity,), np.int64, buf, timestamps)
+        self.received = np.ndarray((2 * capacity,), np.int64, buf, received)
+        self.values = np.ndarray((2 * capacity, len(COLUMNS)), np.float64, buf, values)
+        if self.owner:
+            self._header[:] = 0
+            self._header[_CAPACITY] = capacity
+
+    # Producer side
+
+    def write(self, timestamp_ns, values, received_ns=None):
+        """Append one reading: epoch-ns timestamp and 7 values in COLUMNS order."""
+        if received_ns is None:
+            received_ns = time.monotonic_ns()
+        seq = int(self._header[_WRITE_SEQ])
+        for slot in (seq % self.capacity, seq % self.capacity + self.capacity):
+            self.timestamps[slot] = timestamp_ns
+            self.received[slot] = received_ns
+            self.values[slot] = values
+        # Publish only after the record is complete, under the lock so the
+        # record is visible to the consumer before the new write_seq is
+        with self.lock:
+            self._header[_WRITE_SEQ] = seq + 1
+
+    def write_reading(self, timestamp, sensor_data, received_ns=None):
+        """Append a (datetime, sensor_data dict) reading as produced by sensor_source."""
+        # Exact integer conversion; naive datetimes are taken as UTC, as pandas does
+        timestamp_ns = (timestamp - _EPOCH) // timedelta(microseconds=1) * 1000
+        self.write(timestamp_ns, [sensor_data[name] for name in READING_FIELDS], received_ns)
+
+    def close_stream(self):
+        """Tell the consumer no more readings will be written."""
+        self._header[_CLOSED] = 1
+
+    def lag(self):
+        """Readings written but not yet consumed."""
+        return self.write_seq - self.read_seq
+
+    # Consumer side
+
+    @property
+    def write_seq(self):
+        with self.lock:
+            return int(self._header[_WRITE_SEQ])
+
+    @property
+    def read_seq(self):
+        return int(self._header[_READ_SEQ])
+
+    @property
+    def heartbeat_ns(self):
+        return int(self._header[_HEARTBEAT])
+
+    @property
+    def closed(self):
+        return bool(self._header[_CLOSED])
+
+    def oldest_seq(self):
+        """Oldest sequence number still held in the ring."""
+        # Reading write_seq - capacity shares a slot with the next write
+        return max(0, self.write_seq - self.capacity + 1)
+
+    def publish_position(self, seq):
+        """Consumer: record how far it has read, with a heartbeat."""
+        self._header[_READ_SEQ] = seq
+        self._header[_HEARTBEAT] = time.monotonic_ns()
+
+    def read(self, start, end):
+        """Copies (timestamps, received, values) of readings [start, end).
+
+        end must not be beyond write_seq. Returns None if the producer has
+        overwritten reading start, or is overwriting it.
+        """
+        if end - start > self.capacity:
+            raise ValueError(f"window of {end - start} readings exceeds capacity {self.capacity}")
+        a = start % self.capacity
+        b = a + (end - start)
+        with self.lock:
+            write_seq = int(self._header[_WRITE_SEQ])
+            if end > write_seq:
+                raise ValueError(f"reading {end - 1} has not been written yet")
+            if not self._held(start, write_seq):
+                return None
+            return self.timestamps[a:b].copy(), self.received[a:b].copy(), self.values[a:b].copy()
+
+    def window_valid(self, start):
+        """True if reading start has not been overwritten, nor is being."""
+        return self._held(start, self.write_seq)
+
+    def _held(self, start, write_seq):
+        # The slot of reading write_seq - capacity is the one written next
+        return start > write_seq - self.capacity
+
+    def close(self):
+        # Views must be released before the block can be closed
+        self._header = self.timestamps = self.received = self.values = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 import os
 import time
-from twilio.rest import Client
 
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
@@ -10,11 +9,30 @@ TWILIO_FROM_PHONE = os.getenv('TWILIO_FROM_PHONE')
 COOLDOWN_PERIOD = 10  # seconds
 last_alert_time = None
 
-# Initialize Twilio client
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# Twilio client, created on the first alert so that importing this module
+# does not import twilio or touch the network
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        from twilio.rest import Client
+        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    return client
+
+class TwilioTransport:
+    """Transport for alert_dispatcher.AlertDispatcher; raises if a send fails."""
+
+    def send(self, to, message):
+        message = get_client().messages.create(
+            body=message,
+            from_=TWILIO_FROM_PHONE,
+            to=to
+        )
+        print(f"SMS alert sent successfully. SID: {message.sid}")
 
 def send_sms_alert(to_phone, message):
-    global last_alert_time, client
+    global last_alert_time
     
     if last_alert_time is not None:
         time_since_last_alert = time.time() - last_alert_time
@@ -23,7 +41,7 @@ def send_sms_alert(to_phone, message):
             return False
     
     try:
-        message = client.messages.create(
+        message = get_client().messages.create(
             body=message,
             from_=TWILIO_FROM_PHONE,
             to=to_phone
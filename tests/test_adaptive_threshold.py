@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pytest
+
+from adaptive_threshold import AdaptiveThreshold, QuantileSketch
+
+RECORDINGS = ['data/sensor_data_normal.csv', 'data/sensor_data_anomaly1.csv',
+              'data/sensor_data_anomaly2.csv']
+
+
+def test_sketch_quantile():
+    rng = np.random.default_rng(0)
+    sketch = QuantileSketch(half_life=100000)
+    scores = rng.normal(0.5, 0.2, 20000)
+    for score in scores:
+        sketch.add(score)
+    for q in (0.01, 0.05, 0.5):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(scores, q), abs=0.02)
+
+
+def test_alarm_and_clear_stay_apart_on_replay():
+    if not all(os.path.isfile(path) for path in RECORDINGS):
+        pytest.skip("sample recordings not available")
+    from anomaly_detector import OneClassSVMDetector
+    from adaptive_threshold import replay_scores
+    from main import SCALER_PATH, select_model_path
+
+    detector = OneClassSVMDetector(select_model_path(), SCALER_PATH, threshold=-2.0)
+    calibrator = AdaptiveThreshold(min_count=100, half_life=500, fixed_threshold=-2.0)
+    for path in RECORDINGS:
+        for _, temperature, score in replay_scores(path, detector):
+            calibrator.update(score, temperature)
+    alarm, clear = calibrator.thresholds()
+    assert clear - alarm > 0.05
+
+
+def test_persistent_fault_moves_threshold_slowly_but_shift_does():
+    rng = np.random.default_rng(1)
+    calibrator = AdaptiveThreshold(min_count=100, half_life=500, fixed_threshold=-2.0)
+    for score in rng.normal(0.5, 0.1, 2000):
+        calibrator.update(score)
+    before = calibrator.threshold
+    # A fault: scores far below the threshold for a while
+    for score in rng.normal(-1.0, 0.1, 50):
+        calibrator.update(score)
+    assert calibrator.alarmed
+    assert calibrator.threshold > before - 0.1
+    # A lasting shift: conditions change and stay changed
+    for score in rng.normal(-1.0, 0.1, 5000):
+        calibrator.update(score)
+    assert calibrator.threshold < -1.0
+    assert not calibrator.alarmed
+
+
+def test_load_rejects_bad_state(tmp_path):
+    calibrator = AdaptiveThreshold(min_count=100)
+    for score in np.linspace(0.0, 1.0, 500):
+        calibrator.update(score)
+    assert calibrator.threshold != calibrator.fixed_threshold
+
+    missing_key = tmp_path / 'old.npz'
+    np.savez(missing_key, counts=calibrator.sketch.counts)
+    not_npz = tmp_path / 'broken.npz'
+    not_npz.write_bytes(b'not a zip file')
+    for path in (missing_key, not_npz):
+        fresh = AdaptiveThreshold()
+        assert not fresh.load(str(path))
+        assert fresh.sketch.count == 0
+
+    saved = tmp_path / 'state.npz'
+    calibrator.save(str(saved))
+    fresh = AdaptiveThreshold(min_count=100)
+    assert fresh.load(str(saved))
+    assert fresh.thresholds() == pytest.approx(calibrator.thresholds())
+    # Reported straight away, not only after the next update
+    assert (fresh.threshold, fresh.clear_threshold) == pytest.approx(calibrator.thresholds())
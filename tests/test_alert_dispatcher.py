@@ -0,0 +1,88 @@
+import threading
+import time
+
+from alert_dispatcher import AlertDispatcher
+
+
+class RecordingTransport:
+    """Fails every send for the streams in `failing`; records the rest."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.messages = []
+        self.attempts = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, to, message):
+        self.release.wait()
+        stream = message.splitlines()[0].split(': ')[-1]
+        self.attempts.append((time.monotonic(), stream))
+        if stream in self.failing:
+            raise ConnectionError("unreachable")
+        self.messages.append(message)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_backoff_of_one_stream_does_not_delay_others():
+    transport = RecordingTransport(failing={'T01'})
+    dispatcher = AlertDispatcher(transport, '+1', min_interval=0.05, max_retries=3,
+                                 backoff=0.5, max_backoff=0.5)
+    try:
+        dispatcher.submit(-3.0, stream='T01')
+        assert wait_for(lambda: len(transport.attempts) == 1)
+        # T01 now waits 0.5 s before its retry; T02 must not wait with it
+        start = time.monotonic()
+        for i in range(3):
+            dispatcher.submit(-2.5, stream='T02')
+            time.sleep(0.1)
+        assert wait_for(lambda: len(transport.messages) >= 2)
+        assert all('T02' in m for m in transport.messages)
+        assert time.monotonic() - start < 0.5
+        assert dispatcher.retries == 1
+    finally:
+        dispatcher.close()
+    assert dispatcher.failed == 1
+
+
+def test_dropped_anomalies_are_reported_per_stream():
+    transport = RecordingTransport()
+    transport.release.clear()
+    dispatcher = AlertDispatcher(transport, '+1', min_interval=0.0, max_queue=1)
+    try:
+        dispatcher.submit(-3.0, stream='T01')
+        # The worker is now blocked sending T01's alert
+        assert wait_for(lambda: dispatcher._queue.empty())
+        assert dispatcher.submit(-2.0, stream='T02')
+        assert not dispatcher.submit(-2.0, stream='T02')
+        transport.release.set()
+        assert wait_for(lambda: len(transport.messages) == 2)
+    finally:
+        dispatcher.close()
+    first, second = transport.messages
+    assert 'T01' in first and 'not counted' not in first
+    assert 'T02' in second and '(1 more not counted, queue full)' in second
+    assert dispatcher.dropped == 1
+
+
+def test_submits_from_many_threads_are_all_counted():
+    transport = RecordingTransport()
+    dispatcher = AlertDispatcher(transport, '+1', min_interval=60.0, max_queue=100)
+
+    def submit_many():
+        for _ in range(2000):
+            dispatcher.submit(-2.0, stream='T01')
+
+    threads = [threading.Thread(target=submit_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dispatcher.close(timeout=0.1)
+    assert dispatcher.submitted == 16000
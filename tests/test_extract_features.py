@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from extract_features import extract_file, extract_many, output_name
+
+RECORDINGS = ['data/sensor_data_normal.csv', 'data/sensor_data_anomaly1.csv',
+              'data/sensor_data_anomaly2.csv']
+WINDOW_SIZE = 6.6
+
+
+@pytest.fixture
+def recordings():
+    if not all(os.path.isfile(path) for path in RECORDINGS):
+        pytest.skip("sample recordings not available")
+    return RECORDINGS
+
+
+def test_batch_matches_streaming(recordings, tmp_path):
+    for path in recordings:
+        batch = tmp_path / 'batch.csv'
+        streaming = tmp_path / 'streaming.csv'
+        assert extract_file(path, str(batch), WINDOW_SIZE) == 0
+        assert extract_file(path, str(streaming), WINDOW_SIZE, streaming=True) == 0
+        expected = pd.read_csv(streaming)
+        actual = pd.read_csv(batch)
+        assert list(actual.columns) == list(expected.columns)
+        assert len(actual) == len(expected) > 0
+        np.testing.assert_allclose(actual.values, expected.values, rtol=1e-9, atol=1e-12)
+
+
+def test_process_pool_matches_streaming(recordings, tmp_path):
+    assert extract_many(recordings, str(tmp_path), WINDOW_SIZE, workers=2) == 0
+    for path in recordings:
+        streaming = tmp_path / 'streaming.csv'
+        assert extract_file(path, str(streaming), WINDOW_SIZE, streaming=True) == 0
+        expected = pd.read_csv(streaming)
+        actual = pd.read_csv(output_name(path, str(tmp_path)))
+        assert len(actual) == len(expected) > 0
+        np.testing.assert_allclose(actual.values, expected.values, rtol=1e-9, atol=1e-12)
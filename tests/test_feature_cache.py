@@ -0,0 +1,46 @@
+import numpy as np
+
+import feature_cache
+from feature_cache import FeatureCache
+
+
+def test_digests_from_separate_caches_are_all_kept(tmp_path, monkeypatch):
+    hashed = []
+    real_digest = feature_cache.file_digest
+
+    def counting_digest(path):
+        hashed.append(path)
+        return real_digest(path)
+
+    monkeypatch.setattr(feature_cache, 'file_digest', counting_digest)
+    raw_files = []
+    for i in range(4):
+        raw = tmp_path / f'raw{i}.csv'
+        raw.write_text(f'{i}\n')
+        raw_files.append(str(raw))
+
+    # One cache per extract_features.py --inputs worker, each hashing its own file
+    cache_dir = str(tmp_path / 'cache')
+    workers = [FeatureCache(cache_dir) for _ in raw_files]
+    expected = [worker.digest(raw) for worker, raw in zip(workers, raw_files)]
+    assert len(hashed) == 4
+
+    fresh = FeatureCache(cache_dir)
+    assert [fresh.digest(raw) for raw in raw_files] == expected
+    assert len(hashed) == 4
+
+    (tmp_path / 'raw0.csv').write_text('changed\n')
+    assert fresh.digest(raw_files[0]) != expected[0]
+    assert len(hashed) == 5
+
+
+def test_clear_forgets_entries_and_digests(tmp_path):
+    raw = tmp_path / 'raw.csv'
+    raw.write_text('1\n')
+    cache = FeatureCache(str(tmp_path / 'cache'))
+    features = cache.get_or_compute(str(raw), {'window_size': 6.6}, lambda: np.ones((3, 12)))
+    assert cache.get(cache.key(str(raw), {'window_size': 6.6})) is not None
+    assert cache.clear() == 1
+    assert cache.entries() == []
+    assert not list((tmp_path / 'cache' / 'digests').iterdir())
+    assert features.shape == (3, 12)
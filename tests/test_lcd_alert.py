@@ -0,0 +1,68 @@
+import time
+
+from lcd_alert import FakeCharLCD, LCDAlert
+
+
+def test_refresh_writes_only_changed_cells():
+    lcd = FakeCharLCD()
+    display = LCDAlert(lcd=lcd, start=False)
+    display.show_reading("Score: -0.1234", "Temp: 21.5C")
+    display.refresh()
+    assert lcd.lines() == ["Score: -0.1234  ", "Temp: 21.5C     "]
+    assert lcd.clears == 1
+
+    written = lcd.chars_written
+    display.show_reading("Score: -0.1299", "Temp: 21.5C")
+    assert display.refresh() == 1
+    # "99" replaces "34"; the rest of the screen is untouched
+    assert lcd.chars_written - written == 2
+    assert lcd.lines()[0] == "Score: -0.1299  "
+
+    written = lcd.chars_written
+    assert display.refresh() == 0
+    assert lcd.chars_written == written
+    assert lcd.clears == 1
+
+
+def test_alert_takes_priority_then_expires():
+    lcd = FakeCharLCD()
+    display = LCDAlert(lcd=lcd, start=False, alert_hold=5.0)
+    display.show_reading("normal", "")
+    display.display_alert("ANOMALY DETECTED score -3.2")
+    now = time.monotonic()
+    display.refresh(now)
+    assert lcd.lines() == ["ANOMALY DETECTED", " score -3.2     "]
+    display.refresh(now + 6.0)
+    assert lcd.lines()[0] == "normal          "
+
+
+def test_refresh_thread_is_rate_limited():
+    lcd = FakeCharLCD()
+    display = LCDAlert(lcd=lcd, refresh_rate=20.0)
+    start = time.monotonic()
+    try:
+        # Far more updates than the display could take
+        i = 0
+        while time.monotonic() - start < 0.3:
+            display.show_reading(f"reading {i}")
+            i += 1
+    finally:
+        display.close()
+    elapsed = time.monotonic() - start
+    assert i > 100
+    # One refresh per 50 ms, plus the final one in close()
+    assert display.refreshes <= elapsed * 20 + 2
+    assert lcd.cursor_moves == display.runs_written
+    assert lcd.chars_written <= 16 * display.refreshes
+    assert lcd.lines()[0] == f"reading {i - 1}".ljust(16)
+
+
+class FailingCharLCD(FakeCharLCD):
+    def write_string(self, text):
+        raise OSError(121, "Remote I/O error")
+
+
+def test_close_survives_bus_error():
+    display = LCDAlert(lcd=FailingCharLCD(), start=False)
+    display.show_reading("Score: -0.1234", "")
+    display.close()
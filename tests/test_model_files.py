@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+
+import main
+from anomaly_detector import OneClassSVMDetector
+from features import get_feature_names
+from train_ocsvm import fit_model, save_model
+
+
+@pytest.fixture
+def model_files(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    feature_names = get_feature_names('basic')
+    features = rng.normal(size=(200, len(feature_names)))
+    model_path = str(tmp_path / 'model_svm.pkl')
+    scaler_path = str(tmp_path / 'scaler.pkl')
+    scaler, model = fit_model(features, feature_names)
+    save_model(model, scaler, feature_names, model_path, scaler_path, 'basic', window_size=3.3)
+    monkeypatch.setattr(main, 'MODEL_PATH', model_path)
+    monkeypatch.setattr(main, 'COMPACT_MODEL_PATH', str(tmp_path / 'model_svm.npz'))
+    return model_path, scaler_path, features
+
+
+def test_compact_model_is_preferred_while_it_matches_the_pickle(model_files):
+    model_path, scaler_path, features = model_files
+    assert main.select_model_path() == main.COMPACT_MODEL_PATH
+    # A newer mtime alone (copy, checkout) does not make the pickle win
+    os.utime(model_path, (1e10, 1e10))
+    assert main.select_model_path() == main.COMPACT_MODEL_PATH
+
+    compact = OneClassSVMDetector(main.COMPACT_MODEL_PATH, scaler_path)
+    pickled = OneClassSVMDetector(model_path, scaler_path)
+    assert compact.window_size == pickled.window_size == 3.3
+    np.testing.assert_allclose(compact.predict_batch(features[:10]),
+                               pickled.predict_batch(features[:10]))
+
+
+def test_pickle_is_used_when_the_compact_model_is_stale(model_files):
+    model_path, _, _ = model_files
+    with open(model_path, 'ab') as f:
+        f.write(b'\0')
+    assert main.select_model_path() == model_path
+    os.remove(main.COMPACT_MODEL_PATH)
+    assert main.select_model_path() == model_path
+
+
+def test_compiled_scorer_rejects_wrong_shapes(model_files):
+    _, scaler_path, features = model_files
+    detector = OneClassSVMDetector(main.COMPACT_MODEL_PATH, scaler_path)
+    scorer = detector.scorer
+    assert scorer.score(features[0]) == pytest.approx(detector.predict_batch(features[:1])[0])
+    for bad in (features[0, 0], features[0, :1], features[0, :-1], features[:2]):
+        with pytest.raises(ValueError):
+            scorer.score(bad)
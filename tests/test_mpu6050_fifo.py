@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from flight_recorder import FlightRecorder
+from mpu6050_fifo import (FRAME_BYTES, FRAME_SCALE, MPU6050FIFO, SimulatedMPU6050,
+                          frame_readings, frame_times_ns, turbine_signal)
+
+
+class FakeClock:
+    # Steps of 1/8 s are exact in binary, so frame counts are too
+    def __init__(self, now=1024.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RecordingSignal:
+    """turbine_signal, remembering every frame it produced."""
+
+    def __init__(self):
+        self.values = []
+
+    def __call__(self, t):
+        values = turbine_signal(t)
+        self.values.append(values)
+        return values
+
+
+def make_fifo(sample_rate=500.0, max_burst=None, signal=turbine_signal):
+    clock = FakeClock()
+    device = SimulatedMPU6050(signal, clock)
+    fifo = MPU6050FIFO(device, sample_rate, max_burst=max_burst, sleep=clock.sleep, clock=clock)
+    return fifo, device, clock
+
+
+def test_decode_round_trips_signal_within_one_lsb():
+    signal = RecordingSignal()
+    fifo, _, clock = make_fifo(signal=signal)
+    clock.sleep(0.125)
+    timestamps, values, temperature = fifo.read_block()
+    assert len(timestamps) == 62
+    expected = np.concatenate(signal.values)
+    assert values.shape == expected.shape
+    assert np.all(np.abs(values - expected) <= FRAME_SCALE)
+    assert temperature == pytest.approx(25.0, abs=0.01)
+
+
+def test_timestamps_are_one_period_apart():
+    fifo, _, clock = make_fifo(sample_rate=500.0)
+    blocks = []
+    for _ in range(5):
+        clock.sleep(0.125)
+        blocks.append(fifo.read_block()[0])
+    timestamps = np.concatenate(blocks)
+    assert len(timestamps) == 312
+    assert np.all(np.diff(timestamps) == int(1e9 / fifo.sample_rate))
+    assert fifo.resyncs == 0
+
+
+def test_overflow_resets_and_recovers():
+    fifo, _, clock = make_fifo()
+    # 85 frames fit; half a second at 500 Hz is 250
+    clock.sleep(0.5)
+    timestamps, values, _ = fifo.read_block()
+    assert fifo.overflows == 1
+    assert len(timestamps) == 0 and values.shape == (0, 6)
+
+    clock.sleep(0.125)
+    timestamps, values, _ = fifo.read_block()
+    assert len(timestamps) == 62
+    assert np.all(np.abs(values[:, 2] - 9.8) < 1.0)
+    assert fifo.overflows == 1
+
+
+def test_max_burst_reads_in_chunks():
+    signal = RecordingSignal()
+    fifo, device, clock = make_fifo(max_burst=100, signal=signal)
+    clock.sleep(0.125)
+    before = device.transactions
+    timestamps, values, _ = fifo.read_block()
+    assert len(timestamps) == 62
+    # Status, count, then 744 bytes in 96-byte chunks
+    assert device.transactions - before == 2 + 8
+    assert np.all(np.abs(values - np.concatenate(signal.values)) <= FRAME_SCALE)
+
+
+def test_max_burst_below_one_frame_is_rejected():
+    clock = FakeClock()
+    with pytest.raises(ValueError):
+        MPU6050FIFO(SimulatedMPU6050(clock=clock), max_burst=FRAME_BYTES - 1,
+                    sleep=clock.sleep, clock=clock)
+
+
+def test_recorder_blocks_match_readings(tmp_path):
+    fifo, _, clock = make_fifo()
+    by_reading = FlightRecorder(str(tmp_path), capacity=100)
+    by_block = FlightRecorder(str(tmp_path), capacity=100)
+    for _ in range(4):
+        clock.sleep(0.125)
+        block = fifo.read_block()
+        for timestamp, sensor_data in frame_readings(*block):
+            by_reading.record(timestamp, sensor_data)
+        by_block.record_block(frame_times_ns(block[0]), block[1], block[2])
+    by_reading.close()
+    by_block.close()
+    expected_times, expected_values = by_reading._snapshot(0, 2**62)
+    times, values = by_block._snapshot(0, 2**62)
+    assert len(times) == 100
+    np.testing.assert_array_equal(times, expected_times)
+    np.testing.assert_array_equal(values, expected_values)
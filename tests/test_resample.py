@@ -0,0 +1,57 @@
+import numpy as np
+
+from resample import Resampler, resample
+
+RATE = 10.0
+MAX_GAP = 1.0
+
+
+def irregular_recording(seed=0):
+    # Two runs of jittered ~4 Hz readings with a 3 s gap between them, one
+    # reading that does not advance, and values far apart on either side of
+    # the gap
+    rng = np.random.default_rng(seed)
+    steps = rng.integers(200_000_000, 300_000_000, 199)
+    steps[100] = 3_000_000_000
+    steps[50] = 0
+    timestamps_ns = 1_743_420_125_229_516_000 + np.concatenate([[0], np.cumsum(steps)])
+    values = rng.normal(0.0, 1.0, (200, 6))
+    values[101:] += 1000.0
+    return timestamps_ns, values
+
+
+def stream(timestamps_ns, values):
+    resampler = Resampler(RATE, MAX_GAP)
+    rows = []
+    segment_starts = []
+    for timestamp_ns, sample in zip(timestamps_ns, values):
+        out, reset = resampler.add(int(timestamp_ns), sample)
+        if reset or not segment_starts:
+            segment_starts.append(len(rows))
+        rows.extend(out.copy())
+    return np.array(rows), np.array(segment_starts), resampler
+
+
+def test_streaming_matches_batch_across_a_gap():
+    timestamps_ns, values = irregular_recording()
+    grid, segment_starts = resample(timestamps_ns, values, RATE, MAX_GAP)
+    streamed, streamed_starts, resampler = stream(timestamps_ns, values)
+
+    np.testing.assert_array_equal(streamed_starts, segment_starts)
+    assert np.array_equal(streamed, grid)
+    assert resampler.gaps == 1
+    assert resampler.dropped == 1
+
+    # Each segment's grid runs from its first reading at 1 / RATE spacing
+    assert list(segment_starts) == [0, segment_starts[1]]
+    before = (timestamps_ns[100] - timestamps_ns[0]) / 1e9
+    assert segment_starts[1] == int(before * RATE) + 1
+    after = (timestamps_ns[-1] - timestamps_ns[101]) / 1e9
+    assert len(grid) - segment_starts[1] == int(after * RATE) + 1
+
+    # Nothing is interpolated across the gap: every grid sample lies within
+    # the readings of its own segment
+    first, second = grid[:segment_starts[1]], grid[segment_starts[1]:]
+    assert np.all(first <= values[:101].max(axis=0)) and np.all(first >= values[:101].min(axis=0))
+    assert np.all(second >= values[101:].min(axis=0))
+    np.testing.assert_array_equal(second[0], values[101])
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import features as feature_engine
+from features import SENSOR_NAMES
+from mpu6050_fifo import MPU6050FIFO, SimulatedMPU6050, frame_readings
+from sensor import SensorBuffer
+from test_mpu6050_fifo import FakeClock
+
+WINDOW_SIZE = 6.6
+HOP = 1.0
+
+
+def replay(n_readings, seed=0):
+    # Jittered ~4 Hz readings with a 50 Hz burst in the middle, offset from
+    # zero so rounding in the running statistics would show
+    rng = np.random.default_rng(seed)
+    steps = rng.uniform(0.2, 0.3, n_readings)
+    burst = slice(n_readings // 2, n_readings // 2 + 2000)
+    steps[burst] = 0.02
+    seconds = np.cumsum(steps)
+    values = rng.normal(0.0, 1.0, (n_readings, 6)) * [1, 2, 3, 0.1, 0.2, 0.3]
+    values += [500.0, -200.0, 9.81, 0.0, 1.0, -1.0]
+    values[burst] += rng.normal(0.0, 5.0, (2000, 6))
+    start = datetime(2025, 3, 31, 11, 22, 5)
+    return [start + timedelta(seconds=s) for s in seconds], values
+
+
+@pytest.mark.parametrize('feature_set', ['basic', 'full'])
+def test_ring_features_match_batch_over_long_replay(feature_set):
+    timestamps, values = replay(20000)
+    buffer = SensorBuffer(WINDOW_SIZE, hop=HOP, capacity=8, feature_set=feature_set)
+    stats = feature_engine.resolve_stats(feature_set)
+    seconds = np.array([(t - timestamps[0]).total_seconds() for t in timestamps])
+
+    windows = 0
+    for i, (timestamp, row) in enumerate(zip(timestamps, values)):
+        features = buffer.add_reading(dict(zip(SENSOR_NAMES, row)), timestamp)
+        if features is False:
+            continue
+        in_window = values[:i + 1][seconds[i] - seconds[:i + 1] <= WINDOW_SIZE]
+        expected = feature_engine.compute_features(in_window, stats)
+        np.testing.assert_allclose(features, expected, rtol=1e-9, atol=1e-9)
+        windows += 1
+
+    assert windows > 4000
+    # The burst put far more than 8 readings in one window
+    assert buffer.capacity >= 128
+
+
+def test_rejects_bad_capacity():
+    with pytest.raises(ValueError):
+        SensorBuffer(WINDOW_SIZE, hop=HOP, capacity=0)
+
+
+@pytest.mark.parametrize('resample_rate', [None, 100.0])
+def test_add_block_matches_add_reading(resample_rate):
+    clock = FakeClock()
+    fifo = MPU6050FIFO(SimulatedMPU6050(clock=clock), 500.0, sleep=clock.sleep, clock=clock)
+    by_reading = SensorBuffer(WINDOW_SIZE, hop=HOP, resample_rate=resample_rate)
+    by_block = SensorBuffer(WINDOW_SIZE, hop=HOP, resample_rate=resample_rate)
+    expected = []
+    windows = []
+    for _ in range(120):
+        clock.sleep(0.125)
+        block = fifo.read_block()
+        for row, (timestamp, sensor_data) in enumerate(frame_readings(*block)):
+            features = by_reading.add_reading(sensor_data, timestamp)
+            if features is not False:
+                expected.append((row, features))
+        windows.extend(by_block.add_block(block[0], block[1]))
+    assert len(windows) == len(expected) > 5
+    for (row, features), (block_row, block_features) in zip(expected, windows):
+        assert block_row == row
+        np.testing.assert_allclose(block_features, features, rtol=1e-9, atol=1e-12)
+
+
+def test_add_block_rejects_bad_input():
+    buffer = SensorBuffer(WINDOW_SIZE, hop=HOP)
+    with pytest.raises(ValueError):
+        buffer.add_block(np.arange(3), np.zeros((3, 7)))
+    buffer.add_reading(dict.fromkeys(SENSOR_NAMES, 0.0), datetime(2025, 1, 1))
+    with pytest.raises(ValueError):
+        buffer.add_block(np.arange(3), np.zeros((3, 6)))
+    with pytest.raises(ValueError):
+        SensorBuffer(WINDOW_SIZE).add_block(np.arange(3), np.zeros((3, 6)))
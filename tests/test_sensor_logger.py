@@ -0,0 +1,41 @@
+import time
+
+from sensor import SensorDataLogger
+
+READING = {'accel_x': 0.1, 'accel_y': 0.2, 'accel_z': 9.8,
+           'gyro_x': 0.01, 'gyro_y': 0.02, 'gyro_z': 0.03, 'temp': 21.5}
+
+
+def test_failed_writes_back_off(tmp_path):
+    # A directory where the file should be: every open fails
+    path = tmp_path / 'sensor_data.csv'
+    path.mkdir()
+    logger = SensorDataLogger(str(path), batch_size=1, flush_interval=0.2)
+    attempts = []
+    write = logger._write
+
+    def counting_write(rows):
+        attempts.append(len(rows))
+        return write(rows)
+
+    logger._write = counting_write
+    try:
+        for _ in range(20):
+            logger.log(READING, '2025-03-31T12:00:00')
+        time.sleep(0.5)
+        # Without backoff the thread retries at once, as rows are always pending
+        assert 1 <= len(attempts) <= 3
+        assert logger.rows_written == 0
+    finally:
+        logger.close()
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    path = tmp_path / 'sensor_data.csv'
+    with SensorDataLogger(str(path), batch_size=5, flush_interval=10.0) as logger:
+        for _ in range(12):
+            logger.log(READING, '2025-03-31T12:00:00')
+    lines = path.read_text().splitlines()
+    assert lines[0].startswith('timestamp,accel_x')
+    assert len(lines) == 13
+    assert logger.rows_written == 12
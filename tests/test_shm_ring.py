@@ -0,0 +1,72 @@
+import multiprocessing
+
+import numpy as np
+
+from shm_ring import SampleRing
+
+
+def test_window_valid_leaves_one_slot_of_slack():
+    ring = SampleRing(capacity=8)
+    try:
+        for seq in range(7):
+            ring.write(seq, np.full(7, seq), received_ns=seq)
+        assert ring.window_valid(0)
+        assert ring.oldest_seq() == 0
+        # Reading 0's slot is the one the next write fills
+        ring.write(7, np.full(7, 7), received_ns=7)
+        assert not ring.window_valid(0)
+        assert ring.read(0, 8) is None
+        assert ring.window_valid(1)
+        assert ring.oldest_seq() == 1
+        ring.write(8, np.full(7, 8), received_ns=8)
+        assert not ring.window_valid(1)
+        assert ring.oldest_seq() == 2
+
+        timestamps, received, values = ring.read(2, 9)
+        assert timestamps.tolist() == list(range(2, 9))
+        assert received.tolist() == list(range(2, 9))
+        assert values[:, 0].tolist() == list(range(2, 9))
+    finally:
+        ring.close()
+
+
+def _produce(name, lock, n):
+    ring = SampleRing(name=name, lock=lock)
+    try:
+        for seq in range(n):
+            # Every field of a record carries its sequence number
+            ring.write(seq, np.full(7, float(seq)), received_ns=seq)
+    finally:
+        ring.close()
+
+
+def test_reads_from_another_process_are_never_torn():
+    n = 200000
+    ring = SampleRing(capacity=64)
+    producer = multiprocessing.Process(target=_produce, args=(ring.name, ring.lock, n))
+    producer.start()
+    reads = 0
+    try:
+        while True:
+            end = ring.write_seq
+            if end >= n:
+                break
+            # Alternate between windows near the head and at the oldest
+            # held reading, which the producer is about to overwrite
+            start = max(0, end - (48 if reads % 2 else 63))
+            if start == end:
+                continue
+            block = ring.read(start, end)
+            if block is None:
+                continue
+            timestamps, received, values = block
+            expected = np.arange(start, end)
+            assert np.array_equal(timestamps, expected)
+            assert np.array_equal(received, expected)
+            assert np.array_equal(values, np.repeat(expected[:, None], 7, axis=1).astype(float))
+            reads += 1
+    finally:
+        producer.join()
+        ring.close()
+    assert producer.exitcode == 0
+    assert reads > 100
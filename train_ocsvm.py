@@ -1,64 +1,86 @@
 #!/usr/bin/env python3
 """
 Usage:
-    python train_ocsvm.py input_file.csv
+    python train_ocsvm.py input_file.csv model_file.pkl scaler_file.pkl [feature_set]
+        [--trainer exact|approx] [--n-components N]
+        [--window-size S] [--resample HZ] [--cache-dir DIR | --no-cache]
+    python train_ocsvm.py --compare input_file.csv normal.csv anomaly1.csv [anomaly2.csv ...]
+        [--feature-set basic|full|spectral] [--n-components N]
+
+feature_set is 'basic' (default), 'full' or 'spectral'; see features.FEATURE_SETS.
+
+--trainer exact (default) fits sklearn's OneClassSVM, whose cost grows
+quadratically or worse with the number of windows. --trainer approx maps the
+data onto N RBF landmarks with Nystroem and fits a linear SGDOneClassSVM on
+top, so training is roughly linear in the number of windows and the model
+never has more than N kernel centres. Both are saved in the same
+{'model', 'feature_names', 'feature_spec'} pickle and load in
+OneClassSVMDetector unchanged.
+
+--compare trains both on input_file.csv and reports fit time, inference
+cost and detection accuracy on the normal and anomaly feature files.
+
+Any input can also be a raw sensor recording (data/sensor_data_*.csv or a
+.wtr store). It is windowed with --window-size (and --resample) and its
+features come from the feature cache shared with extract_features.py and
+evaluate_ocsvm.py, so retraining on unchanged data skips extraction.
 """
-import joblib
+import argparse
+import contextlib
+import io
+import os
 import sys
+import tempfile
+import time
+import joblib
 import numpy as np
 import pandas as pd
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import SGDOneClassSVM
+from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.svm import OneClassSVM
+import extract_features
+import features as feature_engine
 import sensor
+from anomaly_detector import OneClassSVMDetector, export_compact, file_sha256
 
-def load_data(file_path):
-    data = pd.read_csv(file_path)
+TRAINERS = ['exact', 'approx']
+
+# Maximum number of kernel centres for the approximate trainer
+DEFAULT_N_COMPONENTS = 100
+
+
+def load_data(file_path, feature_set='basic', extraction=None):
+    # A raw recording is windowed first, through the feature cache
+    if extract_features.is_raw_file(file_path):
+        data = extract_features.feature_frame(file_path, feature_set, **(extraction or {}))
+    else:
+        data = pd.read_csv(file_path)
     print(f"Loaded data shape: {data.shape}")
     return data
 
 
-def get_features(data):
+def get_features(data, feature_set='basic'):
     features = []
-    feature_names = sensor.get_feature_names()
-    
+    feature_names = sensor.get_feature_names(feature_set)
+
     for col_name in feature_names:
         if col_name in data.columns:
             features.append(data[col_name].values)
         else:
             print(f"Warning: Column {col_name} not found in data")
-    
+
     features = np.array(features).T
-    
+
     print(f"Total features extracted: {features.shape[1]}")
     print(f"Number of samples: {features.shape[0]}")
     print(f"Feature names: {feature_names}")
     return features, feature_names
 
-def train_and_save_model(features, feature_names, model_path, scaler_path):
-    try:
-        # Convert features to DataFrame with feature names
-        features_df = pd.DataFrame(features, columns=feature_names)
-        print("\nFeatures DataFrame shape:", features_df.shape)
-
-        # Without proper scaling, features with larger values could dominate the model's decision boundary.
-        scaler = StandardScaler()
-        
-        # The fit method:
-        # 1. Computes statistical parameters (mean and standard deviation) for each feature
-        # 2. Learns the data distribution from the training data
-        # 3. Stores these statistics internally in the scaler object
-        # 4. Does NOT transform the data yet - that happens in the transform() method
-        # 5. Processes each feature independently to ensure proper scaling
-        scaler.fit(features_df)
-        
-        # The transform method:
-        # 1. Uses the statistics learned during fit() to standardize the data
-        # 2. Transforms each feature to have zero mean and unit variance
-        # 3. Applies the formula: z = (x - mean) / std_dev
-        # 4. Returns the standardized features ready for model training
-        scaled_features = scaler.transform(features_df)
-        
-        # Train model
+
+def build_model(trainer, scaled_features, nu=0.1, n_components=DEFAULT_N_COMPONENTS):
+    if trainer == 'exact':
         # nu=0.1: Controls the upper bound on the fraction of training errors and lower bound on fraction of support vectors
         #         A value of 0.1 means the model expects at most 10% of training data to be outliers
         # kernel='rbf': Uses Radial Basis Function (Gaussian) kernel
@@ -67,37 +89,191 @@ def train_and_save_model(features, feature_names, model_path, scaler_path):
         # gamma='scale': Automatically sets gamma to 1/(n_features * X.var())
         #                Adapts to the scale of input features
         #                Works well with standardized data
-        model = OneClassSVM(nu=0.1, kernel='rbf', gamma='scale')
-        model.fit(scaled_features)
-        
-        # Save model with feature names
-        model_data = {
-            'model': model,
-            'feature_names': feature_names
-        }
-        joblib.dump(model_data, model_path)
-        print(f"Model saved to {model_path}")
-        
-        # Save scaler with feature names
-        scaler_data = {
-            'scaler': scaler,
-            'feature_names': feature_names
-        }
-        joblib.dump(scaler_data, scaler_path)
-        print(f"Scaler saved to {scaler_path}")
-        
+        return OneClassSVM(nu=nu, kernel='rbf', gamma='scale')
+
+    if trainer == 'approx':
+        # Same kernel as the exact model ('scale' gamma), approximated on at
+        # most n_components landmark windows, followed by a linear one-class
+        # SVM trained with SGD.
+        gamma = 1.0 / (scaled_features.shape[1] * scaled_features.var())
+        return Pipeline([
+            ('nystroem', Nystroem(kernel='rbf', gamma=gamma,
+                                  n_components=min(n_components, len(scaled_features)),
+                                  random_state=0)),
+            ('sgd', SGDOneClassSVM(nu=nu, random_state=0)),
+        ])
+
+    raise ValueError(f"Unknown trainer: {trainer}")
+
+
+def fit_model(features, feature_names, trainer='exact', n_components=DEFAULT_N_COMPONENTS):
+    # Convert features to DataFrame with feature names
+    features_df = pd.DataFrame(features, columns=feature_names)
+    print("\nFeatures DataFrame shape:", features_df.shape)
+
+    # Without proper scaling, features with larger values could dominate the model's decision boundary.
+    scaler = StandardScaler()
+
+    # The fit method:
+    # 1. Computes statistical parameters (mean and standard deviation) for each feature
+    # 2. Learns the data distribution from the training data
+    # 3. Stores these statistics internally in the scaler object
+    # 4. Does NOT transform the data yet - that happens in the transform() method
+    # 5. Processes each feature independently to ensure proper scaling
+    scaler.fit(features_df)
+
+    # The transform method:
+    # 1. Uses the statistics learned during fit() to standardize the data
+    # 2. Transforms each feature to have zero mean and unit variance
+    # 3. Applies the formula: z = (x - mean) / std_dev
+    # 4. Returns the standardized features ready for model training
+    scaled_features = scaler.transform(features_df)
+
+    # Train model
+    model = build_model(trainer, scaled_features, n_components=n_components)
+    model.fit(scaled_features)
+    return scaler, model
+
+
+def save_model(model, scaler, feature_names, model_path, scaler_path, feature_set='basic',
+               window_size=None):
+    # Save model with feature names and the feature spec (statistics and
+    # window size), so evaluation and main.py compute exactly the features
+    # the model was trained on
+    feature_spec = feature_engine.make_feature_spec(feature_set, window_size)
+    model_data = {
+        'model': model,
+        'feature_names': feature_names,
+        'feature_spec': feature_spec
+    }
+    joblib.dump(model_data, model_path)
+    print(f"Model saved to {model_path}")
+
+    # Compact copy next to the pickle for fast, NumPy-only loading in main.py.
+    # It records the pickle's digest, which main.py checks before using it
+    compact_path = os.path.splitext(model_path)[0] + '.npz'
+    try:
+        export_compact(model, scaler, feature_names, feature_spec, compact_path,
+                       file_sha256(model_path))
+        print(f"Compact model saved to {compact_path}")
+    except ValueError as e:
+        print(f"Compact model not written: {e}")
+        # A compact model left from an earlier training would describe another model
+        if os.path.isfile(compact_path):
+            os.remove(compact_path)
+
+    # Save scaler with feature names
+    scaler_data = {
+        'scaler': scaler,
+        'feature_names': feature_names
+    }
+    joblib.dump(scaler_data, scaler_path)
+    print(f"Scaler saved to {scaler_path}")
+
+
+def train_and_save_model(features, feature_names, model_path, scaler_path, feature_set='basic',
+                         trainer='exact', n_components=DEFAULT_N_COMPONENTS, window_size=None):
+    try:
+        scaler, model = fit_model(features, feature_names, trainer, n_components)
+        save_model(model, scaler, feature_names, model_path, scaler_path, feature_set, window_size)
     except Exception as e:
         print(f"Error in training/saving: {e}")
         sys.exit(1)
 
-def main():        
-    input_file = sys.argv[1]
-    output_model = sys.argv[2]
-    output_scaler = sys.argv[3]
-    data = load_data(input_file)
-    features, feature_names = get_features(data)
-    train_and_save_model(features, feature_names, output_model, output_scaler)
+
+def compare_trainers(input_file, normal_file, anomaly_files, feature_set='basic',
+                     n_components=DEFAULT_N_COMPONENTS, extraction=None):
+    """Train every trainer on input_file and compare cost and accuracy."""
+    # Imported here so plain training does not depend on the evaluation code
+    from benchmark import time_calls, summarize
+    from evaluate_ocsvm import threshold_sweep, summarize_sweep
+
+    features, feature_names = get_features(load_data(input_file, feature_set, extraction), feature_set)
+    with contextlib.redirect_stdout(io.StringIO()):
+        normal = load_data(normal_file, feature_set, extraction)[feature_names].dropna()
+        anomalies = pd.concat([load_data(f, feature_set, extraction)[feature_names].dropna()
+                               for f in anomaly_files])
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for trainer in TRAINERS:
+            model_path = os.path.join(tmp, f"model_{trainer}.pkl")
+            scaler_path = os.path.join(tmp, f"scaler_{trainer}.pkl")
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                scaler, model = fit_model(features, feature_names, trainer, n_components)
+                fit_time = time.perf_counter() - start
+                save_model(model, scaler, feature_names, model_path, scaler_path, feature_set)
+                # Load through the detector exactly as main.py does
+                detector = OneClassSVMDetector(model_path, scaler_path)
+
+            normal_scores = detector.predict_batch(normal)
+            anomaly_scores = detector.predict_batch(anomalies)
+            roc_auc, _, _ = summarize_sweep(threshold_sweep(normal_scores, anomaly_scores))
+            single = summarize(time_calls(detector.predict, normal.to_numpy(), 2000))
+            start = time.perf_counter()
+            detector.predict_batch(anomalies)
+            batch_time = time.perf_counter() - start
+
+            rows.append({
+                'trainer': trainer,
+                'fit_s': fit_time,
+                'kernel_centres': len(detector.scorer.support_vectors) if detector.scorer else None,
+                'predict_p50_us': single['p50_us'],
+                'batch_us_per_row': batch_time / len(anomalies) * 1e6,
+                'normal_recall': float(np.mean(normal_scores >= 0)),
+                'anomaly_recall': float(np.mean(anomaly_scores < 0)),
+                'accuracy': float((np.sum(normal_scores >= 0) + np.sum(anomaly_scores < 0))
+                                  / (len(normal_scores) + len(anomaly_scores))),
+                'roc_auc': roc_auc,
+            })
+
+    report = pd.DataFrame(rows).set_index('trainer')
+    print(f"\nTrained on {len(features)} windows from {input_file}; "
+          f"evaluated on {len(normal)} normal and {len(anomalies)} anomaly windows")
+    print(report.to_string(float_format=lambda v: f"{v:.4g}"))
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train a One-Class SVM on window features")
+    parser.add_argument('paths', nargs='+',
+                        help="input_file model_file scaler_file [feature_set], or with --compare: "
+                             "input_file normal_file anomaly_file [anomaly_file ...]")
+    parser.add_argument('--trainer', choices=TRAINERS, default='exact')
+    parser.add_argument('--n-components', type=int, default=DEFAULT_N_COMPONENTS,
+                        help="kernel centres for --trainer approx")
+    parser.add_argument('--compare', action='store_true', help="compare all trainers")
+    parser.add_argument('--feature-set', default=None, help="basic, full or spectral")
+    extract_features.add_extraction_args(parser)
+    args = parser.parse_args(argv)
+
+    if args.compare and len(args.paths) < 3:
+        parser.error("--compare needs input_file normal_file and at least one anomaly_file")
+    if not args.compare and len(args.paths) not in (3, 4):
+        parser.error("expected input_file model_file scaler_file [feature_set]")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    extraction = extract_features.extraction_options(args)
+
+    if args.compare:
+        compare_trainers(args.paths[0], args.paths[1], args.paths[2:],
+                         args.feature_set or 'basic', args.n_components, extraction)
+        return
+
+    input_file = args.paths[0]
+    output_model = args.paths[1]
+    output_scaler = args.paths[2]
+    feature_set = args.paths[3] if len(args.paths) > 3 else (args.feature_set or 'basic')
+    data = load_data(input_file, feature_set, extraction)
+    features, feature_names = get_features(data, feature_set)
+    # For feature CSVs, --window-size must match the window they were extracted with
+    train_and_save_model(features, feature_names, output_model, output_scaler, feature_set,
+                         args.trainer, args.n_components, args.window_size)
     print("Training completed successfully!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()